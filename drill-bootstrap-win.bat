@@ -29,5 +29,8 @@ START /B python surface-displays/codix560crlf.py %COM_DEPTH%
 echo *** Launching dispatch.py (modem comms)
 START /B python drill-dispatch/dispatch.py --debug --port=%COM_MODEM%
 
+echo *** Launching drill-state-derived.py (orientation calculations shared by GUIs)
+START /B python drill-control/drill-state-derived.py
+
 echo *** Launching drill-control.py (GUI)
 START /B python drill-control/drill-control.py
@@ -144,6 +144,16 @@ else
 fi
 
 
+echo -e "${INFO}>>> Launching derived drill state service ${NC}";
+python3 $VPATH/drill-control/drill-state-derived.py &
+
+echo -e "${INFO}>>> Launching display gateway ${NC}";
+python3 $VPATH/drill-control/drill-state-gateway.py &
+
+echo -e "${INFO}>>> Launching state multicast ${NC}";
+python3 $VPATH/drill-control/drill-state-multicast.py &
+
+
 echo -e "${INFO}>>> Launching drill communications (dispatch) ${NC}";
 python3 $VPATH/drill-dispatch/dispatch.py --debug --port=/dev/ttyAMA0;
 
@@ -0,0 +1,119 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Background acquisition of the drill and surface states for the Qt GUIs.
+
+Acquisition runs SurfaceState.update() and DrillState.update() in a worker thread, so the GUI thread never waits on
+redis (or on the orientation calculations). After each update the worker emits the new immutable snapshots
+(see snapshot.py) through a Qt signal; connected slots run in the GUI thread and only draw from the snapshots.
+
+Redis calls have bounded timeouts (connection.py), so a network hiccup delays acquisition by at most REDIS_TIMEOUT
+per call. Snapshots carry the time of their last successful redis read ("fetched"), and stale() tells the GUI when
+that is older than STALE_AFTER, also while the worker is itself waiting on a timeout.
+
+Usage:
+    acq = Acquisition(ds, ss, dt, dtfrac_drill, program='drill-control')
+    acq.acquired.connect(slot) # slot(drillsnapshot, surfacesnapshot); drillsnapshot is None if the drill state was not updated
+    acq.start()
+
+The worker times its updates (see profiling.py) and saves the timing statistics of itself and of the timers
+registered in acq.timers to redis every METRICS_DT seconds, so that the GUI thread does not have to.
+"""
+
+import time, cProfile
+from PyQt5.QtCore import Qt, QObject, QThread, QTimer, QMetaObject, pyqtSignal, pyqtSlot
+from settings import *
+from profiling import SectionTimer, publish_metrics, dump_profile
+
+def stale(snapshot, now=None):
+    '''Is the snapshot older than STALE_AFTER (or missing)?'''
+    if snapshot is None or not snapshot.fetched: return True
+    return (time.time() if now is None else now) - snapshot.fetched > STALE_AFTER
+
+class AcquisitionWorker(QObject):
+
+    """
+        Lives in the acquisition thread: updates the surface state every dt seconds, the drill state every
+        dtfrac_drill'th time, and emits the snapshots.
+    """
+
+    acquired = pyqtSignal(object, object) # (DrillSnapshot or None, SurfaceSnapshot)
+
+    def __init__(self, ds, ss, dt, dtfrac_drill, program, timers, profile=None):
+        super().__init__()
+        self.ds, self.ss = ds, ss
+        self.dt, self.dtfrac_drill = dt, dtfrac_drill
+        self.Nt = 0
+        self.program = program
+        self.timing = SectionTimer(['surface update', 'drill update'])
+        self.timers = timers # {name: SectionTimer} to save to redis with the worker's own
+        self.timers['acquisition'] = self.timing
+        self.tmetrics = time.time()
+        self.profile = profile # file name to save profile of acquisition thread to, if any
+
+    @pyqtSlot()
+    def start(self):
+        if self.profile is not None: self.profiler = cProfile.Profile()
+        self.timer = QTimer() # created here so that it belongs to (and fires in) the acquisition thread
+        self.timer.timeout.connect(self.acquire)
+        self.timer.start(int(self.dt*1000))
+
+    @pyqtSlot()
+    def stop(self):
+        self.timer.stop()
+        if self.profile is not None: dump_profile(self.profiler, self.profile)
+
+    @pyqtSlot()
+    def acquire(self):
+        # Python thread state does not persist between calls from this (Qt-created) thread, so profile each call on its own
+        if self.profile is not None: self.profiler.runcall(self.update)
+        else:                        self.update()
+
+    def update(self):
+        self.timing.start()
+        self.ss.update() # handles its own errors (not live if redis could not be read)
+        self.timing.mark('surface update')
+        dsnap = None
+        if self.Nt % self.dtfrac_drill == 0:
+            try:
+                self.ds.update()
+                dsnap = self.ds.snapshot
+            except Exception as e:
+                print('AcquisitionWorker: drill state update failed, keeping last state: %s'%(e))
+            self.timing.mark('drill update')
+        self.Nt += 1
+        self.timing.stop()
+        self.acquired.emit(dsnap, self.ss.snapshot)
+
+        if time.time() - self.tmetrics > METRICS_DT:
+            self.tmetrics = time.time()
+            try:    publish_metrics(self.ss.rc, self.program, self.timers)
+            except: pass
+
+
+class Acquisition(QObject):
+
+    """
+        Owns the acquisition thread and its worker; re-emits the worker's snapshots (queued to the receiver's thread).
+    """
+
+    acquired = pyqtSignal(object, object) # (DrillSnapshot or None, SurfaceSnapshot)
+
+    def __init__(self, ds, ss, dt, dtfrac_drill, program='gui', profile=None):
+        super().__init__()
+        self.timers = {} # {name: SectionTimer} of the receiving GUI, saved to redis with the acquisition timing (see profiling.py)
+        self.thread = QThread()
+        self.worker = AcquisitionWorker(ds, ss, dt, dtfrac_drill, program, self.timers, profile=profile)
+        self.worker.moveToThread(self.thread)
+        self.thread.started.connect(self.worker.start)
+        self.worker.acquired.connect(self.acquired)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        '''Stop acquisition and wait for an update in progress to finish (at most a few REDIS_TIMEOUTs)'''
+        if not self.thread.isRunning(): return
+        QMetaObject.invokeMethod(self.worker, 'stop', Qt.BlockingQueuedConnection) # timer must be stopped from its own thread
+        self.thread.quit()
+        self.thread.wait()
@@ -0,0 +1,88 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Vectorized (batched) AHRS attitude estimators.
+
+The estimators in the ahrs package work on one accelerometer/magnetometer sample at a time, which is slow
+when processing a day of drill logs row by row. The functions below implement the same equations for
+(N,3) arrays of samples and return (N,4) quaternions in the same (w,x,y,z) order as ahrs' estimate().
+
+Rows that cannot be estimated (missing/non-finite samples, zero-length vectors, badly normalized results)
+are returned as NaN rows rather than raising, so the caller can mask them out.
+"""
+
+import numpy as np
+
+def _normalized(v):
+    v = np.atleast_2d(np.asarray(v, dtype=np.float64))
+    norm = np.linalg.norm(v, axis=1)
+    ok = np.isfinite(norm) & (norm > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vn = v / norm[:,None]
+    return vn, ok
+
+def _finalize(q, ok):
+    q[~ok,:] = np.nan
+    norm = np.linalg.norm(q, axis=1)
+    bad = ~np.isfinite(norm) | (norm < 0.99) | (norm > 1.01)
+    q[bad,:] = np.nan
+    return q
+
+def saam_batch(acc, mag):
+    '''
+    Super-fast Attitude from Accelerometer and Magnetometer (SAAM), see ahrs.filters.SAAM.estimate().
+    '''
+    (a, oka), (m, okm) = _normalized(acc), _normalized(mag)
+    ax, ay, az = a.T
+    mx, my, mz = m.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mD = ax*mx + ay*my + az*mz # dynamic magnetometer reference vector (eq. 12)
+        mN = np.sqrt(1-mD**2)
+        # Quaternion components (eq. 16)
+        qw = ax*my - ay*(mN+mx)
+        qx = (az-1)*(mN+mx) + ax*(mD-mz)
+        qy = (az-1)*my + ay*(mD-mz)
+        qz = az*mD - ax*mN-mz
+        q = np.column_stack((-qw, qx, qy, qz))
+        q /= np.linalg.norm(q, axis=1)[:,None] # eq. 18
+    return _finalize(q, oka & okm)
+
+def tilt_batch(acc, mag=None):
+    '''
+    Attitude from the tilt of the gravity vector, see ahrs.filters.Tilt.estimate().
+    If mag is None, yaw is zero (tilt-only case); else yaw is determined from the tilt-compensated magnetic field.
+    '''
+    a, ok = _normalized(acc)
+    ax, ay, az = a.T
+    ex = np.arctan2( ay, az)                     # roll
+    ey = np.arctan2(-ax, np.sqrt(ay**2 + az**2)) # pitch
+    ez = np.zeros(len(ex))                       # yaw
+    if mag is not None:
+        m, okm = _normalized(mag)
+        ok &= okm
+        mx, my, mz = m.T
+        by = my*np.cos(ex) - mz*np.sin(ex)
+        bx = mx*np.cos(ey) + np.sin(ey)*(my*np.sin(ex) + mz*np.cos(ex))
+        ez = np.arctan2(-by, bx)
+    # Euler to quaternion
+    cp, sp = np.cos(0.5*ey), np.sin(0.5*ey)
+    cr, sr = np.cos(0.5*ex), np.sin(0.5*ex)
+    cy, sy = np.cos(0.5*ez), np.sin(0.5*ez)
+    q = np.column_stack((cy*cp*cr + sy*sp*sr, \
+                         cy*cp*sr - sy*sp*cr, \
+                         sy*cp*sr + cy*sp*cr, \
+                         sy*cp*cr - cy*sp*sr))
+    return _finalize(q, ok)
+
+BATCH_ESTIMATORS = {
+    'SAAM': saam_batch,
+    'Tilt': tilt_batch,
+}
+
+def estimate_batch(method, acc, mag=None):
+    '''
+    Estimate (N,4) quaternions, scalar-first (w,x,y,z), from (N,3) arrays of accelerometer and magnetometer samples.
+    Bad rows are NaN.
+    '''
+    if method not in BATCH_ESTIMATORS: raise ValueError('No batched estimator for "%s"; supported are %s'%(method, ', '.join(BATCH_ESTIMATORS)))
+    return BATCH_ESTIMATORS[method](acc, mag)
@@ -0,0 +1,40 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Redis connections for the drill and surface state clients.
+
+All connections have bounded socket timeouts (REDIS_TIMEOUT), so a redis call on a broken or congested link raises
+redis.exceptions.TimeoutError/ConnectionError after at most REDIS_TIMEOUT instead of blocking indefinitely.
+
+A redis_host of the form "gateway://host[:port]" gives a read-only client of the fan-out gateway on host instead
+(see gateway.py), or a redis connection to host if the gateway cannot be reached.
+A redis_host of the form "multicast://[group[:port]]" gives a read-only receiver of the multicast state (see multicast.py).
+"""
+
+import redis
+from settings import *
+
+def connect(redis_host, caller='', DEBUG=False):
+    '''Redis connection (rc) object for redis_host, or for LOCAL_HOST if redis_host cannot be reached'''
+    if redis_host.startswith('multicast://'):
+        from multicast import MulticastReceiver
+        group, _, port = redis_host[len('multicast://'):].partition(':')
+        if DEBUG: print('Receiving from multicast group %s ...'%(redis_host))
+        return MulticastReceiver(group or MULTICAST_GROUP, int(port) if port else MULTICAST_PORT)
+    if redis_host.startswith('gateway://'):
+        from gateway import GatewayClient # (imports state_surface, which imports this module)
+        host, _, port = redis_host[len('gateway://'):].partition(':')
+        try:    
+            if DEBUG: print('Connecting to gateway %s ...'%(redis_host))
+            return GatewayClient(host, int(port) if port else GATEWAY_PORT)
+        except:
+            print('%s: connection to gateway %s failed. Using redis on %s instead.'%(caller, redis_host, host))
+            redis_host = host
+    try:    
+        if DEBUG: print('Connecting to redis server %s ...'%(redis_host))
+        rc = redis.StrictRedis(host=redis_host, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT) 
+        rc.ping() 
+    except:
+        print('%s: redis connection to %s failed. Using %s instead.'%(caller, redis_host, LOCAL_HOST))
+        rc = redis.StrictRedis(host=LOCAL_HOST, socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT) 
+    return rc
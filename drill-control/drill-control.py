@@ -1,6 +1,6 @@
 # N. Rathmann <rathmann@nbi.dk>, 2019-
 
-import sys, os, signal, datetime
+import sys, os, signal, datetime, time, redis, cProfile
 import numpy as np
 import random
 from functools import partial
@@ -8,6 +8,12 @@ from functools import partial
 from settings import *
 from state_drill import *
 from state_surface import *
+from history import RingHistory, LODHistory
+from plotitems import IncrementalScatter
+from scheduler import RenderScheduler
+from acquisition import Acquisition, stale
+from profiling import SectionTimer, report, dump_profile
+import telemetry
 
 from PyQt5.QtCore import * 
 from PyQt5.QtWidgets import * 
@@ -35,6 +41,9 @@ FS_GRAPH_TITLE = 5 # font size for graph titles
 PATH_SCREENSHOT = "/mnt/logs/screenshots"
 os.system('mkdir -p %s'%(PATH_SCREENSHOT))
 
+PROFILE = '--profile' in sys.argv # profile GUI and acquisition threads, and save profiles to PATH_PROFILE on exit
+PATH_PROFILE = "/mnt/logs/profiles"
+
 # Print settings
 print('%s: running with DT=%.3fs, DT_DRILL=%.3fs'%(sys.argv[0],DT,DT*DTFRAC_DRILL))
 
@@ -59,6 +68,7 @@ sc_startdrill = "Ctrl+Return"
 sc_stopdrill  = "Ctrl+Backspace"
 #sc_throttle   = "Ctrl+Shift+Return"
 sc_startrun   = "Ctrl+Space"
+sc_timing     = "F12" # show/hide update timing overlay
 
 #-------------------
 # Program start
@@ -72,9 +82,10 @@ class MainWidget(QWidget):
     loadmeasures      = {'hist_load':'Load', 'hist_loadnet':'Load - cable', 'hist_loadtare':'Tare load'}
     loadmeasure_inuse = 'hist_load'
 
-    xlen            = [int(0.5*60), int(2*60), int(10*60), int(45*60)] 
-    xlen_names      = ["1/2m", "2m", "10m", "45m"]
-    xlen_samplerate = [1,1,1,1]  
+    xlen            = [int(0.5*60), int(2*60), int(10*60), int(45*60), int(3*60*60), int(12*60*60)] 
+    xlen_names      = ["1/2m", "2m", "10m", "45m", "3h", "12h"]
+    xlen_fullrate   = int(45*60) # seconds of history kept at full time resolution; longer windows are drawn from rollups (see history.py)
+    rollup_dt       = 30 # seconds per rollup (min/mean/max) bin
     xlen_selector   = {'speed':0, 'load':0, 'current':0, 'incl':2} # default selection
     
     minYRange_load = 20 # kg
@@ -91,7 +102,33 @@ class MainWidget(QWidget):
 
         # REDIS_HOST determined in settings file
         self.ds = DrillState(redis_host=REDIS_HOST)   
-        self.ss = SurfaceState(tavg, DT*DTFRAC_DRILL,redis_host=REDIS_HOST)
+        self.ss = SurfaceState(tavg, DT, redis_host=REDIS_HOST) # updated every DT (see acquisition.py), so up to 1/DT encoder samples per second
+        
+        # The states are updated in the acquisition thread (see acquisition.py); the GUI draws only from their latest snapshots
+        self.dsnap, self.ssnap = self.ds.snapshot, self.ss.snapshot
+
+        self.statebox_cache = {} # id -> last rendered state (see updateStateBox)
+
+        # Drawing is skipped for hidden/minimised window and slowed down if nothing changes (see scheduler.py)
+        self.scheduler = RenderScheduler(self)
+        self.key_surface   = None # shown surface values of last update, to tell if they changed
+        self.drill_pending = True # drill state taken in but not drawn yet?
+
+        self.timer_status = QTimer()
+        self.timer_status.timeout.connect(self.updateStatuses)
+        self.timer_status.start(1000)
+
+        ### Update timing (see profiling.py), shown in overlay toggled by sc_timing 
+
+        self.timing = SectionTimer(['ingest', 'surface graphs', 'surface boxes', 'drill graphs', 'drill boxes', 'widgets'])
+        self.timers = {'gui':self.timing} # timers shown in overlay
+        self.lbl_timing = QLabel(self)
+        self.lbl_timing.setFont(QtGui.QFontDatabase.systemFont(QtGui.QFontDatabase.FixedFont))
+        self.lbl_timing.setStyleSheet("background-color: rgba(255,255,255,230); border: 1px solid black; padding: 4px;")
+        self.lbl_timing.hide()
+        self.timer_timing = QTimer()
+        self.timer_timing.timeout.connect(self.updateTiming)
+        QShortcut(QKeySequence(sc_timing), self, self.toggleTiming)
 
         ### Sound clips
         
@@ -107,21 +144,37 @@ class MainWidget(QWidget):
         pg.setConfigOptions(foreground='k')
 
         # X-axis
-        self.hist_time       = np.flipud(np.arange(0, self.xlen[-1]/60 +1e-9, DT/60))
-        self.hist_time_drill = np.flipud(np.arange(0, self.xlen[-1]/60 +1e-9, DT*DTFRAC_DRILL/60))
-        self.hist_load       = np.full(len(self.hist_time), 0.0)
-        self.hist_loadnet    = np.full(len(self.hist_time), 0.0)
-        self.hist_loadtare   = np.full(len(self.hist_time), 0.0)
-        self.hist_speed      = np.full(len(self.hist_time), 0.0)
-        self.hist_current    = np.full(len(self.hist_time_drill), 0.0)
+        self.hist_time       = np.flipud(np.arange(0, self.xlen_fullrate/60 +1e-9, DT/60))
+        self.hist_time_drill = np.flipud(np.arange(0, self.xlen_fullrate/60 +1e-9, DT*DTFRAC_DRILL/60))
+
+        # Rollups for windows longer than xlen_fullrate
+        nrollups = int(self.xlen[-1]/self.rollup_dt)
+        R, R_drill = int(self.rollup_dt/DT), int(self.rollup_dt/(DT*DTFRAC_DRILL)) # samples per rollup bin
+        
+        self.hist_load       = LODHistory(len(self.hist_time), 0, R=R, M=nrollups)
+        self.hist_loadnet    = LODHistory(len(self.hist_time), 0, R=R, M=nrollups)
+        self.hist_loadtare   = LODHistory(len(self.hist_time), 0, R=R, M=nrollups)
+        self.hist_speed      = LODHistory(len(self.hist_time), 0, R=R, M=nrollups)
+        self.hist_current    = LODHistory(len(self.hist_time_drill), 0, R=R_drill, M=nrollups)
+        self.lod_maxpoints   = int(self.xlen[0]/DT) # no plot draws more points than the shortest (1/2 min) time window of the surface state plots
 
         #self.hist_depth     = np.full(len(self.hist_time_drill), 0.0)
         #self.hist_incl_sfus = np.full(len(self.hist_time_drill), 0.0)
         #self.hist_incl_ahrs = np.full(len(self.hist_time_drill), 0.0)
         
-        self.hist_depth     = np.linspace(0.3,0,len(self.hist_time_drill)) 
-        self.hist_incl_sfus = np.linspace(-8,0,len(self.hist_time_drill)) 
-        self.hist_incl_ahrs = np.linspace(-5,0,len(self.hist_time_drill)) 
+        self.hist_depth     = RingHistory(len(self.hist_time_drill), np.linspace(0.3,0,len(self.hist_time_drill)))
+        self.hist_incl_sfus = RingHistory(len(self.hist_time_drill), np.linspace(-8,0,len(self.hist_time_drill)))
+        self.hist_incl_ahrs = RingHistory(len(self.hist_time_drill), np.linspace(-5,0,len(self.hist_time_drill)))
+
+        # Histories start from the recorded telemetry if available (see telemetry.py), so that a restart does not blank the plots:
+        # the visible time windows at once, the rest (up to xlen[-1]) read in the background by backfillTick()
+        xlen_visible = max(self.xlen[idx] for idx in self.xlen_selector.values())
+        self.backfill(telemetry.fetch(self.ds.rc, xlen_visible + TELEMETRY_MAXGAP))
+        try:    self.backfill_reader = telemetry.Reader(self.ds.rc, self.xlen[-1] + TELEMETRY_MAXGAP)
+        except: self.backfill_reader = None # not connected
+        self.timer_backfill = QTimer()
+        self.timer_backfill.timeout.connect(self.backfillTick)
+        if self.backfill_reader is not None: self.timer_backfill.start(int(1000*TELEMETRY_CHUNK_DT))
 
         def setupaxis(obj):
             obj.invertX()
@@ -188,8 +241,8 @@ class MainWidget(QWidget):
         self.incl_scatter0.setData(logger_incl, -logger_depth)
         self.plot_incl.addItem(self.incl_scatter0)
 
-        self.incl_scatter = pg.ScatterPlotItem(size=8, pen=None, brush=pg.mkBrush(0,0,0))
-        self.incl_scatter.setData(self.hist_incl_sfus, self.hist_depth)
+        self.incl_scatter = IncrementalScatter(len(self.hist_time_drill), size=8, pen=None, brush=pg.mkBrush(0,0,0)) # points are added as drill states arrive (and set from history when orientation method is changed)
+        self.incl_scatter.setWindow(int(self.xlen[self.xlen_selector['incl']]/(DT*DTFRAC_DRILL)))
         self.plot_incl.addItem(self.incl_scatter)
 #        self.curve_incl = self.plot_current.plot( x=self.hist_depth,y=self.hist_incl_sfus, pen=plotpen_black)
 
@@ -205,6 +258,7 @@ class MainWidget(QWidget):
         self.create_gb_status()
         self.create_gb_bno055calib()
         self.create_gb_expert()
+        self.reset_incl_scatter()
 
         ### QT Layout
 
@@ -225,6 +279,8 @@ class MainWidget(QWidget):
         speed_xlen_btn2 = QPushButton(self.xlen_names[1]); speed_xlen_btn2.clicked.connect(lambda: self.changed_xaxislen_speed(1)); speed_xlen_btn2.setMaximumWidth(w_btn); plotLayout1btn.addWidget(speed_xlen_btn2)
         speed_xlen_btn3 = QPushButton(self.xlen_names[2]); speed_xlen_btn3.clicked.connect(lambda: self.changed_xaxislen_speed(2)); speed_xlen_btn3.setMaximumWidth(w_btn); plotLayout1btn.addWidget(speed_xlen_btn3)
         speed_xlen_btn4 = QPushButton(self.xlen_names[3]); speed_xlen_btn4.clicked.connect(lambda: self.changed_xaxislen_speed(3)); speed_xlen_btn4.setMaximumWidth(w_btn); plotLayout1btn.addWidget(speed_xlen_btn4)
+        speed_xlen_btn5 = QPushButton(self.xlen_names[4]); speed_xlen_btn5.clicked.connect(lambda: self.changed_xaxislen_speed(4)); speed_xlen_btn5.setMaximumWidth(w_btn); plotLayout1btn.addWidget(speed_xlen_btn5)
+        speed_xlen_btn6 = QPushButton(self.xlen_names[5]); speed_xlen_btn6.clicked.connect(lambda: self.changed_xaxislen_speed(5)); speed_xlen_btn6.setMaximumWidth(w_btn); plotLayout1btn.addWidget(speed_xlen_btn6)
         plotLayout1btn.addStretch(2)
         plotLayout1.addLayout(plotLayout1btn)
 
@@ -253,6 +309,8 @@ class MainWidget(QWidget):
         load_xlen_btn2 = QPushButton(self.xlen_names[1]); load_xlen_btn2.clicked.connect(lambda: self.changed_xaxislen_load(1)); load_xlen_btn2.setMaximumWidth(w_btn); plotLayout2btn.addWidget(load_xlen_btn2)
         load_xlen_btn3 = QPushButton(self.xlen_names[2]); load_xlen_btn3.clicked.connect(lambda: self.changed_xaxislen_load(2)); load_xlen_btn3.setMaximumWidth(w_btn); plotLayout2btn.addWidget(load_xlen_btn3)
         load_xlen_btn4 = QPushButton(self.xlen_names[3]); load_xlen_btn4.clicked.connect(lambda: self.changed_xaxislen_load(3)); load_xlen_btn4.setMaximumWidth(w_btn); plotLayout2btn.addWidget(load_xlen_btn4)
+        load_xlen_btn5 = QPushButton(self.xlen_names[4]); load_xlen_btn5.clicked.connect(lambda: self.changed_xaxislen_load(4)); load_xlen_btn5.setMaximumWidth(w_btn); plotLayout2btn.addWidget(load_xlen_btn5)
+        load_xlen_btn6 = QPushButton(self.xlen_names[5]); load_xlen_btn6.clicked.connect(lambda: self.changed_xaxislen_load(5)); load_xlen_btn6.setMaximumWidth(w_btn); plotLayout2btn.addWidget(load_xlen_btn6)
         plotLayout2btn.addStretch(1)
         plotLayout2btn.addWidget(QLabel('Plot:'))
         self.cb_loadmeasure = QComboBox()
@@ -271,6 +329,8 @@ class MainWidget(QWidget):
         current_xlen_btn2 = QPushButton(self.xlen_names[1]); current_xlen_btn2.clicked.connect(lambda: self.changed_xaxislen_current(1)); current_xlen_btn2.setMaximumWidth(w_btn); plotLayout3btn.addWidget(current_xlen_btn2)
         current_xlen_btn3 = QPushButton(self.xlen_names[2]); current_xlen_btn3.clicked.connect(lambda: self.changed_xaxislen_current(2)); current_xlen_btn3.setMaximumWidth(w_btn); plotLayout3btn.addWidget(current_xlen_btn3)
         current_xlen_btn4 = QPushButton(self.xlen_names[3]); current_xlen_btn4.clicked.connect(lambda: self.changed_xaxislen_current(3)); current_xlen_btn4.setMaximumWidth(w_btn); plotLayout3btn.addWidget(current_xlen_btn4)
+        current_xlen_btn5 = QPushButton(self.xlen_names[4]); current_xlen_btn5.clicked.connect(lambda: self.changed_xaxislen_current(4)); current_xlen_btn5.setMaximumWidth(w_btn); plotLayout3btn.addWidget(current_xlen_btn5)
+        current_xlen_btn6 = QPushButton(self.xlen_names[5]); current_xlen_btn6.clicked.connect(lambda: self.changed_xaxislen_current(5)); current_xlen_btn6.setMaximumWidth(w_btn); plotLayout3btn.addWidget(current_xlen_btn6)
         plotLayout3btn.addStretch(2)
         plotLayout3.addLayout(plotLayout3btn)
                 
@@ -377,10 +437,10 @@ class MainWidget(QWidget):
         dlayout.addWidget(self.dial_azim, 0,0)
         dlayout.addWidget(self.dial_roll, 0,1)
         btn_offset = QPushButton('Zero ref.') 
-        btn_offset.clicked.connect(lambda: [None,self.ds.save_offset('sfus'),self.ds.save_offset('ahrs')][0]) 
+        btn_offset.clicked.connect(lambda: self.clicked_offset(reset=False)) 
         dlayout.addWidget(btn_offset, 1,0)
         btn_offset = QPushButton('Clear') 
-        btn_offset.clicked.connect(lambda: [None,self.ds.save_offset('sfus',reset=True),self.ds.save_offset('ahrs',reset=True)][0]) 
+        btn_offset.clicked.connect(lambda: self.clicked_offset(reset=True)) 
         dlayout.addWidget(btn_offset, 1,1)
         layout.addLayout(dlayout)
 
@@ -682,6 +742,49 @@ class MainWidget(QWidget):
         if self.cb_orimethod.currentIndex()==0: self.orimethod = 'ahrs'
         if self.cb_orimethod.currentIndex()==1: self.orimethod = 'sfus'
         print('orimethod is now ', self.orimethod)
+        self.reset_incl_scatter()
+
+    def backfill(self, fetched, elapsed=0):
+        # Set the history samples (and rollups) older than elapsed seconds to the recorded telemetry fetched (see telemetry.py), where recorded
+        tele, valid = telemetry.resample(fetched, len(self.hist_time), DT)
+        if tele is None: return
+        older  = DT*np.arange(len(self.hist_time)-1, -1, -1) > elapsed # surface time steps, oldest first
+        rolder = self.rollup_dt*np.arange(self.hist_load.M-1, -1, -1) >= elapsed # rollup bins, oldest first
+        def fill(hist, fields, x, drill=False):
+            # x = f(fields) of the recorded samples
+            I = older & np.all([valid[f] for f in fields], axis=0)
+            xt = x(tele)
+            if drill: I, xt = I[::DTFRAC_DRILL], xt[::DTFRAC_DRILL] # drill time steps are every DTFRAC_DRILL'th surface time step
+            hist.set(np.where(I, xt, hist.view()))
+            if isinstance(hist, LODHistory):
+                *rollups, rvalid = telemetry.rollup(fetched, x(fetched[2]), hist.M, self.rollup_dt)
+                hist.set_rollups([np.where(rvalid & rolder, r, r0) for r, r0 in zip(rollups, hist.rollups())])
+        fill(self.hist_load,      ['load'],          lambda f: f['load'])
+        fill(self.hist_loadnet,   ['load','depth'],  lambda f: f['load'] - CABLE_DENSITY*f['depth'])
+        fill(self.hist_loadtare,  ['load'],          lambda f: f['load'] - self.ssnap.loadtare)
+        fill(self.hist_speed,     ['speed'],         lambda f: f['speed'])
+        fill(self.hist_current,   ['motor_current'], lambda f: f['motor_current'], drill=True)
+        fill(self.hist_depth,     ['depth'],         lambda f: 1e-3*f['depth'],    drill=True)
+        fill(self.hist_incl_sfus, ['incl_sfus'],     lambda f: f['incl_sfus'],     drill=True)
+        fill(self.hist_incl_ahrs, ['incl_ahrs'],     lambda f: f['incl_ahrs'],     drill=True)
+        print('%s: history backfilled from %i recorded samples (%.0f min)'%(sys.argv[0], len(fetched[1]), (fetched[1][-1]-fetched[1][0])/60))
+
+    def backfillTick(self):
+        # Read the next chunk of the recorded telemetry; once all read, backfill the samples older than those taken in since startup
+        try:
+            if not self.backfill_reader.read(): return
+            fetched = self.backfill_reader.fetched()
+            self.backfill(fetched, elapsed=(fetched[0] - self.backfill_reader.tstart) if fetched is not None else 0)
+            self.reset_incl_scatter()
+            self.key_surface, self.drill_pending = None, True # redraw
+        except redis.exceptions.RedisError as e:
+            print('%s: background history backfill failed: %s'%(sys.argv[0], e))
+        self.timer_backfill.stop()
+        self.backfill_reader = None
+
+    def reset_incl_scatter(self):
+        hist_incl = self.hist_incl_sfus if self.orimethod=='sfus' else self.hist_incl_ahrs
+        self.incl_scatter.reset(hist_incl.view(), self.hist_depth.view())
     
     # Motor
     
@@ -693,19 +796,34 @@ class MainWidget(QWidget):
 #        self.dial_inching.setValue(deg)
         self.sl_inching_label.setText('Inching: %+i deg'%(deg))
         
+    def command(self, f, *args, **kwargs):
+        # Send a command through redis; a failed send (e.g. timeout on a broken link) is reported, but must not take the GUI down
+        # Returns True if sent
+        try:    
+            f(*args, **kwargs)
+            return True
+        except redis.exceptions.RedisError as e: 
+            print('drill-control: command %s() failed: %s'%(f.__name__, e))
+            return False
+
+    def clicked_offset(self, reset):
+        # Offsets from the orientation shown (snapshot), as self.ds is being updated by the acquisition thread
+        for method in ['sfus','ahrs']:
+            self.command(self.ds.save_offset, method, reset=reset, quat0=getattr(self.dsnap, 'quat0_%s'%(method)))
+
     def clicked_motorstart(self):
         throttle_pct = int(self.sl_throttle.value())
-        self.ds.start_motor__throttle(throttle_pct)
+        self.command(self.ds.start_motor__throttle, throttle_pct)
         self.randsound(self.sound_startmotor)
         
     def clicked_inchingstart(self):
         deg = self.sl_inching.value()
         self.randsound(self.sound_inching)
-        self.ds.start_motor__degrees(deg, throttle_pct=int(self.sl_inchingthrottle.value()))
+        self.command(self.ds.start_motor__degrees, deg, throttle_pct=int(self.sl_inchingthrottle.value()))
         
     def start_inching(self, ang):
         self.randsound(self.sound_inching)
-        self.ds.start_motor__degrees(ang, throttle_pct=int(self.sl_inchingthrottle.value()))
+        self.command(self.ds.start_motor__degrees, ang, throttle_pct=int(self.sl_inchingthrottle.value()))
 
     def clicked_inching_p10(self):  self.start_inching(+10)  #self.ds.start_motor__degrees( +10, throttle_pct=int(self.sl_inchingthrottle.value()))
     def clicked_inching_p60(self):  self.start_inching(+60)  #self.ds.start_motor__degrees( +60, throttle_pct=int(self.sl_inchingthrottle.value()))
@@ -716,11 +834,11 @@ class MainWidget(QWidget):
     def clicked_inching_m180(self): self.start_inching(-180) #self.ds.start_motor__degrees(-180, throttle_pct=int(self.sl_inchingthrottle.value()))
     
     def clicked_motorstop(self):
-        self.ds.stop_motor()
+        self.command(self.ds.stop_motor)
         self.randsound(self.sound_stopmotor)
         
     def clicked_resettacho(self):
-        self.ds.set_tacho(0)
+        self.command(self.ds.set_tacho, 0)
         
     # Expert control 
     
@@ -737,7 +855,7 @@ class MainWidget(QWidget):
         print('changed_motorconfig')
         #ds.set_motorconfig(self, motorid)
         #print('Saving screenshot to %d'%(self.cb_motorconfig.currentIndex()))
-        self.ds.set_motorconfig( self.cb_motorconfig.currentIndex())
+        self.command(self.ds.set_motorconfig, self.cb_motorconfig.currentIndex())
         #self.setMotor(3)  # Hardwired Plettenberg
         #pass
 
@@ -767,7 +885,7 @@ class MainWidget(QWidget):
         if button == QMessageBox.Yes:
             #test = index # int(self.sl_throttle.value())
             #print('drill-control: Saving calibration in slot %d'% i)
-            self.ds.save_bno055_calibration(i)
+            self.command(self.ds.save_bno055_calibration, i)
         else:
 #            print('save ignored...')           
             pass
@@ -775,7 +893,7 @@ class MainWidget(QWidget):
     def clicked_loadcal(self, i):
         #test = index # int(self.sl_throttle.value())
         #print('drill-control: Loading calibration from slot %d'% i)
-        self.ds.load_bno055_calibration(i)
+        self.command(self.ds.load_bno055_calibration, i)
         
 
     # Plot control
@@ -794,6 +912,7 @@ class MainWidget(QWidget):
         
     def changed_xaxislen_incl(self, idx):
         self.xlen_selector['incl'] = idx #self.cb_xaxislen_current.currentIndex()
+        self.incl_scatter.setWindow(int(self.xlen[idx]/(DT*DTFRAC_DRILL)))
 #        self.plot_incl.setXRange(0, self.xlen[self.xlen_selector['incl']]/60*1.01, padding=0)
         
     def changed_loadmeasure(self):
@@ -809,8 +928,8 @@ class MainWidget(QWidget):
             self.btn_startrun.setText('Stop')
             self.btn_startrun.setStyleSheet("font-weight: bold; background-color : %s"%(COLOR_RED))
             self.runtime0 = datetime.datetime.now()
-            self.ss.set_depthtare(self.ss.depth)
-            self.ds.set_tacho(0)
+            self.command(self.ss.set_depthtare, self.ssnap.depth)
+            self.command(self.ds.set_tacho, 0)
             self.btn_startrun.setShortcut(sc_startrun)
             self.randsound(self.sound_startrun)
 #            self.clicked_resettareload() 
@@ -819,7 +938,7 @@ class MainWidget(QWidget):
             self.btn_startrun.setStyleSheet("font-weight: bold; background-color : %s"%(COLOR_GREEN))
             self.btn_startrun.setShortcut(sc_startrun)
             self.randsound(self.sound_stoprun)
-            self.ss.set_depthtare(self.ss.depth)
+            self.command(self.ss.set_depthtare, self.ssnap.depth)
     
     def take_screenshot(self):
         fname = '%s/%s.png'%(PATH_SCREENSHOT, datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
@@ -828,11 +947,11 @@ class MainWidget(QWidget):
         print('Saving screenshot to %s'%(fname))
     
     def clicked_resettareload(self):
-        loadtare_new = self.ss.load
+        loadtare_new = self.ssnap.load
         print('Setting tare load to %.2f'%(loadtare_new))
-        self.hist_loadtare += self.ss.loadtare
+        if not self.command(self.ss.set_loadtare, loadtare_new): return
+        self.hist_loadtare += self.ssnap.loadtare # shift history to new tare only once saved
         self.hist_loadtare -= loadtare_new
-        self.ss.set_loadtare(loadtare_new)
         
     # Other
     
@@ -853,14 +972,93 @@ class MainWidget(QWidget):
         gb.setLayout(layout)
         return gb
       
+    def lod_points(self, plot):
+        # Max. number of points to draw in plot: no more than pixels across, nor than for the shortest time window
+        return max(2, min(plot.width(), self.lod_maxpoints))
+
     def updateStateBox(self, id, value, warnthres):
+        # Touch the label only if its text or warning state changed; setStyleSheet() in particular forces an expensive re-polish
+        text = str(value) if not isinstance(value, list) else ', '.join(value)
+        warn = None # unchanged
+        if isinstance(value, float) or isinstance(value, int): warn = not (warnthres[0] <= value <= warnthres[1])
+        text0, warn0 = self.statebox_cache.get(id, (None, None))
+        if text != text0: 
+            getattr(self, id).setText(text)
+        if warn is not None and warn != warn0: 
+            getattr(self, id).setStyleSheet("background: none" if not warn else "background: %s"%(COLOR_RED))
+        self.statebox_cache[id] = (text, warn if warn is not None else warn0)
+
+    def updateStatus(self, id, islive, isstale=False):
+        status = 'Stale' if isstale else ('Online' if islive else 'Offline')
+        if self.statebox_cache.get(id) == status: return
         lbl = getattr(self, id)
-        lbl.setText(str(value) if not isinstance(value, list) else ', '.join(value))
-        if isinstance(value, float) or isinstance(value, int):
-            if warnthres[0] <= value <= warnthres[1]: lbl.setStyleSheet("background: none")
-            else:                                     lbl.setStyleSheet("background: %s"%(COLOR_RED))
+        lbl.setText(status)
+        lbl.setStyleSheet("font-weight: bold; color: %s;"%(COLOR_DARKGREEN if status == 'Online' else COLOR_DARKRED))
+        self.statebox_cache[id] = status
+
+    def updateStatuses(self):
+        # Also called by a timer of its own, so that stale data is reported even if the acquisition thread is stuck waiting on redis
+        now = time.time()
+        self.updateStatus('status_drill',        self.dsnap.islive,              stale(self.dsnap, now))
+        self.updateStatus('status_loadcell',     self.ssnap.islive_loadcell,     stale(self.ssnap, now))
+        self.updateStatus('status_depthcounter', self.ssnap.islive_depthcounter, stale(self.ssnap, now))
+            
+    def toggleTiming(self):
+        if self.lbl_timing.isVisible():
+            self.lbl_timing.hide()
+            self.timer_timing.stop()
+        else:
+            self.updateTiming()
+            self.lbl_timing.show()
+            self.lbl_timing.raise_()
+            self.timer_timing.start(1000)
+
+    def updateTiming(self):
+        self.lbl_timing.setText(report(self.timers, budget=DT))
+        self.lbl_timing.adjustSize()
+
+    def eventListener(self, dsnap, ssnap):
+
+        # Called (in GUI thread) with the latest snapshots from the acquisition thread; dsnap is None if the drill state was not updated.
+        # Every update is taken in (appended to the histories), but only drawn if the render scheduler says so (see scheduler.py)
+
+        self.timing.start()
+
+        ### Surface state
+        
+        self.ssnap = ssnap
+        self.hist_speed.append(abs(self.ssnap.speed))
+        self.hist_load.append(self.ssnap.load)
+        self.hist_loadtare.append(self.ssnap.load - self.ssnap.loadtare)
+        self.hist_loadnet.append(self.ssnap.loadnet)
+
+        # shown values changed? 
+        key_surface = (round(self.ssnap.depth,PRECISION_DEPTH), round(self.ssnap.load,PRECISION_LOAD), round(self.ssnap.speedinst,2), self.ssnap.depthtare, self.ssnap.loadtare, self.ssnap.corelength, self.ssnap.islive_depthcounter, self.ssnap.islive_loadcell)
+        changed = key_surface != self.key_surface
+        self.key_surface = key_surface
+
+        ### Drill state
+        
+        if dsnap is not None:
+            changed = changed or (dsnap.received, dsnap.islive) != (self.dsnap.received, self.dsnap.islive)
+            self.dsnap = dsnap
+            self.hist_current.append(self.dsnap.motor_current)
+            self.hist_depth.append(np.abs(self.ssnap.depth) * 1e-3)
+            self.hist_incl_ahrs.append(self.dsnap.incl_ahrs)
+            self.hist_incl_sfus.append(self.dsnap.incl_sfus)
+            self.incl_scatter.append(self.hist_incl_sfus[-1] if self.orimethod=='sfus' else self.hist_incl_ahrs[-1], self.hist_depth[-1])
+            self.drill_pending = True # drill state not drawn yet
+        self.timing.mark('ingest')
+
+        ### Draw?
+        
+        if self.scheduler.due(changed or self.btn_startrun.isChecked()): # run time changes while running
+            self.render()
             
-    def eventListener(self):
+        self.Nt += 1
+        self.timing.stop()
+        
+    def render(self):
 
         warn__nothres = [-np.inf, np.inf]
 
@@ -868,134 +1066,111 @@ class MainWidget(QWidget):
         # Update surface state
         #-----------------------
         
-        self.ss.update()
-
         ### Update graphs
         
-        self.hist_speed = np.roll(self.hist_speed, -1); self.hist_speed[-1] = abs(self.ss.speed)
         sel = self.xlen_selector['speed']
-        I0 = -int(self.xlen[sel]/DT)
-        x = self.hist_time[ I0:len(self.hist_time):self.xlen_samplerate[sel]]
-        y = self.hist_speed[I0:len(self.hist_time):self.xlen_samplerate[sel]]
-        self.curve_speed.setData(x=x, y=y)
+        age, y = self.hist_speed.lod(int(self.xlen[sel]/DT), self.lod_points(self.plot_speed))
+        self.curve_speed.setData(x=age*DT/60, y=y)
         self.plot_speed.setYRange(0, np.amax([self.minYRange_speed, np.amax(y)*1.075]), padding=0.02)
         
-        self.hist_load     = np.roll(self.hist_load,  -1);     self.hist_load[-1]     = self.ss.load
-        self.hist_loadtare = np.roll(self.hist_loadtare,  -1); self.hist_loadtare[-1] = self.ss.load - self.ss.loadtare
-        self.hist_loadnet  = np.roll(self.hist_loadnet,  -1);  self.hist_loadnet[-1]  = self.ss.loadnet
         hist_loadmeas = getattr(self,self.loadmeasure_inuse)
         sel = self.xlen_selector['load']
-        I0 = -int(self.xlen[sel]/DT)
-        x = self.hist_time[I0:len(self.hist_time):self.xlen_samplerate[sel]]
-        y = hist_loadmeas[ I0:len(self.hist_time):self.xlen_samplerate[sel]]
-        self.curve_load.setData(x=x,y=y)
+        age, y = hist_loadmeas.lod(int(self.xlen[sel]/DT), self.lod_points(self.plot_load))
+        self.curve_load.setData(x=age*DT/60, y=y)
 
         self.plot_load.setTitle(   self.htmlfont('<b>%s = %.1f kg'%(self.loadmeasures[self.loadmeasure_inuse], hist_loadmeas[-1]), FS_GRAPH_TITLE))
         self.plot_speed.setTitle(  self.htmlfont('<b>Speed = %.1f cm/s'%(self.hist_speed[-1]), FS_GRAPH_TITLE))        
 
         ### Depth bar
         
-#        if 1: self.ss.depth, self.ss.depthtare = 500+1.5, 500 # DEBUG
-        self.depthbar.setValue(self.ss.depth, self.ss.depthtare)
-        self.lbl_depthbar.setText(self.htmlfont('<b>%0.1fm'%(self.ss.depth), FS_GRAPH_TITLE))
+#        if 1: self.ssnap.depth, self.ssnap.depthtare = 500+1.5, 500 # DEBUG
+        self.depthbar.setValue(self.ssnap.depth, self.ssnap.depthtare)
+        self.lbl_depthbar.setText(self.htmlfont('<b>%0.1fm'%(self.ssnap.depth), FS_GRAPH_TITLE))
 
         if not self.btn_startrun.isChecked(): 
             ETA = None
             v = self.hist_speed[-1] * 1e-2
 #            if 1: v = 50 * 1e-2 # m/s # DEBUG
-            if   self.ss.speedinst < -5e-2: ETA = np.abs((self.ss.depthtare-self.ss.depth)/v)
-            elif self.ss.speedinst > +5e-2: ETA = np.abs(self.ss.depth/v)
+            if   self.ssnap.speedinst < -5e-2: ETA = np.abs((self.ssnap.depthtare-self.ssnap.depth)/v)
+            elif self.ssnap.speedinst > +5e-2: ETA = np.abs(self.ssnap.depth/v)
             self.lbl_ETA.setText(self.htmlfont('<b>ETA<br>%.0fmin'%(ETA/60) if ETA is not None else '<b>ETA<br>(...)', FS_GRAPH_TITLE-0.5))
+
+        self.timing.mark('surface graphs')
             
         ### Update state fields
         
-        self.updateStateBox('surface_depth',           round(self.ss.depth,PRECISION_DEPTH),  warn__nothres)  # precision to match physical display
-        self.updateStateBox('surface_speed',           round(self.ss.speedinst,2),            warn__velocity)
-        self.updateStateBox('surface_load',            round(self.ss.load,PRECISION_LOAD),    warn__load) # precision to match physical display
-        self.updateStateBox('surface_loadcable',       round(self.ss.loadnet,PRECISION_LOAD), warn__nothres)
-        self.updateStateBox('surface_downholevoltage', round(self.ds.downhole_voltage,1),     warn__downholevoltage)
-        self.updateStateBox('run_peakload',            round(np.amax(self.hist_load),PRECISION_LOAD), warn__nothres)
-        self.updateStateBox('run_deltaload',           round(self.ss.load  - self.ss.loadtare,PRECISION_LOAD),   warn__nothres)
-        self.updateStateBox('run_corelength',          round(self.ss.corelength,PRECISION_DEPTH), warn__nothres)
+        self.updateStateBox('surface_depth',           round(self.ssnap.depth,PRECISION_DEPTH),  warn__nothres)  # precision to match physical display
+        self.updateStateBox('surface_speed',           round(self.ssnap.speedinst,2),            warn__velocity)
+        self.updateStateBox('surface_load',            round(self.ssnap.load,PRECISION_LOAD),    warn__load) # precision to match physical display
+        self.updateStateBox('surface_loadcable',       round(self.ssnap.loadnet,PRECISION_LOAD), warn__nothres)
+        self.updateStateBox('surface_downholevoltage', round(self.dsnap.downhole_voltage,1),     warn__downholevoltage)
+        self.updateStateBox('run_peakload',            round(float(np.amax(self.hist_load)),PRECISION_LOAD), warn__nothres)
+        self.updateStateBox('run_deltaload',           round(self.ssnap.load  - self.ssnap.loadtare,PRECISION_LOAD),   warn__nothres)
+        self.updateStateBox('run_corelength',          round(self.ssnap.corelength,PRECISION_DEPTH), warn__nothres)
         
         if self.btn_startrun.isChecked(): 
             self.runtime1 = datetime.datetime.now() # update run time
             if self.runtime0 is not None:
                 druntime = self.runtime1-self.runtime0
                 self.updateStateBox('run_time',       self.timestamp(druntime),                 warn__nothres)
-                self.updateStateBox('run_startdepth', round(self.ss.depthtare,PRECISION_DEPTH), warn__nothres)    
-                self.updateStateBox('run_startload',  round(self.ss.loadtare,PRECISION_LOAD),   warn__nothres)    
-                dL = self.ss.depth - self.ss.depthtare
+                self.updateStateBox('run_startdepth', round(self.ssnap.depthtare,PRECISION_DEPTH), warn__nothres)    
+                self.updateStateBox('run_startload',  round(self.ssnap.loadtare,PRECISION_LOAD),   warn__nothres)    
+                dL = self.ssnap.depth - self.ssnap.depthtare
                 self.updateStateBox('run_deltadepth', round(dL,PRECISION_DEPTH), warn__corelength)
                 self.lbl_ETA.setText(self.htmlfont('<b>&#916;%.2fm'%(dL), FS_GRAPH_TITLE))
 
+        self.timing.mark('surface boxes')
+
         #-----------------------
         # Update drill state
         #-----------------------
         
-        if self.Nt % DTFRAC_DRILL == 0:
+        if self.drill_pending:
 
-            self.ds.update()
+            self.drill_pending = False
 
             ### Update graphs
-            self.hist_current   = np.roll(self.hist_current,  -1);   self.hist_current[-1]   = self.ds.motor_current
             sel = self.xlen_selector['current']
-            I0 = -int(self.xlen[sel]/(DT*DTFRAC_DRILL))
-            x = self.hist_time_drill[I0:len(self.hist_time_drill):self.xlen_samplerate[sel]]
-            y = self.hist_current[   I0:len(self.hist_time_drill):self.xlen_samplerate[sel]]
-            self.curve_current.setData(x=x,y=y)
-            self.plot_current.setTitle(self.htmlfont('<b>Current = %.1f A'%(self.ds.motor_current), FS_GRAPH_TITLE))
-
-            self.hist_depth     = np.roll(self.hist_depth, -1); self.hist_depth[-1] = np.abs(self.ss.depth) * 1e-3
-            self.hist_incl_ahrs = np.roll(self.hist_incl_ahrs, -1); self.hist_incl_ahrs[-1] = self.ds.incl_ahrs
-            self.hist_incl_sfus = np.roll(self.hist_incl_sfus, -1); self.hist_incl_sfus[-1] = self.ds.incl_sfus
+            age, y = self.hist_current.lod(int(self.xlen[sel]/(DT*DTFRAC_DRILL)), self.lod_points(self.plot_current))
+            self.curve_current.setData(x=age*DT*DTFRAC_DRILL/60, y=y)
+            self.plot_current.setTitle(self.htmlfont('<b>Current = %.1f A'%(self.dsnap.motor_current), FS_GRAPH_TITLE))
+
             sel = self.xlen_selector['incl']
             I0 = -int(self.xlen[sel]/(DT*DTFRAC_DRILL))
-            x = self.hist_depth[I0:len(self.hist_depth):self.xlen_samplerate[sel]]
-            y0 = self.hist_incl_sfus if self.orimethod=='sfus' else self.hist_incl_ahrs 
-            y = y0[I0:len(y0):self.xlen_samplerate[sel]]
-#            print(x,y)
-            self.incl_scatter.setData(x=y, y=x)
+            x = self.hist_depth[I0:len(self.hist_depth)]
 #            self.incl_scatter.setData(x = self.hist_incl_sfus[::dn] if self.orimethod=='sfus' else self.hist_incl_ahrs[::dn], y=self.hist_depth[::dn])
             self.plot_incl.setYRange(0, np.amax([0.3, np.amax(x)*1.03]), padding=0.02)
-            self.plot_incl.setTitle(self.htmlfont('<b>Inc = %.1f deg'%(self.ds.incl_sfus if self.orimethod=='sfus' else self.ds.incl_ahrs), FS_GRAPH_TITLE))
+            self.plot_incl.setTitle(self.htmlfont('<b>Inc = %.1f deg'%(self.dsnap.incl_sfus if self.orimethod=='sfus' else self.dsnap.incl_ahrs), FS_GRAPH_TITLE))
+            self.timing.mark('drill graphs')
 
             ### Check components statuses
-            self.status_drill.setText('Online' if self.ds.islive else 'Offline')
-            if self.ds.islive: self.status_drill.setStyleSheet("font-weight: bold; color: %s;"%(COLOR_DARKGREEN))
-            else:              self.status_drill.setStyleSheet("font-weight: bold; color: %s;"%(COLOR_DARKRED))
-            self.status_loadcell.setText('Online' if self.ss.islive_loadcell else 'Offline')
-            if self.ss.islive_loadcell: self.status_loadcell.setStyleSheet("font-weight: bold; color: %s;"%(COLOR_DARKGREEN))
-            else:                       self.status_loadcell.setStyleSheet("font-weight: bold; color: %s;"%(COLOR_DARKRED))
-            self.status_depthcounter.setText('Online' if self.ss.islive_depthcounter else 'Offline')
-            if self.ss.islive_depthcounter: self.status_depthcounter.setStyleSheet("font-weight: bold; color: %s;"%(COLOR_DARKGREEN))
-            else:                           self.status_depthcounter.setStyleSheet("font-weight: bold; color: %s;"%(COLOR_DARKRED))
-
-
-            if self.ds.islive or ALWAYS_SHOW_DRILL_FIELDS:
+            self.updateStatuses()
+
+
+            if self.dsnap.islive or ALWAYS_SHOW_DRILL_FIELDS:
                
                 ### Update state fields
-                (incl, azim, roll) = [ getattr(self.ds, '%s_%s'%(tt,self.orimethod)) for tt in ['incl','azim','roll']]
+                (incl, azim, roll) = [ getattr(self.dsnap, '%s_%s'%(tt,self.orimethod)) for tt in ['incl','azim','roll']]
                 self.updateStateBox('orientation_inclination',  '%.1f,&nbsp; <font color="%s">%.0f</font>,&nbsp; <font color="%s">%.0f</font>'%(incl, COLOR_DIAL1, azim, COLOR_DIAL2, roll), warn__nothres)
-                self.updateStateBox('orientation_spin',         "%.2f"%(self.ds.spin),        warn__nothres)
+                self.updateStateBox('orientation_spin',         "%.2f"%(self.dsnap.spin),        warn__nothres)
                 
-                qsys = '<font color="%s">%i</font>'%(COLOR_DARKGREEN if self.ds.quality_sys>=2   else COLOR_DARKRED, self.ds.quality_sys)
-                qgyr = '<font color="%s">%i</font>'%(COLOR_DARKGREEN if self.ds.quality_gyro>=2  else COLOR_DARKRED, self.ds.quality_gyro)
-                qacc = '<font color="%s">%i</font>'%(COLOR_DARKGREEN if self.ds.quality_accel>=2 else COLOR_DARKRED, self.ds.quality_accel)
-                qmag = '<font color="%s">%i</font>'%(COLOR_DARKGREEN if self.ds.quality_magn>=2  else COLOR_DARKRED, self.ds.quality_magn)
+                qsys = '<font color="%s">%i</font>'%(COLOR_DARKGREEN if self.dsnap.quality_sys>=2   else COLOR_DARKRED, self.dsnap.quality_sys)
+                qgyr = '<font color="%s">%i</font>'%(COLOR_DARKGREEN if self.dsnap.quality_gyro>=2  else COLOR_DARKRED, self.dsnap.quality_gyro)
+                qacc = '<font color="%s">%i</font>'%(COLOR_DARKGREEN if self.dsnap.quality_accel>=2 else COLOR_DARKRED, self.dsnap.quality_accel)
+                qmag = '<font color="%s">%i</font>'%(COLOR_DARKGREEN if self.dsnap.quality_magn>=2  else COLOR_DARKRED, self.dsnap.quality_magn)
                 self.updateStateBox('orientation_quality', '%s, %s, %s, %s'%(qsys,qgyr,qacc,qmag), warn__nothres)
                 
-                offsets = getattr(self.ds, 'offset_%s'%(self.orimethod))
+                offsets = getattr(self.dsnap, 'offset_%s'%(self.orimethod))
                 self.updateStateBox('orientation_offsets', "%.1f, %i, %i"%(offsets[0], offsets[1], offsets[2]),  warn__nothres)
 
                 if self.SHOW_BNO055_DETAILED:
-                    str_aclvec    = '[%.1f, %.1f, %.1f], %.1f'%(self.ds.accelerometer_x,self.ds.accelerometer_y,self.ds.accelerometer_z, self.ds.accelerometer_mag)
-                    str_magvec    = '[%.1f, %.1f, %.1f], %.1f'%(self.ds.magnetometer_x,self.ds.magnetometer_y,self.ds.magnetometer_z, self.ds.magnetometer_mag)
-                    str_linaclvec = '[%.1f, %.1f, %.1f], %.1f'%(self.ds.linearaccel_x,self.ds.linearaccel_y,self.ds.linearaccel_z, self.ds.linearaccel_mag)
-                    str_gravvec   = '[%.1f, %.1f, %.1f], %.1f'%(self.ds.gravity_x,self.ds.gravity_y,self.ds.gravity_z, self.ds.gravity_mag)
-                    str_spnvec    = '[%.1f, %.1f, %.1f], %.1f'%(self.ds.gyroscope_x,self.ds.gyroscope_y,self.ds.gyroscope_z, self.ds.gyroscope_mag)
-                    str_quatvec_sfus = '[%.2f, %.2f, %.2f, %.2f] %.1f'%(self.ds.quat_sfus[0],self.ds.quat_sfus[1],self.ds.quat_sfus[2],self.ds.quat_sfus[3], np.linalg.norm(self.ds.quat_sfus))
-                    str_quatvec_ahrs = '[%.2f, %.2f, %.2f, %.2f] %.1f'%(self.ds.quat_ahrs[0],self.ds.quat_ahrs[1],self.ds.quat_ahrs[2],self.ds.quat_ahrs[3], np.linalg.norm(self.ds.quat_ahrs))
+                    str_aclvec    = '[%.1f, %.1f, %.1f], %.1f'%(self.dsnap.accelerometer_x,self.dsnap.accelerometer_y,self.dsnap.accelerometer_z, self.dsnap.accelerometer_mag)
+                    str_magvec    = '[%.1f, %.1f, %.1f], %.1f'%(self.dsnap.magnetometer_x,self.dsnap.magnetometer_y,self.dsnap.magnetometer_z, self.dsnap.magnetometer_mag)
+                    str_linaclvec = '[%.1f, %.1f, %.1f], %.1f'%(self.dsnap.linearaccel_x,self.dsnap.linearaccel_y,self.dsnap.linearaccel_z, self.dsnap.linearaccel_mag)
+                    str_gravvec   = '[%.1f, %.1f, %.1f], %.1f'%(self.dsnap.gravity_x,self.dsnap.gravity_y,self.dsnap.gravity_z, self.dsnap.gravity_mag)
+                    str_spnvec    = '[%.1f, %.1f, %.1f], %.1f'%(self.dsnap.gyroscope_x,self.dsnap.gyroscope_y,self.dsnap.gyroscope_z, self.dsnap.gyroscope_mag)
+                    str_quatvec_sfus = '[%.2f, %.2f, %.2f, %.2f] %.1f'%(self.dsnap.quat_sfus[0],self.dsnap.quat_sfus[1],self.dsnap.quat_sfus[2],self.dsnap.quat_sfus[3], np.linalg.norm(self.dsnap.quat_sfus))
+                    str_quatvec_ahrs = '[%.2f, %.2f, %.2f, %.2f] %.1f'%(self.dsnap.quat_ahrs[0],self.dsnap.quat_ahrs[1],self.dsnap.quat_ahrs[2],self.dsnap.quat_ahrs[3], np.linalg.norm(self.dsnap.quat_ahrs))
                     self.updateStateBox('orientation_acceleration', str_aclvec, warn__nothres)
                     self.updateStateBox('orientation_magnetometer', str_magvec, warn__nothres)
 #                    self.updateStateBox('orientation_linearacceleration', str_linaclvec, warn__nothres)
@@ -1007,54 +1182,55 @@ class MainWidget(QWidget):
                     self.dial_azim.setValue(int(azim))
                     self.dial_roll.setValue(int(roll))
 
-                self.updateStateBox('pressure_electronics', round(self.ds.pressure_electronics,1), warn__pressure)
-                self.updateStateBox('pressure_topplug',     round(self.ds.pressure_topplug,1),     warn__pressure)
-                self.updateStateBox('pressure_gear1',       (round(self.ds.pressure_gear1,1),round(self.ds.pressure_gear2,1)), warn__pressure)
-#                self.updateStateBox('pressure_gear2',       round(self.ds.pressure_gear2,1),       warn__pressure)
-                self.updateStateBox('hammer',               round(self.ds.hammer,1),               warn__hammer)
-
-                self.updateStateBox('temperature_topplug',        round(self.ds.temperature_topplug,1),        warn__temperature_electronics)
-                self.updateStateBox('temperature_gear1',          (round(self.ds.temperature_gear1,1), round(self.ds.temperature_gear1,1)), warn__temperature_electronics)
-#                self.updateStateBox('temperature_gear2',          round(self.ds.temperature_gear1,1),          warn__temperature_electronics)
-                self.updateStateBox('temperature_electronics',    (round(self.ds.temperature_electronics,1),round(self.ds.temperature_auxelectronics,1)), warn__temperature_electronics)
-#                self.updateStateBox('temperature_electronics',    round(self.ds.temperature_electronics,1),    warn__temperature_electronics)
-#                self.updateStateBox('temperature_auxelectronics', round(self.ds.temperature_auxelectronics,1), warn__temperature_electronics)
-                self.updateStateBox('temperature_motor',          round(self.ds.temperature_motor,1),          warn__temperature_motor)    
-                self.updateStateBox('temperature_motorctrl',      round(self.ds.motor_controller_temp,1),      warn__temperature_motor)    
+                self.updateStateBox('pressure_electronics', round(self.dsnap.pressure_electronics,1), warn__pressure)
+                self.updateStateBox('pressure_topplug',     round(self.dsnap.pressure_topplug,1),     warn__pressure)
+                self.updateStateBox('pressure_gear1',       (round(self.dsnap.pressure_gear1,1),round(self.dsnap.pressure_gear2,1)), warn__pressure)
+#                self.updateStateBox('pressure_gear2',       round(self.dsnap.pressure_gear2,1),       warn__pressure)
+                self.updateStateBox('hammer',               round(self.dsnap.hammer,1),               warn__hammer)
+
+                self.updateStateBox('temperature_topplug',        round(self.dsnap.temperature_topplug,1),        warn__temperature_electronics)
+                self.updateStateBox('temperature_gear1',          (round(self.dsnap.temperature_gear1,1), round(self.dsnap.temperature_gear1,1)), warn__temperature_electronics)
+#                self.updateStateBox('temperature_gear2',          round(self.dsnap.temperature_gear1,1),          warn__temperature_electronics)
+                self.updateStateBox('temperature_electronics',    (round(self.dsnap.temperature_electronics,1),round(self.dsnap.temperature_auxelectronics,1)), warn__temperature_electronics)
+#                self.updateStateBox('temperature_electronics',    round(self.dsnap.temperature_electronics,1),    warn__temperature_electronics)
+#                self.updateStateBox('temperature_auxelectronics', round(self.dsnap.temperature_auxelectronics,1), warn__temperature_electronics)
+                self.updateStateBox('temperature_motor',          round(self.dsnap.temperature_motor,1),          warn__temperature_motor)    
+                self.updateStateBox('temperature_motorctrl',      round(self.dsnap.motor_controller_temp,1),      warn__temperature_motor)    
                 
-                self.updateStateBox('motor_current',    round(self.ds.motor_current,1),  warn__motor_current)
-                self.updateStateBox('motor_speed',      round(self.ds.motor_rpm,1),      warn__motor_rpm)    
-                self.updateStateBox('motor_voltage',    round(self.ds.motor_voltage,1),  warn__nothres)    
-                self.updateStateBox('motor_throttle',   int(self.ds.motor_throttle), warn__nothres)
-                self.updateStateBox('motor_tachometer', round(self.ds.tachometer*TACHO_PRE_REV,2), warn__nothres)
+                self.updateStateBox('motor_current',    round(self.dsnap.motor_current,1),  warn__motor_current)
+                self.updateStateBox('motor_speed',      round(self.dsnap.motor_rpm,1),      warn__motor_rpm)    
+                self.updateStateBox('motor_voltage',    round(self.dsnap.motor_voltage,1),  warn__nothres)    
+                self.updateStateBox('motor_throttle',   int(self.dsnap.motor_throttle), warn__nothres)
+                self.updateStateBox('motor_tachometer', round(self.dsnap.tachometer*TACHO_PRE_REV,2), warn__nothres)
+
+            self.timing.mark('drill boxes')
         
         ### Disabled widgets if drill state is dead
         
         if not ALWAYS_SHOW_DRILL_FIELDS:
-            self.gb_orientation.setEnabled(self.ds.islive)
-            self.gb_pressure.setEnabled(self.ds.islive)
-            self.gb_temperature.setEnabled(self.ds.islive)
-            self.gb_surface_downholevoltage.setEnabled(self.ds.islive)
+            self.gb_orientation.setEnabled(self.dsnap.islive)
+            self.gb_pressure.setEnabled(self.dsnap.islive)
+            self.gb_temperature.setEnabled(self.dsnap.islive)
+            self.gb_surface_downholevoltage.setEnabled(self.dsnap.islive)
 
-        self.gb_motor.setEnabled(self.ds.islive)
+        self.gb_motor.setEnabled(self.dsnap.islive)
         self.gb_expert.setEnabled(True)
+        self.timing.mark('widgets')
 
         ### Disabled widgets if winch encoder is dead
 
 #        for f in ['gb_surface_depth','gb_surface_speed']:
 #            lbl = getattr(self, f)
-#            lbl.setEnabled(self.ss.islive_loadcell)
+#            lbl.setEnabled(self.ssnap.islive_loadcell)
                         
         ### Disabled widgets if load cell is dead
                         
 #        for f in ['gb_surface_load','gb_surface_loadcable','gb_run_peakload']:
 #            lbl = getattr(self, f)
-#            lbl.setEnabled(self.ss.islive_depthcounter)
+#            lbl.setEnabled(self.ssnap.islive_depthcounter)
             
         
         ### END
-                    
-        self.Nt += 1
         
     def timestamp(self, turnaround):
         total_seconds = int(turnaround.total_seconds())
@@ -1083,33 +1259,23 @@ class DepthProgressBar(QWidget):
         return QtCore.QSize(50,300)
         
     def setValue(self, currentDepth, iceDepth):
+        maxval = max(iceDepth, 0.1)
+        if (currentDepth, maxval) == (self.curval, self.maxval): return
         self.curval = currentDepth
-        self.maxval = np.amax([iceDepth,0.1])
-        self.repaint()
+        self.maxval = maxval
+        self.update() # schedule repaint together with the other widgets changed this tick
 
     def paintEvent(self, e):
 
         self.painter = QtGui.QPainter(self)
         self.H, self.W = self.painter.device().height(), self.painter.device().width()
 
-        ### Backgorund (fluid)
-        brush = QtGui.QBrush()
-        c_fluid = 'white' #COLOR_GRAYBG 
-        brush.setColor(QtGui.QColor(c_fluid))
-        brush.setStyle(Qt.SolidPattern)
-        rect = QtCore.QRect(0, 0, self.W, self.H)
-        self.painter.fillRect(rect, brush)
-        
         # Zoom-in for drilling mode?
         Htol = 1 # meter above bottom before change to zoom-in 
-        if self.curval<self.maxval - Htol:
-            Hrel_ice = 0.05
-            self.draw_ice(Hrel_ice)
-            Hrel_drill = self.curval/self.maxval * (1-Hrel_ice)
-            tol = 25 # metre
-            c_drill = COLOR_DARKGREEN if self.curval < self.maxval - tol else COLOR_DARKRED
-            self.draw_drill(Hrel_drill, c_drill)
-            
+        zoomin = self.curval<self.maxval - Htol
+        if zoomin:
+            Hice, Htot = None, None
+        
         # Zoom-out for travelling mode?
         else:
             # ice mass
@@ -1117,8 +1283,19 @@ class DepthProgressBar(QWidget):
             if self.curval-self.maxval > 2: Hice = 4
             if self.curval-self.maxval > 4: Hice = 5 
             Htot = Htol+Hice
-            self.draw_ice(Hice/Htot)
 
+        # Only the drill (and hatched delta L) changes with depth; the layers below and above it are cached
+        below, above = self.static_layers(zoomin, Htol, Hice, Htot)
+        self.painter.drawPixmap(0, 0, below)
+
+        if zoomin:
+            Hrel_ice = 0.05
+            Hrel_drill = self.curval/self.maxval * (1-Hrel_ice)
+            tol = 25 # metre
+            c_drill = COLOR_DARKGREEN if self.curval < self.maxval - tol else COLOR_DARKRED
+            self.draw_drill(Hrel_drill, c_drill)
+            
+        else:
             # drill depth
             Hrel_drill = (self.curval-self.maxval+1)/Htot
             self.draw_drill(Hrel_drill, COLOR_DARKGREEN)
@@ -1131,6 +1308,44 @@ class DepthProgressBar(QWidget):
                 rect = QtCore.QRect(0, int(Htol/Htot*self.H), self.W, int((Hrel_drill-Htol/Htot)*self.H))
                 self.painter.fillRect(rect, brush)
 
+        self.painter.drawPixmap(0, 0, above)
+        self.painter.end()
+
+    def static_layers(self, zoomin, Htol, Hice, Htot):
+        # Pixmaps of what is drawn below the drill (background, ice) and above it (depth lines, walls); redrawn only on resize or change of zoom
+        key = (zoomin, Hice, self.W, self.H, self.devicePixelRatioF())
+        if getattr(self, 'layers_key', None) == key: return self.layers
+        painter = self.painter
+        self.layers = []
+        for layer in ['below', 'above']:
+            pixmap = QtGui.QPixmap(int(self.W*key[-1]), int(self.H*key[-1]))
+            pixmap.setDevicePixelRatio(key[-1])
+            pixmap.fill(Qt.transparent)
+            self.painter = QtGui.QPainter(pixmap)
+            if layer == 'below': self.draw_below(zoomin, Hice, Htot)
+            else:                self.draw_above(zoomin, Htol, Hice, Htot)
+            self.painter.end()
+            self.layers.append(pixmap)
+        self.painter = painter
+        self.layers_key = key
+        return self.layers
+
+    def draw_below(self, zoomin, Hice, Htot):
+
+        ### Backgorund (fluid)
+        brush = QtGui.QBrush()
+        c_fluid = 'white' #COLOR_GRAYBG 
+        brush.setColor(QtGui.QColor(c_fluid))
+        brush.setStyle(Qt.SolidPattern)
+        rect = QtCore.QRect(0, 0, self.W, self.H)
+        self.painter.fillRect(rect, brush)
+        
+        if zoomin: self.draw_ice(0.05)
+        else:      self.draw_ice(Hice/Htot)
+
+    def draw_above(self, zoomin, Htol, Hice, Htot):
+
+        if not zoomin:
             # horiz lines
             self.painter.setPen(QtGui.QPen(Qt.black, 3.5, Qt.SolidLine))
             H0 = int(1/Htot * self.H)
@@ -1149,8 +1364,6 @@ class DepthProgressBar(QWidget):
         self.painter.drawLine(0,self.H,self.W,self.H)
         self.painter.drawLine(0,0,self.W,0)
         
-        self.painter.end()
-        
     def draw_drill(self, Hrel, color):
         brush = QtGui.QBrush()
         brush.setColor(QtGui.QColor(color))
@@ -1201,9 +1414,22 @@ if __name__ == '__main__':
     W = 0 # setting width = 0 effectively sets the minimal window width allowed by the widgets enclosed
     main.setGeometry(0, dH, W, H)
     
-    # Update main window with latest field values ever DT seconds
-    timer1 = QTimer()
-    timer1.timeout.connect(main.eventListener)
-    timer1.start(int(DT*1000))
+    # Update main window with latest field values ever DT seconds, acquired in a background thread
+    if PROFILE:
+        os.system('mkdir -p %s'%(PATH_PROFILE))
+        fprofile = '%s/drill-control_%s_%%s.prof'%(PATH_PROFILE, datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S'))
+    acquisition = Acquisition(main.ds, main.ss, DT, DTFRAC_DRILL, program='drill-control', profile=fprofile%('acquisition') if PROFILE else None)
+    acquisition.timers['gui'] = main.timing
+    main.timers = acquisition.timers # GUI and acquisition timing, shown in overlay
+    acquisition.acquired.connect(main.eventListener)
+    app.aboutToQuit.connect(acquisition.stop)
+    acquisition.start()
+    
+    if PROFILE:
+        profiler = cProfile.Profile() # GUI thread
+        profiler.enable()
+        exitcode = app.exec()
+        dump_profile(profiler, fprofile%('gui'))
+        sys.exit(exitcode)
     
     sys.exit(app.exec())
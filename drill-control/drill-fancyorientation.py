@@ -6,7 +6,6 @@
 import code # code.interact(local=locals())
 
 import os, sys, math, time
-import pandas as pd
 from math import copysign, fabs, sqrt, pi, sin, cos, asin, acos, atan2, exp, log
 import numpy as np
 import matplotlib
@@ -117,6 +116,10 @@ class Arrow3D(FancyArrowPatch):
         super().__init__((0,0), (0,0), *args, **kwargs)
         self._verts3d = xs, ys, zs
 
+    def set_data_3d(self, xs, ys, zs):
+        self._verts3d = xs, ys, zs
+        self.stale = True
+
     def do_3d_projection(self, renderer=None):
         xs3d, ys3d, zs3d = self._verts3d
         xs, ys, zs = proj3d.proj_transform(xs3d, ys3d, zs3d, self.axes.M)
@@ -140,26 +143,69 @@ class RotationVisualizer3D(object):
         '''
         arrow = Arrow3D((ox, ux), (oy, uy), (oz, uz), mutation_scale=30, lw=lw, arrowstyle="-|>", color=color)    
         ax.add_artist(arrow)
+        return arrow
         
 
     def plot_vector(self, ax, x, y, z, ox=0, oy=0, oz=0, style='-', color='k', lw=lw_default, lwax=lw_default, arrow=False, arrow_rho=0.94):
         '''
         Plot a 3D vector from (ox, oy, oz) to (x, y, z).
+        Returns the artists (line, arrow), where arrow is None if not drawn, for moving the vector with set_vector().
         '''
         
-        ax.plot((ox, x), (oy, y), (oz, z), style, lw=lw, color=color)
+        line, = ax.plot((ox, x), (oy, y), (oz, z), style, lw=lw, color=color)
         
         if arrow:
             aox = ox * (1 - arrow_rho) + x * arrow_rho
             aoy = oy * (1 - arrow_rho) + y * arrow_rho
             aoz = oz * (1 - arrow_rho) + z * arrow_rho
-            self.plot_arrow(ax, aox, aoy, aoz, x, y, z, color=color, lw=lw)
+            arrow = self.plot_arrow(ax, aox, aoy, aoz, x, y, z, color=color, lw=lw)
+        else:
+            arrow = None
+            
+        return line, arrow
+
+
+    def set_vector(self, artists, x, y, z, ox=0, oy=0, oz=0, arrow_rho=0.94):
+        '''
+        Move a vector plotted by plot_vector() to go from (ox, oy, oz) to (x, y, z).
+        '''
+        
+        line, arrow = artists
+        line.set_data_3d((ox, x), (oy, y), (oz, z))
+        
+        if arrow is not None:
+            aox = ox * (1 - arrow_rho) + x * arrow_rho
+            aoy = oy * (1 - arrow_rho) + y * arrow_rho
+            aoz = oz * (1 - arrow_rho) + z * arrow_rho
+            arrow.set_data_3d((aox, x), (aoy, y), (aoz, z))
 
 
     def plot_xyz_axes(self, ax, rotation, t, scale=1, style='-', cx=cx, cy=cy, cz=cz, arrow=False, method='R'):
         '''
         Plot the xyz axes indication using three short line segments in red, green 
         and blue, given the new reference frame indicated by (R, t). 
+        Returns the artists of the three vectors, for moving the axes with set_xyz_axes().
+        '''
+    
+        x, y, z = self.xyz_axes_points(rotation, t, scale, method)
+
+        return [self.plot_vector(ax, x[0, 1], x[1, 1], x[2, 1],  x[0, 0], x[1, 0], x[2, 0],  style=style, color=cx, arrow=arrow), \
+                self.plot_vector(ax, y[0, 1], y[1, 1], y[2, 1],  y[0, 0], y[1, 0], y[2, 0],  style=style, color=cy, arrow=arrow), \
+                self.plot_vector(ax, z[0, 1], z[1, 1], z[2, 1],  z[0, 0], z[1, 0], z[2, 0],  style=style, color=cz, arrow=arrow)]
+
+
+    def set_xyz_axes(self, artists, rotation, t, scale=1, method='R'):
+        '''
+        Move the xyz axes plotted by plot_xyz_axes() to the reference frame indicated by (R, t).
+        '''
+    
+        for h, p in zip(artists, self.xyz_axes_points(rotation, t, scale, method)):
+            self.set_vector(h, p[0, 1], p[1, 1], p[2, 1],  p[0, 0], p[1, 0], p[2, 0])
+
+
+    def xyz_axes_points(self, rotation, t, scale, method):
+        '''
+        End points (3-by-2 matrices) of the x, y and z axes in the reference frame indicated by (R, t).
         '''
     
         x = np.asarray([[0, 0, 0], [scale, 0, 0]]).T
@@ -170,15 +216,14 @@ class RotationVisualizer3D(object):
     
         z = np.asarray([[0, 0, 0], [0, 0, scale]]).T
         z = rotate_translate_points(z, rotation, t, method)
-
-        self.plot_vector(ax, x[0, 1], x[1, 1], x[2, 1],  x[0, 0], x[1, 0], x[2, 0],  style=style, color=cx, arrow=arrow)
-        self.plot_vector(ax, y[0, 1], y[1, 1], y[2, 1],  y[0, 0], y[1, 0], y[2, 0],  style=style, color=cy, arrow=arrow)
-        self.plot_vector(ax, z[0, 1], z[1, 1], z[2, 1],  z[0, 0], z[1, 0], z[2, 0],  style=style, color=cz, arrow=arrow)
+        
+        return x, y, z
 
     
     def plot_arc_points(self, ax, x, y, z, rotation, t, style='-', color='k', lw=lw_default, arrow=False, method='R'):
         '''
         Plot a sequence of 3D points of an arc.
+        Returns the artists (line, arrow), where arrow is None if not drawn.
         '''
         
         nr_points = x.shape[0]
@@ -190,9 +235,11 @@ class RotationVisualizer3D(object):
         
         p = rotate_translate_points(p, rotation, t, method)
         
-        ax.plot(p[0, :], p[1, :], p[2, :], style, lw=lw, color=color)
+        line, = ax.plot(p[0, :], p[1, :], p[2, :], style, lw=lw, color=color)
 
-        if arrow: self.plot_arrow(ax, p[0, -2], p[1, -2], p[2, -2], p[0, -1], p[1, -1], p[2, -1], color=color)
+        arrow = self.plot_arrow(ax, p[0, -2], p[1, -2], p[2, -2], p[0, -1], p[1, -1], p[2, -1], color=color) if arrow else None
+        
+        return line, arrow
             
 
     def plot_surface(self, ax, x, y, z, rotation, t, color='w', alpha=alpha0, method='R'):
@@ -258,32 +305,54 @@ class RotationVisualizer3D(object):
     def plot_arc(self, ax, start, angle, rotation, t, r, plane='xoy', style='-', lw=lw_default, color='k', arrow=False, method='R'):
         '''
         Plot an arc in 3D.
+        Returns the artists (line, arrow), or None if the arc is too short to draw.
+        '''
+        
+        xyz = self.generate_arc_points(start, angle, r, plane)
+        
+        if xyz is not None:
+            return self.plot_arc_points(ax, *xyz, rotation, t, style=style, color=color, lw=lw, arrow=arrow, method=method)
+
+
+    def set_arc(self, artists, start, angle, rotation, t, r, plane='xoy', method='R'):
+        '''
+        Move an arc plotted by plot_arc() (without arrow) to the reference frame indicated by (R, t).
+        '''
+        
+        x, y, z = self.generate_arc_points(start, angle, r, plane)
+        p = rotate_translate_points(np.array([x, y, z]), rotation, t, method)
+        artists[0].set_data_3d(p[0, :], p[1, :], p[2, :])
+
+
+    def generate_arc_points(self, start, angle, r, plane):
+        '''
+        Generate the (x, y, z) coordinates of the points on an arc.
         '''
         
         a = self.generate_arc_angles(start, angle)
         
-        if a is not None:
+        if a is None:
+            return None
             
-            if plane == 'xoy':
-                x = r * np.cos(a)
-                y = r * np.sin(a)
-                z = np.zeros(a.shape)
-                
-            elif plane == 'yoz':
-                x = np.zeros(a.shape)
-                y = r * np.cos(a)
-                z = r * np.sin(a)
-                
-            elif plane == 'zox':
-                x = r * np.sin(a)
-                y = np.zeros(a.shape)
-                z = r * np.cos(a)
-                
-            else:
-                raise ValueError('Unknown plane: %s' % str(plane))
-                
-            self.plot_arc_points(ax, x, y, z, rotation, t, style=style, color=color, lw=lw, arrow=arrow, method=method)
-
+        if plane == 'xoy':
+            x = r * np.cos(a)
+            y = r * np.sin(a)
+            z = np.zeros(a.shape)
+            
+        elif plane == 'yoz':
+            x = np.zeros(a.shape)
+            y = r * np.cos(a)
+            z = r * np.sin(a)
+            
+        elif plane == 'zox':
+            x = r * np.sin(a)
+            y = np.zeros(a.shape)
+            z = r * np.cos(a)
+            
+        else:
+            raise ValueError('Unknown plane: %s' % str(plane))
+            
+        return x, y, z
         
 
     def plot_circle(self, ax, rotation, t, r, plane='xoy', style='-', color='k', arrow=False, method='R'):
@@ -291,7 +360,25 @@ class RotationVisualizer3D(object):
         Plot a circle in 3D.
         '''
         
-        self.plot_arc(ax, 0, 2 * np.pi, rotation, t, r, plane=plane, style=style, color=color, arrow=arrow, lw=3, method=method)
+        return self.plot_arc(ax, 0, 2 * np.pi, rotation, t, r, plane=plane, style=style, color=color, arrow=arrow, lw=3, method=method)
+
+
+    def set_circle(self, artists, rotation, t, r, plane='xoy', method='R'):
+        '''
+        Move a circle plotted by plot_circle() to the reference frame indicated by (R, t).
+        '''
+        
+        self.set_arc(artists, 0, 2 * np.pi, rotation, t, r, plane=plane, method=method)
+
+
+    def set_visible(self, artists, visible):
+        '''
+        Show or hide the (line, arrow) artists returned by plot_vector(), plot_circle(), etc.
+        '''
+        
+        for line, arrow in artists:
+            line.set_visible(visible)
+            if arrow is not None: arrow.set_visible(visible)
     
     def plot_sector(self, ax, start, angle, rotation, t, r, plane='xoy', color='w', alpha=alpha0, method='R'):
         '''
@@ -533,11 +620,13 @@ class QuaternionVisualizer3D(RotationVisualizer3D):
         
         ### Finish
         
+        self.setup_ax3d_plot()
         self.update_ax3d_plot()
         
 
     def setup_ui_profile(self, oriplot):
     
+        import pandas as pd # only needed here, so don't pay for importing it at start-up
         fields = ['azimuth', 'bottom_sensor', 'compass', 'depth', 'fluxgate_1_raw', 'fluxgate_2_raw', 'inclination', 'inclinometer_1_raw', 'inclinometer_2_raw', 'lower_diameter', \
                   'lower_diameter_max_raw', 'lower_diameter_min_raw', 'pressure', 'pressure_raw', 'record_number', 'temperature_pressure_transducer', 'thermistor_high', 'thermistor_high_raw', \
                   'upper_diameter', 'upper_diameter_max_raw', 'upper_diameter_min_raw', 'thermistor_low', 'thermistor_low_raw']
@@ -634,18 +723,11 @@ class QuaternionVisualizer3D(RotationVisualizer3D):
             self.h_oriplot_sfus.set_xdata(self.drill_roll_sfus)
 
     
-    def update_ax3d_plot(self):
+    def setup_ax3d_plot(self):
         '''
-        Update the 3D plot based on internal states.
-        
-        All computations of rotation use unit quaternion.
-        
+        Draw the static parts of the 3D plot (reference frames, legend), and create the artists of the rotated axes, 
+        which update_ax3d_plot() then moves in place rather than redrawing the plot.
         '''
-        
-        self.ax3d.clear()
-
-        if self.view_followdrill:
-            self.ax3d.view_init(azim=180+self.ds.azim_sfus, elev=90-self.ds.incl_sfus)
 
         ### Draw horizontal flow field 
         
@@ -673,11 +755,11 @@ class QuaternionVisualizer3D(RotationVisualizer3D):
 #        self.plot_xyz_axes(self.ax3d, qi, O, scale=scale, style='-', cx=cf, cy=cf, cz=cf, arrow=True, method='q')
 #        self.plot_xyz_axes(self.ax3d, qi, O, scale=scale, style=':', cx=cx, cy=cy, cz=cz, arrow=False, method='q')
 
-        # Plot the rotated axes.        
-        if self.show_sfus: self.plot_circle(self.ax3d, self.q_sfus, O, r, plane='xoy', style='--', color=c_dred, method='q')
-        if self.show_ahrs: self.plot_circle(self.ax3d, self.q_ahrs, O, r, plane='xoy', style='-', color=c_dred, method='q')
-        if self.show_sfus: self.plot_xyz_axes(self.ax3d, self.q_sfus, O, scale=scale, style='--', cx=cx, cy=cy, cz=cz, arrow=True, method='q')
-        if self.show_ahrs: self.plot_xyz_axes(self.ax3d, self.q_ahrs, O, scale=scale, style='-', cx=cx, cy=cy, cz=cz, arrow=True, method='q')
+        # The rotated axes (unrotated until update_ax3d_plot() moves them)
+        self.h_circle_sfus = self.plot_circle(self.ax3d, qi, O, r, plane='xoy', style='--', color=c_dred, method='q')
+        self.h_circle_ahrs = self.plot_circle(self.ax3d, qi, O, r, plane='xoy', style='-', color=c_dred, method='q')
+        self.h_axes_sfus = self.plot_xyz_axes(self.ax3d, qi, O, scale=scale, style='--', cx=cx, cy=cy, cz=cz, arrow=True, method='q')
+        self.h_axes_ahrs = self.plot_xyz_axes(self.ax3d, qi, O, scale=scale, style='-', cx=cx, cy=cy, cz=cz, arrow=True, method='q')
 
         # Trench frame
         lwc = lw_default-1
@@ -685,15 +767,6 @@ class QuaternionVisualizer3D(RotationVisualizer3D):
         self.plot_vector(self.ax3d, 0,scale*1,0,  0,0,0,  style='-', color=cey, lw=lwc, arrow=True)
         self.plot_vector(self.ax3d, 0,0,-scale*1,  0,0,0,  style='-', color=cez, lw=lwc, arrow=True)
 
-        # debug:
-        if 0:
-            x,y,z = [scale*self.ds.xi_sfus[ii] for ii in range(3)]
-    #        print(x,y,z)
-            self.plot_vector(self.ax3d, *x,  0,0,0,  style='-', color=cx, lw=lwc, arrow=True)
-            self.plot_vector(self.ax3d, *y,  0,0,0,  style='-', color=cy, lw=lwc, arrow=True)
-            self.plot_vector(self.ax3d, *z,  0,0,0,  style='-', color=cz, lw=lwc, arrow=True)
-
-
         self.adjust_axes(self.ax3d, scale=scale)
 
         self.ax3d.legend(self.legend_lines, ['$+x$ axis: Trench parallel', '$+y$ axis: Trench perp.', '$-z$ axis: Plumb line', \
@@ -702,6 +775,30 @@ class QuaternionVisualizer3D(RotationVisualizer3D):
                             loc=2, bbox_to_anchor=(-0.07,0.95), ncol=1, fancybox=False, framealpha=1, frameon=False, edgecolor=frameec, fontsize=12)
 
 
+    def update_ax3d_plot(self):
+        '''
+        Update the 3D plot based on internal states.
+        
+        All computations of rotation use unit quaternion.
+        
+        Only the artists of the rotated axes (see setup_ax3d_plot()) are moved.
+        '''
+        
+        if self.view_followdrill:
+            self.ax3d.view_init(azim=180+self.ds.azim_sfus, elev=90-self.ds.incl_sfus)
+
+        O = np.asarray((0, 0, 0)).reshape((3, 1))
+        r = 2
+        scale = 2
+
+        # Move the rotated axes.
+        for q, show, h_circle, h_axes in [(self.q_sfus, self.show_sfus, self.h_circle_sfus, self.h_axes_sfus), (self.q_ahrs, self.show_ahrs, self.h_circle_ahrs, self.h_axes_ahrs)]:
+            self.set_visible([h_circle, *h_axes], bool(show))
+            if not show: continue
+            self.set_circle(h_circle, q, O, r, plane='xoy', method='q')
+            self.set_xyz_axes(h_axes, q, O, scale=scale, method='q')
+
+
     def run(self, dt=1, debug=False, REDIS_HOST=REDIS_HOST, AHRS_estimator='SAAM'):
 
         nn = 0
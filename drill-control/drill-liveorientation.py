@@ -0,0 +1,333 @@
+#!/usr/bin/python
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Live drill orientation viewer (Qt/pyqtgraph), drawn from the same background acquisition as drill-control.py.
+
+Unlike drill-orientation.py, which polls the drill state in a matplotlib event loop at about 1 Hz, the drill and
+surface states are acquired in a worker thread (see acquisition.py) and every drawn item is created once and only
+moved on updates, so orientation feedback (e.g. while inching) follows the drill state packets at little CPU cost.
+
+The 3D view of the drill axis and spring direction is an orthographic projection onto a plain pyqtgraph plot
+(Scene3D), so no OpenGL is needed.
+
+Usage:
+    python3 drill-liveorientation.py [AHRS_estimator]
+"""
+
+import sys, signal
+import numpy as np
+
+from settings import *
+from state_drill import *
+from state_surface import *
+from history import RingHistory
+from plotitems import IncrementalScatter
+from scheduler import RenderScheduler
+from acquisition import Acquisition
+from profiling import SectionTimer
+
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+from PyQt5 import QtCore, QtGui
+from PyQt5.QtCore import Qt
+
+import pyqtgraph as pg
+
+#-------------------
+# Settings
+#-------------------
+
+DT           = 1/8 # update rate in seconds for GUI/surface state
+DTFRAC_DRILL = 1   # update the drill state every DTFRAC_DRILL times the surface state is updated, i.e. at the packet rate
+
+TRAIL   = 2*60  # seconds of incl/azim/roll shown in trails
+PROFILE = 45*60 # seconds of drill states kept in depth-inclination profile (stationary drill states are merged)
+
+INCL_LIMS = [0,10] # x lims for inclination profile
+
+FS = 13
+
+cs_azim = 0 # frame azim offset (as in drill-orientation.py)
+azim0, elev0 = -68+cs_azim, 22 # default (sideways) view
+
+# Colors (as in drill-orientation.py)
+c_dred  = '#cb181d'
+c_dblue = '#2171b5'
+c_red   = '#fb6a4a'
+c_blue  = '#6baed6'
+c_dgray = '#4d4d4d'
+c_ahrs  = '#fb9a99'
+
+COLOR_GRAYBG = '#f0f0f0'
+
+#-------------------
+# 3D scene
+#-------------------
+
+def projection(azim, elev):
+    '''Rows are the screen x and y axes of an orthographic view from azimuth azim and elevation elev (deg., as in matplotlib)'''
+    a, e = np.deg2rad(azim), np.deg2rad(elev)
+    return np.array([[-np.sin(a), np.cos(a), 0], [-np.cos(a)*np.sin(e), -np.sin(a)*np.sin(e), np.cos(e)]])
+
+class Scene3D():
+
+    """
+        3D polylines (optionally with an arrow head at the last point) drawn on a pyqtgraph plot by orthographic projection.
+        Items are created once by add(); set() moves an item and view() changes the projection of all items.
+    """
+
+    def __init__(self, plot, azim=azim0, elev=elev0):
+        self.plot = plot
+        self.items = {} # name -> [3-by-n points, PlotDataItem, ArrowItem or None]
+        self.P = projection(azim, elev)
+
+    def add(self, name, p, color, width=4, style=Qt.SolidLine, arrow=False, label=None):
+        line = self.plot.plot(pen=pg.mkPen(color, width=width, style=style), name=label)
+        head = None
+        if arrow:
+            head = pg.ArrowItem(headLen=18, headWidth=9, tailLen=0, pen=None, brush=color)
+            self.plot.addItem(head)
+        self.items[name] = [None, line, head]
+        self.set(name, p)
+
+    def set(self, name, p):
+        self.items[name][0] = np.asarray(p, dtype=np.float64)
+        self.draw(name)
+
+    def setVisible(self, name, visible):
+        for item in self.items[name][1:]:
+            if item is not None: item.setVisible(visible)
+
+    def view(self, azim, elev):
+        self.P = projection(azim, elev)
+        for name in self.items: self.draw(name)
+
+    def draw(self, name):
+        p, line, head = self.items[name]
+        q = self.P @ p
+        line.setData(q[0], q[1])
+        if head is not None:
+            dx, dy = q[:,-1] - q[:,-2]
+            head.setPos(q[0,-1], q[1,-1])
+            head.setStyle(angle=180-np.rad2deg(np.arctan2(dy, dx))) # angle=0 points left
+
+def circle(r, n=72):
+    phi = np.linspace(0, 2*np.pi, n)
+    return np.array([r*np.cos(phi), r*np.sin(phi), 0*phi])
+
+def vector(x, y, z):
+    return np.array([[0,x], [0,y], [0,z]], dtype=np.float64)
+
+#-------------------
+# Program start
+#-------------------
+
+class OrientationWidget(QWidget):
+
+    methods = ['sfus', 'ahrs']
+    labels  = {'sfus':'SFUS', 'ahrs':'AHRS'}
+    styles  = {'sfus':Qt.SolidLine, 'ahrs':Qt.DashLine}
+    colors  = {'sfus':c_dred, 'ahrs':c_ahrs} # of profile and trails
+
+    def __init__(self, AHRS_estimator='SAAM', parent=None):
+
+        super().__init__(parent)
+
+        self.ds = DrillState(redis_host=REDIS_HOST, AHRS_estimator=AHRS_estimator)
+        self.ss = SurfaceState(1, DT, redis_host=REDIS_HOST)
+        self.dsnap, self.ssnap = self.ds.snapshot, self.ss.snapshot
+
+        self.showmethod = {'sfus':True, 'ahrs':False}
+        self.view_followdrill = False
+
+        self.scheduler = RenderScheduler(self)
+        self.key_drill = None # drawn orientation, to tell if it changed
+        self.timing = SectionTimer(['ingest', 'scene', 'trails'])
+
+        pg.setConfigOptions(background=COLOR_GRAYBG, foreground='k', antialias=True)
+
+        ### 3D view
+
+        self.plot_scene = pg.PlotWidget()
+        self.plot_scene.setAspectLocked(True)
+        self.plot_scene.hideAxis('left')
+        self.plot_scene.hideAxis('bottom')
+        self.plot_scene.setMenuEnabled(False)
+        self.plot_scene.setMouseEnabled(x=False, y=False)
+        self.plot_scene.setRange(xRange=[-2.6,2.6], yRange=[-2.6,2.6], padding=0)
+        self.plot_scene.addLegend(offset=(10,10), labelTextSize='%ipt'%(FS-2))
+
+        r = scale = 2
+        self.scene = Scene3D(self.plot_scene)
+        self.scene.add('plane', circle(r), c_dgray, width=3)
+        self.scene.add('trench x', vector(scale,0,0),  c_blue,  width=3, arrow=True, label='+x axis: Trench parallel')
+        self.scene.add('trench y', vector(0,scale,0),  c_dgray, width=3, arrow=True, label='+y axis: Trench perp.')
+        self.scene.add('trench z', vector(0,0,-scale), c_red,   width=3, arrow=True, label='-z axis: Plumb line')
+        for m in self.methods: # moved by render()
+            self.scene.add('circle %s'%(m), circle(r), c_dred, width=3, style=self.styles[m])
+            self.scene.add('spring %s'%(m), vector(scale,0,0), c_dblue, style=self.styles[m], arrow=True, label='Spring direction (%s)'%(self.labels[m]))
+            self.scene.add('drill %s'%(m),  vector(0,0,scale), c_dred,  style=self.styles[m], arrow=True, label='Drill axis (%s)'%(self.labels[m]))
+
+        ### Depth-inclination profile
+
+        self.plot_profile = pg.PlotWidget()
+        self.plot_profile.setMinimumWidth(240)
+        self.plot_profile.invertY()
+        self.plot_profile.setXRange(*INCL_LIMS, padding=0)
+        self.plot_profile.setMenuEnabled(False)
+        self.plot_profile.setLabel('bottom', 'Inclination (deg.)')
+        self.plot_profile.setLabel('left', 'Depth (m)')
+        self.plot_profile.showGrid(x=True, y=True)
+        self.profile = {}
+        for m in self.methods:
+            self.profile[m] = IncrementalScatter(int(PROFILE/(DT*DTFRAC_DRILL)), size=6, pen=None, brush=pg.mkBrush(self.colors[m]))
+            self.plot_profile.addItem(self.profile[m])
+
+        ### Trails
+
+        N = int(TRAIL/(DT*DTFRAC_DRILL))
+        self.hist_time = np.flipud(np.arange(N))*DT*DTFRAC_DRILL/60 # minutes ago
+        self.hist = {'%s_%s'%(f,m):RingHistory(N, fill=np.nan) for f in ['incl','azim','roll'] for m in self.methods}
+        self.plot_trail, self.curve_trail = {}, {}
+        for f, title, lims in [('incl', 'Inclination (deg.)', INCL_LIMS), ('azim', 'Azimuth (deg.)', [-180,180]), ('roll', 'Roll (deg.)', [-180,180])]:
+            plot = pg.PlotWidget()
+            plot.invertX()
+            plot.setXRange(0, TRAIL/60, padding=0)
+            plot.setYRange(*lims, padding=0.02)
+            plot.setMenuEnabled(False)
+            plot.setMouseEnabled(x=False, y=False)
+            plot.setLabel('left', title)
+            plot.setLabel('bottom', 'Minutes ago')
+            plot.showGrid(x=True, y=True)
+            self.plot_trail[f] = plot
+            for m in self.methods:
+                self.curve_trail['%s_%s'%(f,m)] = plot.plot(x=self.hist_time, y=self.hist['%s_%s'%(f,m)].view(), pen=pg.mkPen(self.colors[m], width=3), connect='finite')
+
+        ### Controls
+
+        btnLayout = QHBoxLayout()
+        for name, fn in [('Sideways', self.view_sideways), ('Top-down', self.view_topdown), ('Along drill', self.view_alongdrill)]:
+            btn = QPushButton(name)
+            btn.clicked.connect(fn)
+            btnLayout.addWidget(btn)
+        btnLayout.addStretch(1)
+        self.cb_show = {}
+        for m in self.methods:
+            self.cb_show[m] = QCheckBox('Show %s'%(self.labels[m]))
+            self.cb_show[m].setChecked(self.showmethod[m])
+            self.cb_show[m].stateChanged.connect(self.changed_show)
+            btnLayout.addWidget(self.cb_show[m])
+        self.lbl_state = QLabel()
+        btnLayout.addWidget(self.lbl_state)
+
+        ### Layout
+
+        leftLayout = QVBoxLayout()
+        leftLayout.addWidget(self.plot_scene, 3)
+        leftLayout.addLayout(btnLayout)
+        trailLayout = QVBoxLayout()
+        for f in ['incl', 'azim', 'roll']: trailLayout.addWidget(self.plot_trail[f])
+        layout = QHBoxLayout()
+        layout.addLayout(leftLayout, 3)
+        layout.addWidget(self.plot_profile, 1)
+        layout.addLayout(trailLayout, 2)
+        self.setLayout(layout)
+        self.setWindowTitle('Drill orientation (live)')
+
+        self.changed_show()
+
+    ### User actions
+
+    def view_sideways(self):
+        self.view_followdrill = False
+        self.scene.view(azim0, elev0)
+
+    def view_topdown(self):
+        self.view_followdrill = False
+        self.scene.view(-90-cs_azim, 90)
+
+    def view_alongdrill(self):
+        self.view_followdrill = True
+        self.render()
+
+    def changed_show(self):
+        for m in self.methods:
+            self.showmethod[m] = self.cb_show[m].isChecked()
+            for item in ['circle', 'spring', 'drill']: self.scene.setVisible('%s %s'%(item, m), self.showmethod[m])
+            self.profile[m].setVisible(self.showmethod[m])
+            for f in ['incl', 'azim', 'roll']: self.curve_trail['%s_%s'%(f,m)].setVisible(self.showmethod[m])
+
+    ### Updates
+
+    def eventListener(self, dsnap, ssnap):
+
+        # Called (in GUI thread) with the latest snapshots from the acquisition thread; dsnap is None if the drill state was not updated.
+
+        self.timing.start()
+        self.ssnap = ssnap
+        if dsnap is None:
+            self.timing.stop()
+            return
+
+        self.dsnap = dsnap
+        depth = abs(self.ssnap.depth)
+        for m in self.methods:
+            for f in ['incl', 'azim', 'roll']: self.hist['%s_%s'%(f,m)].append(dsnap.get('%s_%s'%(f,m)))
+            self.profile[m].append(dsnap.get('incl_%s'%(m)), depth)
+        self.timing.mark('ingest')
+
+        key_drill = (dsnap.received, dsnap.islive, tuple(dsnap.quat_sfus), tuple(dsnap.quat_ahrs))
+        changed = key_drill != self.key_drill
+        self.key_drill = key_drill
+        if self.scheduler.due(changed): self.render()
+        self.timing.stop()
+
+    def render(self):
+
+        dsnap = self.dsnap
+        r = scale = 2
+        m0 = 'sfus' if self.showmethod['sfus'] or not self.showmethod['ahrs'] else 'ahrs' # method of view and values shown
+
+        if self.view_followdrill: self.scene.view(180+dsnap.get('azim_%s'%(m0)), 90-dsnap.get('incl_%s'%(m0)))
+
+        for m in self.methods:
+            if not self.showmethod[m]: continue
+            try:    R = Rotation.from_quat(dsnap.get('quat_%s'%(m))).as_matrix() # columns are the rotated x, y, z axes
+            except: continue
+            self.scene.set('circle %s'%(m), R @ circle(r))
+            self.scene.set('spring %s'%(m), vector(*(scale*R[:,0])))
+            self.scene.set('drill %s'%(m),  vector(*(scale*R[:,2])))
+        self.timing.mark('scene')
+
+        for key, curve in self.curve_trail.items():
+            if curve.isVisible(): curve.setData(x=self.hist_time, y=self.hist[key].view())
+        self.timing.mark('trails')
+
+        self.lbl_state.setText('%s %s: incl %.2f, azim %.1f, roll %.1f'%(self.labels[m0], 'live' if dsnap.islive else 'offline', *[dsnap.get('%s_%s'%(f,m0)) for f in ['incl','azim','roll']]))
+
+
+if __name__ == '__main__':
+
+    def sigint_handler(*args): QApplication.quit()
+    signal.signal(signal.SIGINT, sigint_handler)
+
+    AHRS_estimator = 'SAAM' if len(sys.argv) < 2 else sys.argv[1]
+
+    app = QApplication(sys.argv)
+    app.setStyle('Fusion')
+    font = app.font()
+    font.setPointSizeF(FS)
+    app.setFont(font)
+
+    main = OrientationWidget(AHRS_estimator=AHRS_estimator)
+    main.resize(1500, 900)
+    main.show()
+
+    acquisition = Acquisition(main.ds, main.ss, DT, DTFRAC_DRILL, program='drill-liveorientation')
+    acquisition.timers['gui'] = main.timing
+    acquisition.acquired.connect(main.eventListener)
+    app.aboutToQuit.connect(acquisition.stop)
+    acquisition.start()
+
+    sys.exit(app.exec())
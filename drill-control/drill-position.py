@@ -7,6 +7,7 @@ import numpy as np
 from settings import *
 from state_drill import *
 from state_surface import *
+from filters import DepthPredictor
 
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
@@ -39,8 +40,8 @@ tn = 0 # time steps
 
 # Update frequency
 dt = 0.5
-if INFOMODE: dt = 1.0;
-dti = 0.1 # dti" is interface update-rate in *seconds* (interpolating depth values between polling), whereas "dt" is REDIS polling rate in *seconds*.
+if INFOMODE: dt = 2.0; # drill depth is extrapolated between polls, see DepthPredictor
+dti = 0.1 # dti" is interface update-rate in *seconds* (extrapolating depth between polling), whereas "dt" is REDIS polling rate in *seconds*.
 
 pollrate = int(dt/dti) # poll/update rate in *time steps* of dti; that is, REDIS polling occours every "pollrate" times dti.
 dt = pollrate*dti
@@ -53,8 +54,9 @@ else:      vdrill_hist = np.full(50,1e-10)
 
 ### State objects 
 
-ds = DrillState(  redis_host=DRILL_HOST if INFOMODE else REDIS_HOST)   
-ss = SurfaceState(1.5, dt, redis_host=DRILL_HOST if INFOMODE else REDIS_HOST)
+ds = DrillState(  redis_host=INFO_HOST if INFOMODE else REDIS_HOST, orientation=not INFOMODE) # info screens don't show orientation, so skip loading scipy/ahrs
+ss = SurfaceState(1.5, dt, redis_host=INFO_HOST if INFOMODE else REDIS_HOST) # info screens read through the gateway (see gateway.py)
+predictor = DepthPredictor(tcorr=0.5, tmax=2*dt) # drill depth between polls
 
 ### Globals 
 
@@ -77,8 +79,7 @@ alertloggers = 0
 
 ###
 
-ldrillintp = np.zeros(pollrate) + ldrill
-ldrillprev = ldrill
+ldrillintp = np.zeros(pollrate) + ldrill # debug mode
 
 
 #--------------------------
@@ -212,43 +213,28 @@ x0 = 300-180 # newest, smaller-width GUI version
 
 def LRwall(x0,w): return (int(x0-w/2),int(x0+w/2))
 
-def drawBoreHole(qp, OVERVIEW):
+### Static part of the drawing (depth ticks, undrilled ice, hole + casing) 
+# This is drawn once to a cached pixmap covering a few window heights of depth, and only redrawn if the drill moves
+# out of it, the hole bottom (l) changes or the widget is resized. Each frame then blits the pixmap at the current
+# vertical offset and draws the drill + labels on top.
 
-        global l,lliq,ldrill, load,hammer,sliprate, motorRPM,motorI,motorU,motorflash, tempmotor,tempelect, incl,azi,  vdrill, ETA, alertloggers
-        global vdrill_hist
+boreholecache = {'key':None, 'pixmap':None, 'dmin':0, 'dmax':0, 'ymin':0}
 
-        flashon = True
+def drawBoreHoleStatic(qp, OVERVIEW, dmin, dmax):
 
-        ### Measures        
-        mylliq   = int(dmul*lliq)
-        myl      = int(dmul*l)
-        myldrill = int(dmul*ldrill)
+        '''Depth ticks, undrilled ice and hole + casing walls for depths dmin to dmax (metres), with the surface at y=0'''
 
+        myl      = int(dmul*l)
         w        = int(mywidths[-2])
-        extend   = int(1.3*drilllen) # extent to which we draw the portion of the QT image not seen (outside window). This should be adjusted according to the zoom-in scale "dmul"
+        extend   = int(1.3*drilllen)
         myextend = int(dmul*extend)
-        # x0 = center (vertical) line through drill
-        dxdrill = int(w/3)
-        dwdrill = 2*dxdrill
-        x0l = x0-dxdrill # left side of drill
-        x0r = x0+dxdrill # right side of drill
-
-        ### Vertical offsets
-        if OVERVIEW: y0 = 80
-        else:        y0 = -(myldrill-1.15*mydrilllen)
-        Y0 = int(y0) 
-        y0drill = Y0+myldrill
-
-        #-------------------
-        # The borehole and casing 
-        #-------------------
 
         ### Depth ticks
         
         if OVERVIEW:  del_d = 200 # metres
         else:         del_d = 1
         dx = 20 # pixels
-        tickslist = np.arange(np.max([0,np.round(ldrill-extend)]), np.min([L,np.round(ldrill+extend)]), del_d)
+        tickslist = np.arange(np.max([0,np.round(dmin)]), np.min([L,np.round(dmax)]), del_d)
         for d in tickslist:
                 dref, di =int(dmul*d), 0
                 for di in np.arange(len(depths)-2):
@@ -258,29 +244,27 @@ def drawBoreHole(qp, OVERVIEW):
                 wi = int(mywidths[di])
                 recty,rectx = 40, 120
                 wl,wr = LRwall(x0,wi)
-                rect = QRect(wr+dx, Y0+dref-int(recty/2), rectx, recty)
+                rect = QRect(wr+dx, dref-int(recty/2), rectx, recty)
                 if np.mod(d,2*del_d)==0: qp.drawText(rect, Qt.AlignLeft, '%1.0fm'%(d))   
-                qp.drawLine(wr+dx-6, Y0+dref, wr+6, Y0+dref)
+                qp.drawLine(wr+dx-6, dref, wr+6, dref)
 
-        ### Level labels for l, lliq, delta l, etc.
+        ### Bottom of hole (l)
         
-        rectx, recty = 250, 80
         wl,wr = LRwall(x0,w)
-        x0lbl = int(wl-dx-rectx*0.95)
-        rect_lliq = QRect(x0lbl, int(Y0+mylliq-0.5*recty/2), rectx, recty)
-        rect_l    = QRect(x0lbl, int(Y0+myl   -0.5*recty/2), rectx, recty)
-        qp.drawLine(wl-6, Y0+myl, wl-dx+6, Y0+myl)
+        qp.drawLine(wl-6, myl, wl-dx+6, myl)
         qp.setBrush(brush_undrilled)      
-        qp.drawRect(x0-int(w/2),Y0+myl, w,myextend)      
+        qp.drawRect(x0-int(w/2),myl, w,myextend)      
 
         ### Draw hole + casing
         
-        mydepths[-1] = np.max([mydepths[-2],myldrill+myextend])
+        mydepths_ = np.copy(mydepths)
+        mydepths_[-1] = np.max([mydepths_[-2],int(dmul*dmax)])
         N = len(mywidths)
+        y0 = 0
         for ii in np.arange(N):
                 if ii<N-1: qp.setPen(penCase)
                 else:      qp.setPen(penHole)
-                D, W = int(mydepths[ii+1]-mydepths[ii]), int(mywidths[ii])
+                D, W = int(mydepths_[ii+1]-mydepths_[ii]), int(mywidths[ii])
                 y0 = int(y0+D)
                 wl,wr = LRwall(x0,W)
                 qp.drawLine(wl, y0-D, wl, y0)    
@@ -291,6 +275,61 @@ def drawBoreHole(qp, OVERVIEW):
                         qp.drawLine(wl, y0, wlnext, y0)
                         qp.drawLine(wr, y0, wrnext, y0)
 
+def drawBoreHoleCached(qp, OVERVIEW, Y0):
+
+        c = boreholecache
+        dev = qp.device()
+        W, H, dpr = dev.width(), dev.height(), dev.devicePixelRatioF()
+        d0, d1 = -Y0/dmul, (H-Y0)/dmul # depth range in window (metres)
+        key = (OVERVIEW, l, lliq, W, H, dpr)
+        if c['key'] != key or d0 < c['dmin'] or d1 > c['dmax']:
+                dh = d1-d0 # window height in metres
+                c['dmin'], c['dmax'] = max(0, d0-dh), d1+dh
+                c['ymin'] = int(dmul*c['dmin'])
+                pixmap = QPixmap(int(W*dpr), int((int(dmul*c['dmax'])-c['ymin']+1)*dpr))
+                pixmap.setDevicePixelRatio(dpr)
+                pixmap.fill(Qt.transparent)
+                qpc = QPainter(pixmap)
+                qpc.setFont(qp.font())
+                qpc.translate(0, -c['ymin'])
+                drawBoreHoleStatic(qpc, OVERVIEW, c['dmin'], c['dmax'])
+                qpc.end()
+                c['key'], c['pixmap'] = key, pixmap
+        qp.drawPixmap(0, Y0+c['ymin'], c['pixmap'])
+
+def drawBoreHole(qp, OVERVIEW):
+
+        global l,lliq,ldrill, load,hammer,sliprate, motorRPM,motorI,motorU,motorflash, tempmotor,tempelect, incl,azi,  vdrill, ETA, alertloggers
+        global vdrill_hist
+
+        flashon = True
+
+        ### Measures        
+        mylliq   = int(dmul*lliq)
+        myl      = int(dmul*l)
+        myldrill = int(dmul*ldrill)
+
+        w        = int(mywidths[-2])
+        extend   = int(1.3*drilllen) # extent to which we draw the portion of the QT image not seen (outside window). This should be adjusted according to the zoom-in scale "dmul"
+        myextend = int(dmul*extend)
+        # x0 = center (vertical) line through drill
+        dxdrill = int(w/3)
+        dwdrill = 2*dxdrill
+        x0l = x0-dxdrill # left side of drill
+        x0r = x0+dxdrill # right side of drill
+
+        ### Vertical offsets
+        if OVERVIEW: y0 = 80
+        else:        y0 = -(myldrill-1.15*mydrilllen)
+        Y0 = int(y0) 
+        y0drill = Y0+myldrill
+
+        #-------------------
+        # The borehole and casing (cached, see drawBoreHoleStatic())
+        #-------------------
+
+        drawBoreHoleCached(qp, OVERVIEW, Y0)
+
         #-------------------
         # The drill 
         #-------------------
@@ -462,23 +501,22 @@ class drillLocation(QWidget):
 def eventListener():
 
         global t,tn
-        global r, l,lliq,ldrill,ldrillprev,ldrillintp,load,hammer,sliprate,motorRPM,motorI,motorU,motorflash, tempmotor,tempelect, incl,azi, vdrill_hist,vdrill,ETA, alertloggers
+        global r, l,lliq,ldrill,ldrillintp,load,hammer,sliprate,motorRPM,motorI,motorU,motorflash, tempmotor,tempelect, incl,azi, vdrill_hist,vdrill,ETA, alertloggers
 
         substep = tn % pollrate;
         if substep==0 and (not DEBUG):
         
-            ldrillprev = ldrill
-
             # Pull from redis 
             ss.update()
-            ldrill, velinst, l, load = ss.depth, ss.speed, ss.depthtare, ss.load
+            velinst, l, load = ss.speed, ss.depthtare, ss.load
             alertloggers = ss.alertloggers
+            if ss.islive_depthcounter: predictor.update(ss.depthtime, ss.depth, 1e-2*ss.speed, t=time.time())
             
             ds.update()
             motorRPM, motorI, motorU = ds.motor_rpm, ds.motor_current, ds.motor_voltage
             tempelect, tempmotor     = ds.temperature_electronics, ds.temperature_motor
             hammer, sliprate         = ds.hammer, ds.spin
-            incl, azi                = ds.inclination, ds.azimuth
+            incl, azi                = (ds.incl_sfus, ds.azim_sfus) if ds.orientation else (0, 0)
             ##
             vdrill_inst = velinst #* 1e2
 #            vdrill_hist = np.hstack([vdrill_hist[1::],vdrill_inst]) 
@@ -486,11 +524,11 @@ def eventListener():
             vdrill = vdrill_inst
             # /end
 
-            dl = (ldrill-ldrillprev)/(pollrate)
-            ldrillintp = [ldrillprev+(ii+1)*dl for ii in range(pollrate)]
-            
-        if (not INFOMODE) and (not DEBUG): ldrill = ss.depth
-        else:                              ldrill = ldrillintp[substep]
+        if not DEBUG: 
+            ldrill = predictor.predict(time.time())
+            if not np.isfinite(ldrill): ldrill = ss.depth # no depth sample yet
+        else: 
+            ldrill = ldrillintp[substep]
 	
         if   vdrill<-10 and ldrill<(l-30): ETA =      (ldrill/(-vdrill*1e-2)) /60 
         elif vdrill>+10 and ldrill>(30):   ETA = -((l-ldrill)/(-vdrill*1e-2)) /60
@@ -511,7 +549,7 @@ def eventListener():
         motoron = (motorRPM > 1.0) 
 
         # Update
-        progress.repaint()        
+        progress.update()        
         t  = t + dti
         tn = tn + 1
        
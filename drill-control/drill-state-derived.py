@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Derived drill state service.
+
+Runs next to dispatch on the drill host. Every time dispatch receives a new drill state (or an orientation
+offset is changed), the derived fields (orientation for SFUS and all AHRS estimators, spin, vector magnitudes)
+are calculated once and published to the redis key DERIVED_STATE_KEY and the stream DERIVED_STATE_STREAM.
+DrillState() objects of all clients then read these instead of each calculating them again.
+
+Also records the plotted drill and surface quantities every TELEMETRY_DT seconds to the stream TELEMETRY_STREAM,
+from which drill-control refills its plot histories when restarted (see telemetry.py).
+
+Usage:
+    python3 drill-state-derived.py [REDIS_HOST]
+"""
+
+import sys, json, time, redis
+from settings import *
+from state_drill import *
+from state_surface import *
+import telemetry
+
+redis_host = sys.argv[1] if len(sys.argv) > 1 else LOCAL_HOST
+
+ds = DrillState(redis_host=redis_host, derived=False)
+ss = SurfaceState(3*TELEMETRY_DT, TELEMETRY_DT, redis_host=redis_host)
+init_AHRS_estimators() # import ahrs and set up estimators before first packet arrives
+
+def publish():
+    ds.update()
+    payload = json.dumps(ds.derived_state())
+    pipe = ds.rc.pipeline(transaction=False)
+    pipe.set(DERIVED_STATE_KEY, payload)
+    pipe.xadd(DERIVED_STATE_STREAM, {'state':payload}, maxlen=DERIVED_STATE_STREAM_MAXLEN, approximate=True)
+    pipe.execute()
+
+recorded = None # packet_id() of the drill state last recorded
+
+def record():
+    global recorded
+    ss.update(smoothload=False)
+    packet = ds.packet_id() # ds is updated by publish() when a new drill state is received
+    telemetry.record(ds.rc, ss, ds, drill=ds.islive and packet != recorded) # don't repeat the last drill state while none are received
+    recorded = packet
+
+while True:
+
+    try:
+        pubsub = ds.rc.pubsub()
+        pubsub.subscribe('uphole')
+        pubsub.psubscribe('__keyspace@0__:offset-*') # offsets changed by a client (requires keyspace notifications, as for dispatch)
+        publish()
+        print('drill-state-derived: publishing derived drill state to "%s" and "%s"'%(DERIVED_STATE_KEY, DERIVED_STATE_STREAM))
+
+        trecorded = 0
+        while True:
+            if time.time() - trecorded >= TELEMETRY_DT:
+                record()
+                trecorded = time.time()
+            item = pubsub.get_message(timeout=max(0, trecorded + TELEMETRY_DT - time.time())) # not listen(): the connection has a socket timeout (REDIS_TIMEOUT), which would expire between packets
+            if item is None: continue
+            if   item['type'] == 'message'  and item['data'] == b'DownholeState': publish()
+            elif item['type'] == 'pmessage' and item['data'] == b'set':           publish()
+
+    except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+        print('drill-state-derived: lost redis connection, retrying in 2s')
+        time.sleep(2)
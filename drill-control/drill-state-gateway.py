@@ -0,0 +1,25 @@
+#!/usr/bin/python
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Fan-out gateway service for read-only displays (see gateway.py).
+
+Runs on the drill host (or any host with a reliable link to it). Reads the drill and surface state keys from redis
+once every GATEWAY_DT seconds while any display is connected, and pushes the changes to all displays connected with
+redis_host="gateway://<this host>" (e.g. info screens, INFO_HOST).
+
+Usage:
+    python3 drill-state-gateway.py [REDIS_HOST] [PORT]
+"""
+
+import sys
+from settings import *
+from connection import connect
+from gateway import Gateway
+
+redis_host = sys.argv[1] if len(sys.argv) > 1 else LOCAL_HOST
+port       = int(sys.argv[2]) if len(sys.argv) > 2 else GATEWAY_PORT
+
+gateway = Gateway(connect(redis_host, 'drill-state-gateway'), port)
+print('drill-state-gateway: serving %i keys from redis on %s to clients on port %i'%(len(gateway.keys), redis_host, port))
+gateway.run()
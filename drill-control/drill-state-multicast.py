@@ -0,0 +1,23 @@
+#!/usr/bin/python
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+UDP multicast broadcaster of the drill and surface state for passive displays (see multicast.py).
+
+Runs on the drill host. Sends the state read from redis to MULTICAST_GROUP:MULTICAST_PORT every MULTICAST_DT
+seconds; displays connected with redis_host="multicast://" follow it.
+
+Usage:
+    python3 drill-state-multicast.py [REDIS_HOST]
+"""
+
+import sys
+from settings import *
+from connection import connect
+from multicast import Broadcaster, STRUCT
+
+redis_host = sys.argv[1] if len(sys.argv) > 1 else LOCAL_HOST
+
+broadcaster = Broadcaster(connect(redis_host, 'drill-state-multicast'))
+print('drill-state-multicast: sending state from redis on %s to %s:%i (%i bytes every %.1fs)'%(redis_host, MULTICAST_GROUP, MULTICAST_PORT, STRUCT.size, MULTICAST_DT))
+broadcaster.run()
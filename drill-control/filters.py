@@ -0,0 +1,301 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Streaming (sample-by-sample) signal filters for the live surface and drill signals.
+
+All filters have an update(x) method that takes the next sample and returns the filtered value, and a reset() method.
+Windows are kept in fixed-size buffers, so the cost per sample does not grow with the length of the record:
+O(1) for EMA, VelocityEstimator and the rolling min/max (amortized), one N-tap dot product for the Savitzky-Golay
+filter, and a binary search plus list insert for the rolling median.
+DepthPredictor is the exception: it takes samples with update() and is evaluated at any time with predict().
+
+The same classes are used for the live displays and for processing logs offline, so both give the same numbers.
+"""
+
+import bisect, collections
+import numpy as np
+
+class VelocityEstimator():
+
+    """
+        Velocity as the least-squares slope of the (time, position) samples received during the last tavg seconds.
+
+        The depth encoder has centimetre resolution, so when the drill moves slowly the position is a staircase; fitting a
+        line through a window of samples averages over the steps.
+
+        A sample implying a speed above maxspeed relative to the previous sample is treated as an outlier (e.g. the
+        display falling out) and dropped; if maxoutliers samples in a row are outliers, the position really jumped (e.g.
+        encoder reset) and the window is restarted from the new sample.
+    """
+
+    def __init__(self, tavg, dt_intended, quantization=0.01, maxspeed=2.0, maxoutliers=3):
+        # dt_intended is the shortest expected time between samples (e.g. the update interval); the window holds at most 
+        # twice the number of samples expected in tavg seconds, so a too large dt_intended shortens the window
+        self.tavg         = tavg
+        self.quantization = quantization
+        self.maxspeed     = maxspeed
+        self.maxoutliers  = maxoutliers
+        self.N = max(4, 2*int(np.ceil(tavg/dt_intended))) # buffer capacity, allowing for faster than intended updates
+        self.t = np.zeros(self.N)
+        self.x = np.zeros(self.N)
+        self.reset()
+
+    def reset(self):
+        self.n, self.head = 0, 0 # number of samples in window; index of next sample
+        self.St, self.Sx, self.Stt, self.Stx = 0.0, 0.0, 0.0, 0.0
+        self.t0 = None # times are stored relative to t0 to keep the sums well-conditioned
+        self.noutliers = 0
+        self.value = np.nan
+
+    def _add(self, t, x, sign):
+        self.St  += sign*t
+        self.Sx  += sign*x
+        self.Stt += sign*t*t
+        self.Stx += sign*t*x
+
+    def _pop_oldest(self):
+        ii = (self.head - self.n) % self.N
+        self._add(self.t[ii], self.x[ii], -1)
+        self.n -= 1
+
+    def _rebase(self):
+        # Re-reference times to the oldest sample and recompute sums exactly (also removes round-off drift of the running sums)
+        I = [(self.head - self.n + kk) % self.N for kk in range(self.n)]
+        dt0 = self.t[I[0]]
+        self.t0 += dt0
+        self.St, self.Sx, self.Stt, self.Stx = 0.0, 0.0, 0.0, 0.0
+        for ii in I:
+            self.t[ii] -= dt0
+            self._add(self.t[ii], self.x[ii], +1)
+
+    def update(self, t, x):
+        '''
+        Add sample x at time t (seconds) and return the velocity (units of x per second), or NaN if not yet known.
+        '''
+        if not np.isfinite(x): return self.value
+        if self.t0 is None: self.t0 = t
+        tr = t - self.t0
+
+        if self.n > 0:
+            ilast = (self.head-1) % self.N
+            dt = tr - self.t[ilast]
+            if dt <= 0: return self.value # not newer than last sample
+            if abs(x - self.x[ilast]) > self.maxspeed*dt + self.quantization:
+                self.noutliers += 1
+                if self.noutliers < self.maxoutliers: return self.value
+                self.reset() # persistent jump, so start over from this sample
+                return self.update(t, x)
+        self.noutliers = 0
+
+        # Drop samples older than the averaging window, and the oldest sample if buffer is full
+        while self.n > 0 and tr - self.t[(self.head - self.n) % self.N] > self.tavg: self._pop_oldest()
+        if self.n == self.N: self._pop_oldest()
+
+        self.t[self.head], self.x[self.head] = tr, x
+        self._add(tr, x, +1)
+        self.head = (self.head + 1) % self.N
+        self.n += 1
+        if tr > 1e4: self._rebase()
+
+        self.value = self._slope()
+        return self.value
+
+    def _slope(self):
+        n = self.n
+        if n < 2: return np.nan
+        T = self.Stt - self.St**2/n # n * variance of sample times
+        if T <= 0: return np.nan
+        return (self.Stx - self.St*self.Sx/n) / T
+
+
+class DepthPredictor():
+
+    """
+        Depth at any time between (and shortly after) depth encoder samples, for animating the drill position
+        smoothly while polling redis rarely.
+
+        Depth is extrapolated from the last sample: x + v*(t - tsample). When a new sample arrives, the extrapolated
+        depth generally differs somewhat from it; that difference (the correction) is not applied at once but decays
+        exponentially with time constant tcorr, so the depth drawn moves smoothly and without the lag of interpolating
+        between the last two samples. Corrections larger than maxjump (e.g. encoder reset) are applied at once.
+        Depth is extrapolated for at most tmax seconds past the sample (e.g. if the encoder stops reporting).
+    """
+
+    def __init__(self, tcorr=0.5, tmax=3.0, maxjump=1.0):
+        self.tcorr, self.tmax, self.maxjump = tcorr, tmax, maxjump
+        self.reset()
+
+    def reset(self):
+        self.tsample, self.x, self.v = None, np.nan, 0.0 # last sample
+        self.correction, self.tcorrected = 0.0, 0.0 # correction at time tcorrected
+
+    def update(self, tsample, x, v, t=None):
+        '''
+        Add sample of depth x and velocity v (per second) taken at time tsample; t is the current time (default tsample).
+        Samples not newer than the last one are ignored.
+        '''
+        if not (np.isfinite(x) and np.isfinite(v)): return
+        if self.tsample is not None and tsample <= self.tsample: return
+        if t is None: t = tsample
+        predicted = self.predict(t)
+        self.tsample, self.x, self.v = tsample, x, v
+        correction = predicted - self._extrapolate(t)
+        if not np.isfinite(correction) or abs(correction) > self.maxjump: correction = 0.0
+        self.correction, self.tcorrected = correction, t
+
+    def _extrapolate(self, t):
+        return self.x + self.v*np.clip(t - self.tsample, 0, self.tmax)
+
+    def predict(self, t):
+        '''Depth at time t, or NaN if no sample received'''
+        if self.tsample is None: return np.nan
+        return self._extrapolate(t) + self.correction*np.exp(-max(t - self.tcorrected, 0)/self.tcorr)
+
+
+class EMA():
+
+    """
+        Exponential moving average, value += alpha*(x - value). The first sample initializes the average.
+    """
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.value = np.nan
+
+    def update(self, x):
+        if np.isnan(self.value): self.value = x
+        else:                    self.value += self.alpha*(x - self.value)
+        return self.value
+
+
+class SavitzkyGolay():
+
+    """
+        Causal Savitzky-Golay filter: value (or deriv'th derivative, per sample) at the newest sample of the least-squares
+        polynomial of the given order through the last N samples. Until N samples are received, the fit is over the
+        samples available.
+        Unlike scipy.signal.savgol_filter() this does not look ahead, so it can be used live; the price is a lag.
+    """
+
+    def __init__(self, N, polyorder=2, deriv=0):
+        self.N, self.polyorder, self.deriv = N, polyorder, deriv
+        self.coefs = [None]*(N+1) # coefs[n] are the filter weights for n samples, oldest first
+        for n in range(polyorder+2, N+1): 
+            k = np.arange(-(n-1), 1) # sample position relative to newest sample
+            A = np.vander(k, polyorder+1, increasing=True)
+            self.coefs[n] = np.linalg.pinv(A)[deriv] * np.prod(np.arange(1, deriv+1))
+        self.buf = np.zeros(2*N) # every sample is stored twice so that the last N samples are always contiguous
+        self.reset()
+
+    def reset(self):
+        self.n, self.head = 0, 0
+        self.value = np.nan
+
+    def update(self, x):
+        self.buf[self.head] = self.buf[self.head+self.N] = x
+        self.head = (self.head + 1) % self.N
+        self.n = min(self.n+1, self.N)
+        if self.coefs[self.n] is None: # too few samples for the polynomial order
+            self.value = x if self.deriv == 0 else 0.0
+        else:
+            I0 = self.head + self.N - self.n
+            self.value = np.dot(self.coefs[self.n], self.buf[I0:I0+self.n])
+        return self.value
+
+
+class RollingMedian():
+
+    """
+        Median of the last N non-NaN samples (NaN samples are skipped, and do not count towards N).
+    """
+
+    def __init__(self, N):
+        self.N = N
+        self.reset()
+
+    def reset(self):
+        self.window = collections.deque() # samples in order received
+        self.sorted = []                  # same samples, sorted
+        self.value = np.nan
+
+    def update(self, x):
+        if not np.isnan(x):
+            self.window.append(x)
+            bisect.insort(self.sorted, x)
+            if len(self.window) > self.N: del self.sorted[bisect.bisect_left(self.sorted, self.window.popleft())]
+            n = len(self.sorted)
+            self.value = self.sorted[n//2] if n % 2 else 0.5*(self.sorted[n//2-1] + self.sorted[n//2])
+        return self.value
+
+
+class RollingMax():
+
+    """
+        Maximum of the last N non-NaN samples (NaN samples are skipped, and do not count towards N), using a monotonic queue.
+    """
+
+    sign = +1
+
+    def __init__(self, N):
+        self.N = N
+        self.reset()
+
+    def reset(self):
+        self.queue = collections.deque() # (non-NaN sample number, sign*sample) with decreasing values
+        self.count = 0 # number of non-NaN samples
+        self.value = np.nan
+
+    def update(self, x):
+        if not np.isnan(x):
+            y = self.sign*x
+            while len(self.queue) > 0 and self.queue[-1][1] <= y: self.queue.pop()
+            self.queue.append((self.count, y))
+            while len(self.queue) > 0 and self.queue[0][0] <= self.count - self.N: self.queue.popleft()
+            self.value = self.sign*self.queue[0][1]
+            self.count += 1
+        return self.value
+
+
+class RollingMin(RollingMax):
+
+    """
+        Minimum of the last N non-NaN samples (see RollingMax).
+    """
+
+    sign = -1
+
+
+class SpikeRejector():
+
+    """
+        Replaces samples deviating more than threshold from the median of the last N accepted samples by the last
+        accepted sample. Also rejects bad values (NaN and the -9999 "no value" convention of the surface displays).
+        If more than maxrejects samples in a row are rejected, the signal is taken to have jumped and is accepted again.
+        After update(), the rejected attribute tells whether the sample was rejected.
+    """
+
+    def __init__(self, N, threshold, maxrejects=5, bad=-9999):
+        self.threshold, self.maxrejects, self.bad = threshold, maxrejects, bad
+        self.median = RollingMedian(N)
+        self.reset()
+
+    def reset(self):
+        self.median.reset()
+        self.nrejects = 0
+        self.rejected = False # was the last sample rejected?
+        self.value = np.nan
+
+    def update(self, x):
+        self.rejected = True
+        if np.isnan(x) or x == self.bad: return self.value
+        if not np.isnan(self.median.value) and abs(x - self.median.value) > self.threshold:
+            self.nrejects += 1
+            if self.nrejects <= self.maxrejects: return self.value
+            self.median.reset()
+        self.nrejects, self.rejected = 0, False
+        self.median.update(x)
+        self.value = x
+        return self.value
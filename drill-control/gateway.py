@@ -0,0 +1,215 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Fan-out gateway between redis on the drill host and any number of read-only displays.
+
+The gateway (drill-state-gateway.py) is the only redis client of the displays: while any client is connected, it
+reads the keys used by DrillState and SurfaceState every GATEWAY_DT seconds in one round trip, and pushes the keys
+that changed to all connected clients over TCP. Adding displays therefore adds no redis load on the drill host,
+and with no displays connected the gateway does not poll redis at all.
+
+Protocol: one JSON object per line (utf-8), 
+    {"time": [sec, usec], "set": {key: value, ...}, "del": [key, ...]}
+where time is the redis server time of the poll, "set" holds the keys whose value changed and "del" the keys that
+were deleted. A new client first gets all keys; after that only changes are sent (delta encoding), and at least a
+time-only message every GATEWAY_HEARTBEAT seconds.
+
+GatewayClient keeps a local copy of the keys up to date in a background thread and answers the (read-only) redis
+calls of DrillState and SurfaceState from it, so these work unchanged when connected with
+redis_host="gateway://host[:port]" (see connection.py). Writes (set, publish, ...) raise redis.exceptions.ReadOnlyError.
+The answering part (MirrorClient) is shared with the multicast receiver (see multicast.py).
+"""
+
+import socket, threading, json, time
+import redis
+from settings import *
+from state_surface import SURFACE_KEYS
+
+GATEWAY_KEYS = SURFACE_KEYS + ['drill-state', 'motor-config', DERIVED_STATE_KEY] + \
+               ['offset-%s-%s'%(method,ang) for method in ['sfus','ahrs'] for ang in ['incl','azim','roll']]
+
+def decode(value): return value.decode('utf-8', errors='replace') if isinstance(value, bytes) else value
+
+class Gateway():
+
+    """
+        Serves the keys to clients connecting on port; run() polls redis and pushes the changes.
+    """
+
+    def __init__(self, rc, port=GATEWAY_PORT, keys=GATEWAY_KEYS):
+        self.rc, self.keys = rc, keys
+        self.values = {} # key -> value (str) as last sent
+        self.tserver = None # redis server time of last poll
+        self.tsent = 0 # time.time() of last message to clients
+        self.clients = [] 
+        self.pending = [] # clients connected since last poll, sent all keys after the next poll
+        self.lock = threading.Lock() # for values and clients
+        self.connected = threading.Event() # set when a client connects, to resume polling
+        self.server = socket.create_server(('', port))
+
+    def accept(self):
+        while True:
+            conn, addr = self.server.accept()
+            conn.settimeout(GATEWAY_DT) # a client that does not keep up is dropped rather than delaying the others
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self.lock: 
+                self.pending.append(conn)
+                nclients = len(self.clients) + len(self.pending)
+            self.connected.set()
+            print('drill-state-gateway: client %s:%i connected (%i clients)'%(addr[0], addr[1], nclients))
+
+    def send(self, conn, msg):
+        try:
+            conn.sendall((json.dumps(msg, separators=(',',':'))+'\n').encode('utf-8'))
+            return True
+        except:
+            conn.close()
+            return False
+
+    def poll(self):
+        pipe = self.rc.pipeline(transaction=False)
+        pipe.mget(self.keys)
+        pipe.time()
+        values, tserver = pipe.execute()
+        values = {k:decode(v) for k,v in zip(self.keys, values) if v is not None}
+        with self.lock:
+            changed = {k:v for k,v in values.items() if self.values.get(k) != v}
+            deleted = [k for k in self.values if k not in values]
+            self.values, self.tserver = values, list(tserver)
+            if len(changed) > 0 or len(deleted) > 0 or time.time() - self.tsent >= GATEWAY_HEARTBEAT:
+                msg = {'time':self.tserver, 'set':changed, 'del':deleted}
+                self.clients = [conn for conn in self.clients if self.send(conn, msg)]
+                self.tsent = time.time()
+            full = {'time':self.tserver, 'set':self.values, 'del':[]}
+            self.clients += [conn for conn in self.pending if self.send(conn, full)]
+            self.pending = []
+
+    def run(self):
+        threading.Thread(target=self.accept, daemon=True).start()
+        while True:
+            self.connected.clear()
+            with self.lock: idle = len(self.clients) == 0 and len(self.pending) == 0
+            if idle: 
+                self.connected.wait() # no clients to serve, so leave redis alone until one connects
+                continue
+            t0 = time.time()
+            try:
+                self.poll()
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+                print('drill-state-gateway: lost redis connection, retrying in 2s')
+                time.sleep(2)
+            time.sleep(max(0, GATEWAY_DT - (time.time()-t0)))
+
+
+class MirrorClient():
+
+    """
+        Read-only stand-in for a redis connection, answering the calls of DrillState and SurfaceState from a local
+        copy of the keys (values) that a subclass keeps up to date with receive(), together with the redis server
+        time (tserver) the copy is from.
+        Raises redis.exceptions.ConnectionError if nothing was received for GATEWAY_TIMEOUT seconds (e.g. link
+        down), like a redis connection would.
+    """
+
+    source = '' # for messages
+
+    def __init__(self):
+        self.values = {} # key -> value (bytes)
+        self.tserver, self.treceived = None, 0 # redis server time of last message, and local time it was received
+        self.lock = threading.Lock()
+
+    def receive(self, tserver, set={}, delete=[], full=False):
+        '''Apply a message; if full, set holds all keys and any others are dropped'''
+        with self.lock:
+            if tserver is not None: self.tserver, self.treceived = tserver, time.time()
+            if full: self.values = {}
+            for k, v in set.items(): self.values[k] = v
+            for k in delete: self.values.pop(k, None)
+
+    def check(self):
+        if time.time() - self.treceived > GATEWAY_TIMEOUT: 
+            raise redis.exceptions.ConnectionError('No data from %s'%(self.source))
+
+    ### Redis calls
+
+    def ping(self):
+        self.check()
+        return True
+
+    def get(self, key):
+        self.check()
+        return self.values.get(key)
+
+    def mget(self, keys):
+        self.check()
+        with self.lock: return [self.values.get(k) for k in keys]
+
+    def time(self):
+        '''Redis server time, as of the last message plus the time since it was received'''
+        self.check()
+        with self.lock: t = self.tserver[0] + 1e-6*self.tserver[1] + (time.time() - self.treceived)
+        return (int(t), int(1e6*(t - int(t))))
+
+    def xrange(self, *args, **kwargs): return [] # streams are not mirrored (no telemetry backfill)
+
+    def pipeline(self, transaction=False): return MirrorPipeline(self)
+
+    def __getattr__(self, name):
+        if name.startswith('__'): raise AttributeError(name)
+        def readonly(*args, **kwargs): raise redis.exceptions.ReadOnlyError('"%s" not possible through %s (read-only)'%(name, self.source))
+        return readonly
+
+
+class GatewayClient(MirrorClient):
+
+    """
+        Client of a gateway; keeps the keys up to date in a background thread, reconnecting if the connection is lost.
+    """
+
+    def __init__(self, host, port=GATEWAY_PORT):
+        super().__init__()
+        self.host, self.port = host, port
+        self.source = 'gateway %s:%i'%(host, port)
+        self.connect() # raises if gateway cannot be reached
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=REDIS_TIMEOUT)
+        self.sock.settimeout(GATEWAY_TIMEOUT)
+        self.lines = self.sock.makefile('rb')
+        self.receive_line(self.lines.readline(), full=True) # all keys; keys expired or deleted while disconnected are dropped
+
+    def receive_line(self, line, full=False):
+        msg = json.loads(line)
+        self.receive(msg['time'], {k:v.encode('utf-8') for k,v in msg['set'].items()}, msg['del'], full=full)
+
+    def run(self):
+        while True:
+            try:
+                if self.sock is None: self.connect()
+                for line in self.lines: self.receive_line(line)
+            except Exception as e:
+                print('GatewayClient: connection to %s lost (%s), reconnecting'%(self.source, e))
+            try:    self.sock.close()
+            except: pass
+            self.sock = None
+            time.sleep(1)
+
+
+class MirrorPipeline():
+
+    """
+        Pipeline of MirrorClient calls, run in order by execute().
+    """
+
+    def __init__(self, client):
+        self.client, self.calls = client, []
+
+    def __getattr__(self, name):
+        if name.startswith('__'): raise AttributeError(name)
+        def queue(*args, **kwargs): self.calls.append((name, args, kwargs)); return self
+        return queue
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in calls]
@@ -0,0 +1,193 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Fixed-length histories of the most recent samples for the drill-control plots.
+
+LODHistory can keep a second, coarse tier for long time windows (hours): the min/mean/max of each bin of R samples,
+for the last M bins. Memory is bounded by N + 3M values however long the window, and appending costs the same.
+"""
+
+import numpy as np
+
+class RingHistory():
+
+    """
+        History of the last N samples, oldest first; a drop-in replacement for arrays updated by
+        hist = np.roll(hist, -1); hist[-1] = x
+
+        Appending is O(1) and allocates nothing: each sample is written twice into a buffer of length 2N, so the last N
+        samples are always a contiguous view of the buffer (view()), which can be sliced and passed to plots without copying.
+        Indexing, slicing, len() and numpy functions (np.amax(hist), ...) act on that view.
+        Storage is float32 by default, which is plenty for the plotted quantities and halves memory traffic.
+    """
+
+    def __init__(self, N, fill=0.0, dtype=np.float32):
+        self.N = N
+        self.buf = np.empty(2*N, dtype=dtype)
+        self.buf[:N] = self.buf[N:] = fill # fill may be a scalar or an array of N initial samples
+        self.head = 0 # buffer index of the oldest sample (and of the next sample to be written)
+
+    def append(self, x):
+        self.buf[self.head] = self.buf[self.head+self.N] = x
+        self.head = (self.head + 1) % self.N
+
+    def view(self):
+        '''The last N samples, oldest first (not a copy; contents change on next append)'''
+        return self.buf[self.head:self.head+self.N]
+
+    def set(self, x):
+        '''Replace the samples by the N samples x, oldest first (e.g. when backfilling from recorded samples)'''
+        x = np.array(x, dtype=self.buf.dtype) # copy, as x may be a view of this history
+        self.buf[:self.N] = self.buf[self.N:] = x
+        self.head = 0
+
+    def __len__(self):            return self.N
+    def __getitem__(self, I):     return self.view()[I]
+    def __array__(self, dtype=None, copy=None): return self.view() if dtype is None else self.view().astype(dtype)
+
+    # Shift all samples, e.g. when the tare load is changed
+    def __iadd__(self, value): self.buf += value; return self
+    def __isub__(self, value): self.buf -= value; return self
+
+
+class LODHistory(RingHistory):
+
+    """
+        RingHistory that also keeps a min/max pyramid for drawing long time windows with few points (level of detail).
+
+        Level k holds the min and max of consecutive, non-overlapping bins of 2^k samples, plus the running min/max of
+        the bin currently being filled. Appending updates all levels (a few scalar comparisons per level).
+        lod() returns at most ~maxpoints points for the last nback samples, taken from the finest level that fits:
+        each bin contributes its min and its max, so short peaks (e.g. load spikes) remain visible however far out
+        the plot is zoomed.
+
+        If M > 0, the min/mean/max of bins of R samples are also kept for the last M bins ("rollups"), so that lod()
+        can draw windows of up to R*M samples, longer than the N samples kept at full resolution.
+        Initial rollups (oldest first, ending with the newest sample) may be given as rollups=(min, mean, max);
+        otherwise they are made from the initial samples.
+    """
+
+    def __init__(self, N, fill=0.0, dtype=np.float32, R=1, M=0, rollups=None):
+        super().__init__(N, fill, dtype)
+        self.nlevels = max(1, int(np.log2(N)) - 1)
+        self.mins  = [RingHistory(max(1, N >> k), dtype=dtype) for k in range(self.nlevels+1)] # index 0 unused (raw samples)
+        self.maxs  = [RingHistory(max(1, N >> k), dtype=dtype) for k in range(self.nlevels+1)]
+        self.count = N # number of samples appended to the pyramid
+        self._build_levels()
+        # Rollups
+        x = self.view()
+        self.R, self.M = R, M
+        if M > 0:
+            if rollups is None:
+                nb = min(M, N//R)
+                bins = x[N-nb*R:].reshape(nb, R)
+                rollups = [np.full(M, x[0], dtype=dtype) for _ in range(3)]
+                rollups[0][M-nb:], rollups[1][M-nb:], rollups[2][M-nb:] = bins.min(axis=1), bins.mean(axis=1), bins.max(axis=1)
+            self.rmin, self.rmean, self.rmax = [RingHistory(M, fill=r, dtype=dtype) for r in rollups]
+            self.rcount = 0 # samples appended since start of the partial rollup bin
+            self.rpmin, self.rpsum, self.rpmax = np.inf, 0.0, -np.inf # min, sum and max of partial rollup bin
+
+    def _build_levels(self):
+        # Pyramid of the current samples, as if they had been appended one by one (bins aligned with count)
+        x, N = self.view(), self.N
+        self.pmin  = [np.inf]*(self.nlevels+1)  # running min/max of the partial bin of each level
+        self.pmax  = [-np.inf]*(self.nlevels+1)
+        for k in range(1, self.nlevels+1):
+            L = 1 << k
+            p = self.count % L # samples in partial bin (the newest samples)
+            nb = min((N-p) // L, len(self.mins[k])) # complete bins
+            if nb > 0:
+                bins = x[N-p-nb*L:N-p].reshape(nb, L)
+                self.mins[k].set(np.concatenate((np.full(len(self.mins[k])-nb, bins[0].min()), bins.min(axis=1))))
+                self.maxs[k].set(np.concatenate((np.full(len(self.maxs[k])-nb, bins[0].max()), bins.max(axis=1))))
+            if p > 0: self.pmin[k], self.pmax[k] = float(x[N-p:].min()), float(x[N-p:].max())
+
+    def set(self, x):
+        super().set(x)
+        self._build_levels()
+
+    def set_rollups(self, rollups):
+        '''Replace the rollups (min, mean, max) of the last M complete bins, oldest first; the partial bin is kept'''
+        for r, x in zip([self.rmin, self.rmean, self.rmax], rollups): r.set(x)
+
+    def _append_levels(self, x):
+        self.count += 1
+        for k in range(1, self.nlevels+1):
+            if x < self.pmin[k]: self.pmin[k] = x
+            if x > self.pmax[k]: self.pmax[k] = x
+            if self.count % (1 << k) == 0: # bin complete
+                self.mins[k].append(self.pmin[k])
+                self.maxs[k].append(self.pmax[k])
+                self.pmin[k], self.pmax[k] = np.inf, -np.inf
+        if self.M > 0:
+            self.rcount += 1
+            self.rpsum += x
+            if x < self.rpmin: self.rpmin = x
+            if x > self.rpmax: self.rpmax = x
+            if self.rcount == self.R: # bin complete
+                self.rmin.append(self.rpmin)
+                self.rmean.append(self.rpsum/self.R)
+                self.rmax.append(self.rpmax)
+                self.rcount, self.rpmin, self.rpsum, self.rpmax = 0, np.inf, 0.0, -np.inf
+
+    def append(self, x):
+        super().append(x)
+        self._append_levels(float(self.buf[self.head-1])) # value as stored (dtype)
+
+    def __iadd__(self, value): 
+        super().__iadd__(value)
+        for k in range(1, self.nlevels+1):
+            self.mins[k] += value; self.maxs[k] += value
+            self.pmin[k] += value; self.pmax[k] += value
+        if self.M > 0:
+            self.rmin += value; self.rmean += value; self.rmax += value
+            self.rpmin += value; self.rpmax += value; self.rpsum += self.rcount*value
+        return self
+
+    def __isub__(self, value): return self.__iadd__(-value)
+
+    def lod(self, nback, maxpoints):
+        '''
+        (age, value) arrays of at most ~maxpoints points representing the last nback samples, oldest first.
+        age is the number of samples before the newest sample (fractional for bins), e.g. time ago = age*dt.
+        '''
+        if nback > self.N and self.M > 0: return self.lod_rollups(nback, maxpoints)
+        nback = min(nback, self.N)
+        if nback <= maxpoints: # raw samples
+            return np.arange(nback-1, -1, -1, dtype=np.float64), self.view()[self.N-nback:]
+
+        # Finest level with at most maxpoints/2 bins in the window
+        k = 1
+        while k < self.nlevels and 2*np.ceil(nback/(1 << k)) > maxpoints: k += 1
+        L = 1 << k
+        p  = self.count % L # samples in partial bin (the newest samples)
+        nb = int(min(np.ceil(max(nback-p, 0)/L), len(self.mins[k]))) # complete bins in window
+
+        age0 = p + L*np.arange(nb-1, -1, -1, dtype=np.float64) # age of newest sample of each bin, oldest bin first
+        age = np.empty(2*nb + (2 if p > 0 else 0))
+        val = np.empty(len(age), dtype=self.buf.dtype)
+        age[0:2*nb:2], val[0:2*nb:2] = age0 + 0.75*(L-1), self.mins[k][len(self.mins[k])-nb:]
+        age[1:2*nb:2], val[1:2*nb:2] = age0 + 0.25*(L-1), self.maxs[k][len(self.maxs[k])-nb:]
+        if p > 0: age[-2:], val[-2:] = [0.75*(p-1), 0.25*(p-1)], [self.pmin[k], self.pmax[k]]
+        return age, val
+
+    def lod_rollups(self, nback, maxpoints):
+        # As lod(), from the rollups: each point pair is the min and max of G consecutive bins
+        p  = self.rcount # samples in partial bin (the newest samples)
+        nb = int(min(np.ceil(max(nback-p, 0)/self.R), self.M)) # complete bins in window
+        G  = max(1, int(np.ceil(2*nb/maxpoints)))
+        nb = (nb//G)*G # (drops the < G oldest bins)
+        ng = nb//G
+        LG = G*self.R # samples per group
+
+        age0 = p + LG*np.arange(ng-1, -1, -1, dtype=np.float64) # age of newest sample of each group, oldest group first
+        age = np.empty(2*ng + (2 if p > 0 else 0))
+        val = np.empty(len(age), dtype=self.buf.dtype)
+        age[0:2*ng:2], val[0:2*ng:2] = age0 + 0.75*(LG-1), self.rmin[self.M-nb:].reshape(ng, G).min(axis=1)
+        age[1:2*ng:2], val[1:2*ng:2] = age0 + 0.25*(LG-1), self.rmax[self.M-nb:].reshape(ng, G).max(axis=1)
+        if p > 0: age[-2:], val[-2:] = [0.75*(p-1), 0.25*(p-1)], [self.rpmin, self.rpmax]
+        return age, val
+
+    def rollups(self):
+        '''(min, mean, max) of the last M bins of R samples, oldest first (not copies)'''
+        return self.rmin.view(), self.rmean.view(), self.rmax.view()
@@ -0,0 +1,158 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+UDP multicast of the drill and surface state, for passive displays on the camp network.
+
+The broadcaster (drill-state-multicast.py) reads the state keys from redis every MULTICAST_DT seconds and sends
+them as one fixed-layout binary datagram (LAYOUT, network byte order, ~200 bytes) to the group MULTICAST_GROUP.
+Any number of displays can receive it with no connection state and no load on the drill host.
+
+MulticastReceiver turns the latest datagram back into the redis keys read by DrillState and SurfaceState (as a
+read-only MirrorClient, see gateway.py), so these work unchanged when connected with
+redis_host="multicast://[group[:port]]" (see connection.py). Only the fields in LAYOUT are carried: depth, speed,
+load and tares, motor state, temperatures, hammer, and the raw orientation sensor values and offsets from which
+DrillState calculates the inclination. Lost or reordered datagrams are simply superseded by the next one.
+Each broadcaster process picks a random session id, so that receivers resynchronise their sequence number when
+the broadcaster is restarted (and its sequence number starts again from 0).
+"""
+
+import socket, struct, threading, json, time, datetime, random
+import redis
+import numpy as np
+from settings import *
+from gateway import GATEWAY_KEYS, MirrorClient
+
+MAGIC, VERSION = b'DS', 2
+
+DRILL_FIELDS = ['motor_rpm', 'motor_current', 'motor_voltage', 'motor_duty_cycle', 'motor_controller_temp', 
+                'temperature_electronics', 'temperature_motor', 'pressure_electronics', 'hammer', 'tachometer', 'downhole_voltage',
+                'inclination_x', 'inclination_y'] + \
+               ['%s_%s'%(field,i) for field in ['accelerometer','magnetometer','gyroscope'] for i in ['x','y','z']] + \
+               ['quaternion_%s'%(i) for i in ['x','y','z','w']]
+QUALITY_FIELDS = ['quality_sys', 'quality_gyro', 'quality_accel', 'quality_magn']
+OFFSET_KEYS    = ['offset-%s-%s'%(method,ang) for method in ['sfus','ahrs'] for ang in ['incl','azim','roll']]
+
+LAYOUT = [('magic','2s'), ('version','B'), ('session','I'), ('seq','I'), ('time','d')] + \
+         [('depth','f'), ('velocity','f'), ('depth_timestamp','d'), ('depthtare','f'), ('corelength','f'), 
+          ('load','f'), ('load_timestamp','d'), ('loadtare','f'), ('alertloggers','B')] + \
+         [('received','d')] + [(f,'f') for f in DRILL_FIELDS] + [(f,'B') for f in QUALITY_FIELDS] + \
+         [(k,'f') for k in OFFSET_KEYS]
+
+STRUCT = struct.Struct('!' + ''.join([code for _, code in LAYOUT]))
+FIELDS = [name for name, _ in LAYOUT]
+
+RECEIVED_FORMAT = '%Y-%m-%d %H:%M:%S' # of "received" in drill state
+
+def tofloat(value):
+    try:    return float(value)
+    except: return np.nan
+
+def pack(values, session, seq, tserver):
+    '''Datagram number seq of broadcaster session, of the redis values {key: value} (GATEWAY_KEYS) read at redis server time tserver (seconds)'''
+    f = {'magic':MAGIC, 'version':VERSION, 'session':session, 'seq':seq % 2**32, 'time':tserver}
+    try:    encoder = json.loads(values['depth-encoder'])
+    except: encoder = {}
+    f['depth'], f['velocity'], f['depth_timestamp'] = [tofloat(encoder.get(k)) for k in ['depth','velocity','timestamp']]
+    try:    loadcell = json.loads(values['load-cell'])
+    except: loadcell = None
+    if not isinstance(loadcell, dict): loadcell = {'load':loadcell} # 2023 version is the load only
+    f['load'], f['load_timestamp'] = tofloat(loadcell.get('load')), tofloat(loadcell.get('timestamp'))
+    f['depthtare'], f['corelength'], f['loadtare'] = [tofloat(values.get(k)) for k in ['depth-tare','core-length','load-tare']]
+    f['alertloggers'] = 1 if tofloat(values.get('alert-loggers')) == 1 else 0
+    try:    drill = json.loads(values['drill-state'])
+    except: drill = {}
+    try:    f['received'] = datetime.datetime.strptime(drill['received'], RECEIVED_FORMAT).timestamp()
+    except: f['received'] = np.nan
+    for k in DRILL_FIELDS:   f[k] = tofloat(drill.get(k))
+    for k in QUALITY_FIELDS: f[k] = int(np.clip(np.nan_to_num(tofloat(drill.get(k))), 0, 255))
+    for k in OFFSET_KEYS:    f[k] = tofloat(values.get(k))
+    return STRUCT.pack(*[f[name] for name in FIELDS])
+
+def unpack(datagram):
+    '''(session, seq, redis server time, {key: value (bytes)}) of the datagram, or None if not a datagram of this version'''
+    if len(datagram) != STRUCT.size: return None
+    f = dict(zip(FIELDS, STRUCT.unpack(datagram)))
+    if f['magic'] != MAGIC or f['version'] != VERSION: return None
+    dumps = lambda d: json.dumps({k:v for k,v in d.items() if np.isfinite(v)}).encode('utf-8') # missing (NaN) fields are left out
+    values = {}
+    if np.isfinite(f['depth']): values['depth-encoder'] = dumps({'depth':f['depth'], 'velocity':f['velocity'], 'timestamp':f['depth_timestamp']})
+    if np.isfinite(f['load']):  values['load-cell']     = dumps({'load':f['load'], 'timestamp':f['load_timestamp']})
+    for k, name in [('depth-tare','depthtare'), ('core-length','corelength'), ('load-tare','loadtare')] + [(k,k) for k in OFFSET_KEYS]:
+        if np.isfinite(f[name]): values[k] = ('%r'%(f[name])).encode('utf-8')
+    values['alert-loggers'] = b'%i'%(f['alertloggers'])
+    if np.isfinite(f['received']):
+        drill = {k:f[k] for k in DRILL_FIELDS if np.isfinite(f[k])}
+        drill.update({k:f[k] for k in QUALITY_FIELDS})
+        drill['received'] = datetime.datetime.fromtimestamp(f['received']).strftime(RECEIVED_FORMAT)
+        values['drill-state'] = json.dumps(drill).encode('utf-8')
+    return f['session'], f['seq'], f['time'], values
+
+
+class Broadcaster():
+
+    """
+        Sends the state read from redis (rc) to the multicast group every MULTICAST_DT seconds.
+    """
+
+    def __init__(self, rc, group=MULTICAST_GROUP, port=MULTICAST_PORT):
+        self.rc, self.address = rc, (group, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+        self.session = random.getrandbits(32) # new for every broadcaster process, see MulticastReceiver.run()
+        self.seq = 0
+
+    def send(self):
+        pipe = self.rc.pipeline(transaction=False)
+        pipe.mget(GATEWAY_KEYS)
+        pipe.time()
+        values, (sec, usec) = pipe.execute()
+        self.sock.sendto(pack(dict(zip(GATEWAY_KEYS, values)), self.session, self.seq, sec + 1e-6*usec), self.address)
+        self.seq += 1
+
+    def run(self):
+        while True:
+            t0 = time.time()
+            try:
+                self.send()
+            except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError):
+                print('drill-state-multicast: lost redis connection, retrying in 2s')
+                time.sleep(2)
+            except OSError as e: # e.g. network down
+                print('drill-state-multicast: sending failed (%s), retrying in 2s'%(e))
+                time.sleep(2)
+            time.sleep(max(0, MULTICAST_DT - (time.time()-t0)))
+
+
+class MulticastReceiver(MirrorClient):
+
+    """
+        Receives the datagrams of the multicast group in a background thread and answers redis calls from the latest.
+    """
+
+    def __init__(self, group=MULTICAST_GROUP, port=MULTICAST_PORT):
+        super().__init__()
+        self.source = 'multicast group %s:%i'%(group, port)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # several receivers on one host
+        self.sock.bind(('', port))
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton('0.0.0.0')))
+        self.session, self.seq = None, None # of last datagram accepted
+        self.first = threading.Event()
+        threading.Thread(target=self.run, daemon=True).start()
+        if not self.first.wait(GATEWAY_TIMEOUT): print('MulticastReceiver: nothing received from %s yet'%(self.source))
+
+    def run(self):
+        while True:
+            try:
+                msg = unpack(self.sock.recv(2*STRUCT.size))
+            except OSError as e:
+                print('MulticastReceiver: receiving failed (%s)'%(e))
+                time.sleep(1)
+                continue
+            if msg is None: continue
+            session, seq, tserver, values = msg
+            if session == self.session and 0 < (self.seq - seq) % 2**32 < 2**31: continue # older than last datagram (reordered)
+            if session != self.session and self.session is not None: print('MulticastReceiver: broadcaster restarted, resynchronising')
+            self.session, self.seq = session, seq
+            self.receive((int(tserver), int(1e6*(tserver - int(tserver)))), values, [k for k in self.values if k not in values])
+            self.first.set()
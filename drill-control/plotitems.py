@@ -0,0 +1,102 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+pyqtgraph items for live plots that grow by a few points per update.
+"""
+
+import numpy as np
+import pyqtgraph as pg
+
+class IncrementalScatter(pg.ScatterPlotItem):
+
+    """
+        Scatter plot of the points of the last nwindow samples appended (at most N points).
+
+        ScatterPlotItem.setData() rebuilds the point records, styles and symbol atlas lookups of all points, which is
+        expensive for thousands of points. Here the N point records are allocated and styled once; append() overwrites
+        the oldest record in place (ring buffer) and hides points that have fallen out of the window, so the cost per
+        sample does not depend on the number of points shown.
+        All points share the same symbol, size, pen and brush (given as for ScatterPlotItem).
+        Updating in place means using ScatterPlotItem internals (data, bounds, invalidate()), which are not public API and
+        change between pyqtgraph releases; the version it was tested with is pinned in requirements.txt.
+
+        A sample that would be drawn within mergepx pixels of the newest point (e.g. drill not moving) is merged into
+        that point instead of adding a new one, so a stationary drill does not fill the buffer with identical points.
+    """
+
+    def __init__(self, N, mergepx=1, **kwargs):
+        super().__init__(**kwargs)
+        self.N = N
+        self.mergepx = mergepx
+        self.setData(x=np.zeros(N), y=np.zeros(N)) # allocate and style all point records once
+        self.sample = np.full(N, -1, dtype=np.int64) # sample number of each point (of the newest sample merged into it)
+        self.nwindow = N
+        self.reset()
+
+    def reset(self, x=None, y=None):
+        '''Remove all points, and add the samples x, y (oldest first) if given (without merging)'''
+        self.data['visible'] = False
+        self.sample[:] = -1
+        self.head   = 0 # record to write next point to (oldest point if full)
+        self.nshown = 0 # number of visible points, which are the newest ones (records head-nshown to head-1)
+        self.count  = 0 # number of samples appended
+        if x is not None:
+            x, y = np.asarray(x)[-self.N:], np.asarray(y)[-self.N:]
+            n = len(x)
+            self.data['x'][:n], self.data['y'][:n] = x, y
+            self.sample[:n] = np.arange(n)
+            self.head, self.count = n % self.N, n
+            self.setWindow(self.nwindow)
+        self.changed()
+
+    def setWindow(self, nwindow):
+        '''Show points of the last nwindow samples'''
+        self.nwindow = nwindow
+        shown = (self.sample >= 0) & (self.sample >= self.count - nwindow)
+        self.data['visible'] = shown
+        self.nshown = int(np.sum(shown))
+        self.changed()
+
+    def append(self, x, y):
+        '''Add sample'''
+        added = np.isfinite(x) and np.isfinite(y)
+        last = (self.head-1) % self.N
+        if added and self.nshown > 0 and self.mergepx > 0 and self.isclose(x - self.data['x'][last], y - self.data['y'][last]):
+            self.sample[last] = self.count
+            added = False
+        elif added:
+            self.data['x'][self.head], self.data['y'][self.head] = x, y
+            self.data['visible'][self.head] = True
+            self.sample[self.head] = self.count
+            self.head = (self.head + 1) % self.N
+            self.nshown = min(self.nshown + 1, self.N)
+        self.count += 1
+        if self.evict() or added: self.changed() # a merged sample changes nothing drawn, so needs no repaint
+
+    def evict(self):
+        # Hide oldest shown points until all shown points are within window; returns True if any were hidden
+        nshown = self.nshown
+        while self.nshown > 0:
+            oldest = (self.head - self.nshown) % self.N
+            if self.sample[oldest] >= self.count - self.nwindow: break
+            self.data['visible'][oldest] = False
+            self.nshown -= 1
+        return self.nshown != nshown
+
+    def isclose(self, dx, dy):
+        # Would the points be drawn within mergepx pixels of each other?
+        px, py = self.pixelVectors()
+        if px is None or py is None: return False
+        return abs(dx) < self.mergepx*px.length() and abs(dy) < self.mergepx*py.length()
+
+    def shown(self):
+        '''(x, y) of the points shown, oldest first'''
+        I = (self.head - self.nshown + np.arange(self.nshown)) % self.N
+        return self.data['x'][I], self.data['y'][I]
+
+    def changed(self):
+        # Point positions/visibility changed in place: drop cached bounds and drawing, and repaint
+        self.bounds = [None, None]
+        self.prepareGeometryChange()
+        self.informViewBoundsChanged()
+        self.invalidate()
@@ -0,0 +1,78 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Timing of the GUI update loops, to see where the time budget per update (e.g. 125 ms in drill-control) goes.
+
+SectionTimer keeps the durations of the named sections of a periodic task over its last N runs:
+
+    timing = SectionTimer(['graphs', 'boxes'])
+    timing.start(); ...graphs...; timing.mark('graphs'); ...boxes...; timing.mark('boxes'); timing.stop()
+
+A section that is not run in an update (not marked) simply gets no sample. Besides the sections, the total time of
+each update (start to stop) and the period between updates (start to start, including the time the event loop spent on
+painting etc.) are kept. The cost is one perf_counter() call and one ring buffer write per mark.
+"""
+
+import time, json, socket, pstats, cProfile
+import numpy as np
+from settings import *
+from history import RingHistory
+
+HIST_BINS  = np.array([0, 1, 2, 5, 10, 20, 50, 100, 200, 500, np.inf]) # ms
+SPARKLINE  = ' ▁▂▃▄▅▆▇█'
+
+class SectionTimer():
+
+    def __init__(self, sections, N=TIMING_N):
+        self.sections = list(sections) + ['total', 'period']
+        self.durations = {s: RingHistory(N, fill=np.nan, dtype=np.float64) for s in self.sections} # seconds
+        self.tstart = None
+
+    def start(self):
+        t = time.perf_counter()
+        if self.tstart is not None: self.durations['period'].append(t - self.tstart)
+        self.tstart = self.tmark = t
+
+    def mark(self, section):
+        '''End of section (started at the previous mark or at start())'''
+        t = time.perf_counter()
+        self.durations[section].append(t - self.tmark)
+        self.tmark = t
+
+    def stop(self):
+        self.durations['total'].append(time.perf_counter() - self.tstart)
+
+    def stats(self):
+        '''{section: {'n', 'p50', 'p95', 'max', 'hist'}} in ms over the last N runs (hist counts per HIST_BINS bin)'''
+        stats = {}
+        for s in self.sections:
+            d = 1e3*np.asarray(self.durations[s])
+            d = d[np.isfinite(d)]
+            if len(d) == 0: continue
+            p50, p95 = np.percentile(d, [50, 95])
+            stats[s] = {'n':len(d), 'p50':round(p50,2), 'p95':round(p95,2), 'max':round(float(np.amax(d)),2), 'hist':np.histogram(d, HIST_BINS)[0].tolist()}
+        return stats
+
+def report(timers, budget=None):
+    '''Text table of the stats of the named timers {name: SectionTimer}, with rolling histograms drawn as sparklines'''
+    lines = ['%-30s %7s %7s %7s  %s'%('ms', 'p50', 'p95', 'max', 'histogram')]
+    for name, timer in timers.items():
+        for s, st in timer.stats().items():
+            h = np.array(st['hist'], dtype=np.float64)
+            spark = ''.join([SPARKLINE[int(np.ceil(8*c/np.amax(h)))] for c in h])
+            lines.append('%-30s %7.1f %7.1f %7.1f  %s'%('%s: %s'%(name, s), st['p50'], st['p95'], st['max'], spark))
+    lines.append('histogram bins (ms): %s'%(', '.join(['%g-%g'%(a,b) for a,b in zip(HIST_BINS[:-2],HIST_BINS[1:-1])] + ['>%g'%(HIST_BINS[-2])])))
+    if budget is not None: lines.append('budget per update: %.0f ms'%(1e3*budget))
+    return '\n'.join(lines)
+
+def publish_metrics(rc, program, timers):
+    '''Save the stats of the named timers {name: SectionTimer} to the redis key METRICS_KEY:<program>:<hostname>'''
+    metrics = {'time':time.time(), 'timers':{name:timer.stats() for name, timer in timers.items()}}
+    rc.set('%s:%s:%s'%(METRICS_KEY, program, socket.gethostname()), json.dumps(metrics), ex=int(3*METRICS_DT))
+
+def dump_profile(profiler, fname, nlines=30):
+    '''Save profile to fname (for e.g. snakeviz) and print the most expensive calls'''
+    profiler.disable()
+    profiler.dump_stats(fname)
+    print('Saved profile to %s'%(fname))
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(nlines)
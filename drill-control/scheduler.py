@@ -0,0 +1,60 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Render throttling for the Qt GUIs, which separates taking in new data from drawing it.
+
+The GUIs take in every update (e.g. append to their plot histories) but ask RenderScheduler.due() whether to also
+draw it. Drawing is skipped entirely while the window is hidden, minimised or not exposed (e.g. covered by another
+window or the screen is blanked, if the window system reports that), and happens at the reduced rate RENDER_IDLE_DT
+once neither new data nor user interaction (mouse, keyboard) has occurred for RENDER_IDLE_AFTER seconds.
+New data or user interaction returns to drawing every update, and a window that becomes visible again is drawn at
+the next update.
+
+Usage:
+    scheduler = RenderScheduler(window)
+    ...take in update...
+    if scheduler.due(changed): ...draw...
+"""
+
+import time
+from PyQt5.QtCore import QObject, QEvent
+from PyQt5.QtWidgets import QApplication
+from settings import *
+
+INTERACTION_EVENTS = (QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseMove, QEvent.Wheel, QEvent.KeyPress, QEvent.TouchBegin)
+
+class RenderScheduler(QObject):
+
+    def __init__(self, window, idle_after=RENDER_IDLE_AFTER, idle_dt=RENDER_IDLE_DT):
+        super().__init__()
+        self.window = window
+        self.idle_after, self.idle_dt = idle_after, idle_dt
+        self.tactive   = time.time() # time of last new data or user interaction
+        self.trendered = 0 # time of last drawn update
+        self.missed    = False # was an update skipped because the window was not visible?
+        QApplication.instance().installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() in INTERACTION_EVENTS: self.tactive = time.time()
+        return False # never consume events
+
+    def visible(self):
+        '''Is the window shown on screen?'''
+        if not self.window.isVisible() or self.window.isMinimized(): return False
+        handle = self.window.windowHandle()
+        return handle is None or handle.isExposed()
+
+    def idle(self, now=None):
+        '''No new data or user interaction for idle_after seconds?'''
+        return (time.time() if now is None else now) - self.tactive > self.idle_after
+
+    def due(self, changed):
+        '''Should the update just taken in (with new data if changed) be drawn?'''
+        now = time.time()
+        if changed: self.tactive = now
+        if not self.visible():
+            self.missed = True
+            return False
+        if self.idle(now) and not self.missed and now - self.trendered < self.idle_dt: return False
+        self.trendered, self.missed = now, False
+        return True
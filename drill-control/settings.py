@@ -75,3 +75,76 @@ warn__downholevoltage         = [325,425]  # volt
 warn__load     = [-100,1400] # kg
 warn__velocity = [-130,130]  # cm/s
 
+
+#----------------------
+# Derived drill state (drill-state-derived.py)
+#----------------------
+
+DERIVED_STATE_KEY    = 'drill-state-derived'        # latest derived state (JSON)
+DERIVED_STATE_STREAM = 'drill-state-derived-stream' # history of derived states
+DERIVED_STATE_STREAM_MAXLEN = 50000                 # approx. number of stream entries kept (~14 hours at 1 Hz)
+
+#----------------------
+# Madgwick orientation filter (AHRS estimator "Madgwick")
+#----------------------
+
+MADGWICK_GAIN   = 0.1 # filter gain (beta); larger values trust accelerometer/magnetometer more than gyroscope
+MADGWICK_MAXGAP = 10  # seconds; re-initialize filter from SAAM if no drill state was received for this long
+
+#----------------------
+# Surface sensor liveness
+#----------------------
+
+SURFACE_MAXAGE = 2.0 # seconds; depth counter and load cell are offline if their last (timestamped) reading is older than this
+
+#----------------------
+# Redis connection and data acquisition (connection.py, acquisition.py)
+#----------------------
+
+REDIS_TIMEOUT = 1.0 # seconds; socket connect/read timeout of redis calls, so that a network hiccup cannot block a caller indefinitely
+STALE_AFTER   = 3.0 # seconds; displayed data is marked stale if redis could not be read for this long
+
+#----------------------
+# Recorded telemetry for refilling plot histories on restart (telemetry.py)
+#----------------------
+
+TELEMETRY_STREAM = 'drill-telemetry-stream' # recorded by drill-state-derived.py
+TELEMETRY_STREAM_MAXLEN = 50000             # approx. number of entries kept (~14 hours)
+TELEMETRY_DT     = 1.0 # seconds between recorded samples
+TELEMETRY_MAXGAP = 5.0 # seconds; longer gaps in the recording are not interpolated over
+TELEMETRY_CHUNK  = 2000 # entries per XRANGE when reading the older recording in the background (telemetry.Reader)
+TELEMETRY_CHUNK_DT = 0.1 # seconds between these reads
+
+#----------------------
+# Timing of GUI updates (profiling.py)
+#----------------------
+
+TIMING_N    = 480 # number of most recent updates kept for timing statistics (1 minute in drill-control)
+METRICS_KEY = 'gui-metrics' # timing statistics are saved to METRICS_KEY:<program>:<hostname>
+METRICS_DT  = 10  # seconds between saving timing statistics
+
+#----------------------
+# Render throttling of GUIs (scheduler.py)
+#----------------------
+
+RENDER_IDLE_AFTER = 10  # seconds without new data or user interaction before GUIs redraw at the idle rate
+RENDER_IDLE_DT    = 2.0 # seconds between redraws when idle
+
+#----------------------
+# Fan-out gateway for read-only displays (gateway.py, drill-state-gateway.py)
+#----------------------
+
+GATEWAY_PORT      = 6380 # TCP port; clients connect with redis_host="gateway://host[:port]" instead of a redis host
+GATEWAY_DT        = 0.1  # seconds between gateway polls of redis
+GATEWAY_HEARTBEAT = 1.0  # seconds; longest time between messages to clients, also if nothing changed
+GATEWAY_TIMEOUT   = 3.0  # seconds without messages before a client considers the gateway lost
+INFO_HOST         = 'gateway://%s'%(DRILL_HOST) # used by info screens (drill-position.py info)
+
+#----------------------
+# UDP multicast of compact drill and surface state (multicast.py, drill-state-multicast.py)
+#----------------------
+
+MULTICAST_GROUP = '239.255.42.10' # clients receive with redis_host="multicast://[group[:port]]"
+MULTICAST_PORT  = 6381
+MULTICAST_DT    = 0.2 # seconds between datagrams
+MULTICAST_TTL   = 1   # router hops; 1 = camp LAN only
@@ -0,0 +1,53 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Immutable snapshots of the drill and surface states.
+
+DrillState.update() and SurfaceState.update() build a new snapshot from the freshly updated state and replace
+their "snapshot" attribute with it in a single assignment. A reader (e.g. a GUI thread) that takes
+snap = ds.snapshot therefore always sees one consistent state, never a half-updated one, without locks or copying.
+
+Snapshot classes have a fixed set of fields (__slots__); fields cannot be set after creation and numpy arrays are
+made read-only.
+"""
+
+import types
+import numpy as np
+
+def frozen(value):
+    if isinstance(value, np.ndarray):
+        value = value.copy()
+        value.setflags(write=False)
+        return value
+    if isinstance(value, (list, tuple)): return tuple([frozen(v) for v in value])
+    if isinstance(value, dict):          return types.MappingProxyType({k:frozen(v) for k,v in value.items()})
+    return value
+
+class Snapshot():
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for f in self.__slots__: object.__setattr__(self, f, frozen(fields.get(f, None)))
+
+    @classmethod
+    def of(cls, obj):
+        '''Snapshot of the fields of obj (missing attributes are None)'''
+        return cls(**{f:getattr(obj, f, None) for f in cls.__slots__})
+
+    def __setattr__(self, name, value): raise AttributeError('%s is immutable, cannot set "%s"'%(self.__class__.__name__, name))
+    def __delattr__(self, name):        raise AttributeError('%s is immutable, cannot delete "%s"'%(self.__class__.__name__, name))
+
+    def get(self, attr):
+        try:    return getattr(self, attr)
+        except: return None
+
+    def as_dict(self):
+        return {f:getattr(self, f) for f in self.__slots__}
+
+    def __repr__(self):
+        return '%s(%s)'%(self.__class__.__name__, ', '.join(['%s=%r'%(f,getattr(self,f)) for f in self.__slots__]))
+
+def snapshot_class(name, fields):
+    '''Snapshot subclass with the given fields'''
+    return type(name, (Snapshot,), {'__slots__':tuple(fields)})
@@ -0,0 +1,58 @@
+#!/usr/bin/python
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Start-up (import) time benchmark for the drill-control tools.
+
+The bootstrap script restarts the tools at every power cycle, so a tool that pulls in heavy modules
+(scipy, ahrs, pandas, matplotlib, ...) at load time delays the operator getting a working GUI.
+
+For each tool, the module-level import statements are extracted from its source and executed in a fresh
+python process, i.e. the tool's cold start up to (but not including) opening its window.
+Exits with status 1 if any tool is over its budget.
+
+Usage:
+    python3 startup-benchmark.py [BUDGET_SCALE]
+
+Budgets are for a Raspberry Pi 4-class CPU; pass e.g. BUDGET_SCALE=0.3 on a desktop machine.
+"""
+
+import sys, os, ast, time, subprocess
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+
+BUDGET = { # seconds
+    'drill-control.py':          4.0,
+    'drill-position.py':         2.5,
+    'drill-orientation.py':      6.0,
+    'drill-fancyorientation.py': 6.0,
+    'drill-liveorientation.py':  4.0,
+}
+
+NRUNS = 3 # take median of this many runs
+
+def toplevel_imports(fname):
+    with open(os.path.join(DIR, fname)) as fh: tree = ast.parse(fh.read())
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return '\n'.join([ast.unparse(node) for node in nodes])
+
+def time_imports(code):
+    env = dict(os.environ, MPLBACKEND='Agg', QT_QPA_PLATFORM='offscreen')
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, '-c', code], cwd=DIR, env=env, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - t0
+
+if __name__ == '__main__':
+
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    failed = []
+
+    for fname in BUDGET:
+        code = toplevel_imports(fname)
+        dt = sorted([time_imports(code) for ii in range(NRUNS)])[NRUNS//2]
+        budget = scale*BUDGET[fname]
+        ok = dt <= budget
+        print('%-26s %6.2fs (budget %.2fs) %s'%(fname, dt, budget, 'OK' if ok else 'OVER BUDGET'))
+        if not ok: failed.append(fname)
+
+    if len(failed) > 0: sys.exit('Start-up budget exceeded for: %s'%(', '.join(failed)))
@@ -1,31 +1,111 @@
 #!/usr/bin/python
 # N. M. Rathmann <rathmann@nbi.ku.dk>, 2017-2024
 
-import redis, json, datetime, time, math
+import redis, json, datetime, time, math, importlib, hashlib
 import numpy as np
 from settings import *
+from snapshot import snapshot_class
+from connection import connect
 import warnings
 warnings.filterwarnings('ignore', message='.*Gimbal', )
 
-from scipy.spatial.transform import Rotation
-import ahrs
-from ahrs.filters import SAAM, FLAE, QUEST, OLEQ, FQA
-from ahrs import Quaternion
+### Heavy modules (scipy, ahrs) are imported on first use so that tools not needing orientation start fast
 
-egrip_N, egrip_E, egrip_height = 75.63248, -35.98911, 2.6
+class LazyImport():
+
+    """
+        Stand-in for a module (or module attribute) that is imported the first time one of its attributes is accessed.
+        E.g. Rotation = LazyImport('scipy.spatial.transform', 'Rotation') behaves like the scipy Rotation class.
+    """
+
+    def __init__(self, module, attr=None):
+        self.__dict__['_module'] = module
+        self.__dict__['_attr']   = attr
+        self.__dict__['_obj']    = None
+
+    def _load(self):
+        if self._obj is None:
+            obj = importlib.import_module(self._module)
+            if self._attr is not None: obj = getattr(obj, self._attr)
+            self.__dict__['_obj'] = obj
+        return self._obj
+
+    def __getattr__(self, name): return getattr(self._load(), name)
+    def __call__(self, *args, **kwargs): return self._load()(*args, **kwargs)
+
+Rotation = LazyImport('scipy.spatial.transform', 'Rotation')
+ahrs     = LazyImport('ahrs')
 
-wmm = ahrs.utils.WMM(datetime.datetime.now(), latitude=egrip_N, longitude=egrip_E, height=egrip_height) 
-mag_dip = wmm.I # Inclination angle (a.k.a. dip angle) -- https://ahrs.readthedocs.io/en/latest/wmm.html
-mag_ref = np.array([wmm.X, wmm.Y, wmm.Z])
-#print('mag_ref = (%.1f, %.1f, %.1f) %.1f'%(mag_ref[0],mag_ref[1],mag_ref[2], np.linalg.norm(mag_ref)))
+egrip_N, egrip_E, egrip_height = 75.63248, -35.98911, 2.6
 frame = 'NED'
 
-AHRS_estimators = {
-    'SAAM': SAAM(),
-    'FLAE': FLAE(magnetic_dip=mag_dip),
-    'OLEQ': OLEQ(magnetic_ref=mag_ref, frame=frame),
-    'FQA' : FQA(mag_ref=mag_ref)
-}
+AHRS_estimators = {} # name -> estimator, populated by init_AHRS_estimators() on first use
+
+def init_AHRS_estimators():
+    if len(AHRS_estimators) > 0: return AHRS_estimators
+    from ahrs.filters import SAAM, FLAE, OLEQ, FQA
+    wmm = ahrs.utils.WMM(datetime.datetime.now(), latitude=egrip_N, longitude=egrip_E, height=egrip_height) 
+    mag_dip = wmm.I # Inclination angle (a.k.a. dip angle) -- https://ahrs.readthedocs.io/en/latest/wmm.html
+    mag_ref = np.array([wmm.X, wmm.Y, wmm.Z])
+    #print('mag_ref = (%.1f, %.1f, %.1f) %.1f'%(mag_ref[0],mag_ref[1],mag_ref[2], np.linalg.norm(mag_ref)))
+    AHRS_estimators.update({
+        'SAAM': SAAM(),
+        'FLAE': FLAE(magnetic_dip=mag_dip),
+        'OLEQ': OLEQ(magnetic_ref=mag_ref, frame=frame),
+        'FQA' : FQA(mag_ref=mag_ref),
+        'Madgwick': MadgwickEstimator(),
+    })
+    return AHRS_estimators
+
+def get_AHRS_estimator(name): return init_AHRS_estimators()[name]
+
+class MadgwickEstimator():
+
+    """
+        Stateful Madgwick filter (ahrs.filters.Madgwick) fusing gyroscope, accelerometer and magnetometer.
+        Has the estimate() interface of the ahrs estimators, but carries the attitude from one drill state to the next
+        so that each new sample costs a single filter step rather than a new estimate from scratch.
+        The attitude is (re)initialized from SAAM on the first sample and after gaps longer than maxgap.
+    """
+
+    stateful = True
+
+    def __init__(self, gain=MADGWICK_GAIN, maxgap=MADGWICK_MAXGAP):
+        from ahrs.filters import Madgwick, SAAM
+        self.filter = Madgwick(gain=gain)
+        self.initializer = SAAM()
+        self.maxgap = maxgap
+        self.q = None # last attitude, scalar-first (w,x,y,z) like ahrs
+        self.t = None # time of last step
+        self.sample_id = None # identifies the last sample so that the same drill state is not integrated twice
+
+    def estimate(self, acc=None, mag=None, gyr=None, sample_id=None):
+        if sample_id is not None and sample_id == self.sample_id: return self.q
+        t = time.time()
+        dt = None if self.t is None else t - self.t
+        if gyr is None or self.q is None or np.any(np.isnan(self.q)) or not (0 < dt < self.maxgap):
+            q = self.initializer.estimate(acc=acc, mag=mag)
+        else:
+            q = self.filter.updateMARG(self.q, gyr=np.deg2rad(gyr), acc=acc, mag=mag, dt=dt) # gyroscope is in deg/s
+        self.q, self.t, self.sample_id = np.array(q, dtype=np.float64), t, sample_id
+        return self.q
+
+
+### Fields of DrillState.snapshot
+
+TRIAXIAL = ['magnetometer', 'accelerometer', 'linearaccel', 'gravity', 'gyroscope']
+
+DrillSnapshot = snapshot_class('DrillSnapshot', [
+    'received', 'fetched', 'islive', 'motorconfig', 'AHRS_estimator',
+    'motor_state', 'motor_rpm', 'motor_voltage', 'motor_current', 'motor_controller_temp', 'motor_duty_cycle', 'motor_throttle',
+    'temperature_electronics', 'temperature_auxelectronics', 'temperature_topplug', 'temperature_gear1', 'temperature_gear2', 'temperature_baseplate', 'temperature_motor',
+    'pressure_electronics', 'pressure_topplug', 'pressure_gear1', 'pressure_gear2',
+    'hammer', 'tachometer', 'spin', 'downhole_voltage', 'gyro_alarm',
+    'inclination_x', 'inclination_y', 'quality_sys', 'quality_gyro', 'quality_accel', 'quality_magn',
+    'depth_encoder', 'load_cell',
+] + ['quaternion_%s'%(i) for i in ['x','y','z','w']] \
+  + ['%s_%s'%(field,i) for field in TRIAXIAL for i in ['x','y','z','vec','mag']] \
+  + ['%s_%s'%(f,method) for method in ['sfus','ahrs'] for f in ['quat0','quat','ei0','ei','incl','azim','roll','offset']])
 
 
 class DrillState():
@@ -94,49 +174,49 @@ class DrillState():
 
     incl_sfus, azim_sfus, roll_sfus = 0, 0, 0 
     incl_ahrs, azim_ahrs, roll_ahrs = 0, 0, 0 
-        
-    # Sensor raws; scalar-last (x, y, z, w) format
-    quat0_ahrs = np.array([0,0,0,1])
-    quat0_sfus = np.array([0,0,0,1])
-
-    # ... with offsets applied
-    quat_ahrs = quat0_ahrs
-    quat_sfus = quat0_sfus
-
-    # Sensor offsets
-    # @TODO rename to offsets_*
-    oricalib_ahrs = np.array([0,0,0]) # incl, azim, roll
-    oricalib_sfus = np.array([0,0,0]) # incl, azim, roll
-
-    # Sensor axes
-    ei0 = np.eye(3) # cartesian axes
-    ei0_sfus = [np.zeros(3), np.zeros(3), np.zeros(3)] # x,y,z axis of sensor
-    ei0_ahrs = [np.zeros(3), np.zeros(3), np.zeros(3)] # x,y,z axis of sensor
-    ei_sfus  = [np.zeros(3), np.zeros(3), np.zeros(3)] # x,y,z axis of sensor, with offsets applied
-    ei_ahrs  = [np.zeros(3), np.zeros(3), np.zeros(3)] # x,y,z axis of sensor, with offsets applied
+
+    # Quaternions, sensor offsets and sensor axes are numpy arrays and therefore set per instance in __init__()
         
     ### Communication status 
     # Was the drill state update recently?
     received        = '2022-01-01 00:00:00'
     islive          = False # True = connection is live, else False
     islivethreshold = 15 # seconds before drill state is assumed dead (unless a new state was received)
+    fetched         = 0.0 # time.time() of last successful read from redis (see acquisition.py)
     
     ### Redis connection
     rc = None 
+    packet = None # last raw drill state
     
     
-    def __init__(self, redis_host=LOCAL_HOST, AHRS_estimator='SAAM', DEBUG=True):
+    def __init__(self, redis_host=LOCAL_HOST, AHRS_estimator='SAAM', DEBUG=True, orientation=True, derived=True):
     
         # redis connection (rc) object
-        try:    
-            if DEBUG: print('Connecting to redis server %s ...'%(redis_host))
-            self.rc = redis.StrictRedis(host=redis_host) 
-            self.rc.ping() 
-        except:
-            print('DrillState(): redis connection to %s failed. Using %s instead.'%(redis_host,LOCAL_HOST))
-            self.rc = redis.StrictRedis(host=LOCAL_HOST) 
+        self.rc = connect(redis_host, 'DrillState()', DEBUG=DEBUG)
+
+        # Sensor raws; scalar-last (x, y, z, w) format
+        self.quat0_ahrs = np.array([0,0,0,1])
+        self.quat0_sfus = np.array([0,0,0,1])
+
+        # ... with offsets applied
+        self.quat_ahrs = self.quat0_ahrs
+        self.quat_sfus = self.quat0_sfus
+
+        # Sensor offsets
+        # @TODO rename to offsets_*
+        self.oricalib_ahrs = np.array([0,0,0]) # incl, azim, roll
+        self.oricalib_sfus = np.array([0,0,0]) # incl, azim, roll
+
+        # Sensor axes
+        self.ei0 = np.eye(3) # cartesian axes
+        self.ei0_sfus = [np.zeros(3), np.zeros(3), np.zeros(3)] # x,y,z axis of sensor
+        self.ei0_ahrs = [np.zeros(3), np.zeros(3), np.zeros(3)] # x,y,z axis of sensor
+        self.ei_sfus  = [np.zeros(3), np.zeros(3), np.zeros(3)] # x,y,z axis of sensor, with offsets applied
+        self.ei_ahrs  = [np.zeros(3), np.zeros(3), np.zeros(3)] # x,y,z axis of sensor, with offsets applied
 
         self.AHRS_estimator = AHRS_estimator
+        self.orientation = orientation # calculate orientation? If False, scipy and ahrs are never imported
+        self.derived = derived # use orientation published by drill-state-derived.py when available?
         self.update()
                 
 
@@ -147,26 +227,77 @@ class DrillState():
 
     def update(self):
     
-        try:    ds = json.loads(self.rc.get('drill-state')) # redis state
+        try:    
+            self.packet = self.rc.get('drill-state') # raw redis state, also identifies the packet received
+            self.fetched = time.time()
+            ds = json.loads(self.packet)
         except: ds = {}
         for key in ds: setattr(self, key, ds[key])
 #        print(ds)
 
         self.spin = round(abs(self.get_spin()), 2)
 
-        for field in ['magnetometer', 'accelerometer', 'linearaccel', 'gravity', 'gyroscope']:
+        for field in TRIAXIAL:
             vecfield    = '%s_vec'%(field)
             vecfieldmag = '%s_mag'%(field)
-            setattr(self, vecfield, np.array([getattr(self, '%s_%s'%(field,i)) for i in ['x','y','z']]))
+            setattr(self, vecfield, np.array([getattr(self, '%s_%s'%(field,i)) for i in ['x','y','z']], dtype=np.float64))
             setattr(self, vecfieldmag, np.linalg.norm(getattr(self,vecfield)))
 
         ### Orientation
 
+        if self.orientation: self.update_orientation()
+
+        ### Motor
+        
+        self.motor_throttle = 100 * self.motor_duty_cycle
+
+        ### Rename
+        
+        if hasattr(self, 'aux_temperature_electronics'):
+            self.temperature_auxelectronics = self.aux_temperature_electronics        
+            self.temperature_topplug        = self.aux_temperature_topplug
+            self.temperature_gear1          = self.aux_temperature_gear1
+            self.temperature_gear2          = self.aux_temperature_gear2
+        
+        ### AUX
+        
+        self.hammer      = 100 * self.hammer/HAMMER_MAX
+        try:    self.motorconfig = self.rc.get('motor-config')
+        except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError): pass # not connected (or no data from gateway/multicast, see gateway.py); keep last
+        
+        ### Is live?
+        
+        now = datetime.datetime.now()
+        lastreceived = datetime.datetime.strptime(self.received, '%Y-%m-%d %H:%M:%S')
+        dt = (now - lastreceived).total_seconds()
+        self.islive = dt < self.islivethreshold
+#        print(self.received, lastreceived, now, dt, self.islivethreshold)
+#        self.islive = 1
+#        print('ds: dt=%f'%dt)
+
+        ### Snapshot for readers in other threads; replaced in one assignment so readers never see a half-updated state
+        
+        self.snapshot = DrillSnapshot.of(self)
+
+    def update_orientation(self):
+
+        # Use the orientation computed by drill-state-derived.py if it is for the current drill state, else compute it here
+        if self.derived and self.load_derived(): return
+
+        self.update_offsets()
+        self.update_orientation_sfus()
+        self.update_orientation_ahrs()
+
+    def update_offsets(self):
+
         # Get orientation offset parameters
         for method in ['sfus','ahrs']:
-            oricalib = np.array([self.rc.get('offset-%s-%s'%(method,ang)) for ang in ['incl','azim','roll']], dtype=np.float64)
+            try:    oricalib = np.array([self.rc.get('offset-%s-%s'%(method,ang)) for ang in ['incl','azim','roll']], dtype=np.float64)
+            except redis.exceptions.RedisError: continue # not connected (e.g. timeout on a broken link); keep last
             if np.any(np.isnan(oricalib)): oricalib = np.array([0,0,0])
-            setattr(self, 'offset_%s'%(method), oricalib)      
+            setattr(self, 'offset_%s'%(method), oricalib)
+
+    def update_orientation_sfus(self):
 
         # SFUS (BNO055 Sensor Fusion)
         
@@ -185,9 +316,14 @@ class DrillState():
             print(self.incl_sfus, self.azim_sfus, self.roll_sfus)
             print(*quat_to_euler(self.quat_sfus))
 
+    def update_orientation_ahrs(self):
+
         # AHRS
 
-        self.quat0_ahrs = wxyz_to_xyzw(AHRS_estimators[self.AHRS_estimator].estimate(acc=self.accelerometer_vec, mag=self.magnetometer_vec)) # note estimate() returns w,x,y,z ordered quats
+        estimator = get_AHRS_estimator(self.AHRS_estimator)
+        kwargs = dict(gyr=self.gyroscope_vec, sample_id=self.packet) if getattr(estimator, 'stateful', False) else {}
+        try:    self.quat0_ahrs = wxyz_to_xyzw(estimator.estimate(acc=self.accelerometer_vec, mag=self.magnetometer_vec, **kwargs)) # note estimate() returns w,x,y,z ordered quats
+        except: self.quat0_ahrs = np.nan
         self.quat0_ahrs = np.array(self.quat0_ahrs, dtype=np.float64)
         # if estimator is bad, ignore result
         if np.size(self.quat0_ahrs) != 4 or np.any(np.isnan(self.quat0_ahrs)): self.quat0_ahrs = np.array([0,0,0,-1])
@@ -196,33 +332,60 @@ class DrillState():
         self.quat_ahrs = self.apply_offsets(self.quat0_ahrs, 'ahrs') # apply calibration
         (self.ei_ahrs, self.incl_ahrs, self.azim_ahrs, self.roll_ahrs) = self.quat2ori(self.quat_ahrs)
         (self.ei0_ahrs, _,_,_) = self.quat2ori(self.quat0_ahrs)
-            
-        ### Motor
-        
-        self.motor_throttle = 100 * self.motor_duty_cycle
 
-        ### Rename
-        
-        if hasattr(self, 'aux_temperature_electronics'):
-            self.temperature_auxelectronics = self.aux_temperature_electronics        
-            self.temperature_topplug        = self.aux_temperature_topplug
-            self.temperature_gear1          = self.aux_temperature_gear1
-            self.temperature_gear2          = self.aux_temperature_gear2
-        
-        ### AUX
-        
-        self.hammer      = 100 * self.hammer/HAMMER_MAX
-        self.motorconfig = self.rc.get('motor-config')
-        
-        ### Is live?
-        
-        now = datetime.datetime.now()
-        lastreceived = datetime.datetime.strptime(self.received, '%Y-%m-%d %H:%M:%S')
-        dt = (now - lastreceived).total_seconds()
-        self.islive = dt < self.islivethreshold
-#        print(self.received, lastreceived, now, dt, self.islivethreshold)
-#        self.islive = 1
-#        print('ds: dt=%f'%dt)
+
+    ### Derived state, shared between clients by drill-state-derived.py
+
+    def packet_id(self):
+        '''Hash of the raw drill state (packet), identifying which packet a derived state belongs to; None if no packet'''
+        if self.packet is None: return None
+        packet = self.packet.encode('utf-8') if isinstance(self.packet, str) else self.packet
+        return hashlib.sha1(packet).hexdigest()
+
+    def get_orientation_fields(self, method):
+        ori = {f: np.asarray(getattr(self, '%s_%s'%(f,method)), dtype=np.float64).tolist() for f in ['quat0','quat','ei0','ei']}
+        ori.update({f: float(getattr(self, '%s_%s'%(f,method))) for f in ['incl','azim','roll']})
+        return ori
+
+    def set_orientation_fields(self, method, ori):
+        for f in ['quat0','quat']: setattr(self, '%s_%s'%(f,method), np.array(ori[f], dtype=np.float64))
+        for f in ['ei0','ei']:     setattr(self, '%s_%s'%(f,method), list(np.array(ori[f], dtype=np.float64)))
+        for f in ['incl','azim','roll']: setattr(self, '%s_%s'%(f,method), ori[f])
+
+    def derived_state(self):
+        '''
+        Derived fields of the current (already updated) drill state, with the AHRS orientation calculated for all estimators.
+        '''
+        derived = {'packet':self.packet_id(), 'received':self.received, 'spin':self.spin}
+        for field in TRIAXIAL:
+            derived['%s_mag'%(field)] = float(getattr(self, '%s_mag'%(field)))
+        for method in ['sfus','ahrs']:
+            derived['offset_%s'%(method)] = np.asarray(getattr(self, 'offset_%s'%(method)), dtype=np.float64).tolist()
+        derived['sfus'] = self.get_orientation_fields('sfus')
+        derived['ahrs'] = {}
+        AHRS_estimator = self.AHRS_estimator
+        for name in init_AHRS_estimators():
+            self.AHRS_estimator = name
+            self.update_orientation_ahrs()
+            derived['ahrs'][name] = self.get_orientation_fields('ahrs')
+        self.AHRS_estimator = AHRS_estimator
+        self.set_orientation_fields('ahrs', derived['ahrs'][AHRS_estimator])
+        return derived
+
+    def load_derived(self):
+        '''
+        Set orientation from the derived state published by drill-state-derived.py.
+        Returns False if not available (service not running, stale, or estimator not provided), in which case nothing is set.
+        '''
+        try:    derived = json.loads(self.rc.get(DERIVED_STATE_KEY))
+        except: return False
+        packet = self.packet_id()
+        if packet is None or derived.get('packet') != packet or self.AHRS_estimator not in derived['ahrs']: return False
+        for method in ['sfus','ahrs']:
+            setattr(self, 'offset_%s'%(method), np.array(derived['offset_%s'%(method)], dtype=np.float64))
+        self.set_orientation_fields('sfus', derived['sfus'])
+        self.set_orientation_fields('ahrs', derived['ahrs'][self.AHRS_estimator])
+        return True
 
 
     ### Orientation
@@ -261,18 +424,23 @@ class DrillState():
         q = qr * qz * q0
         return q.as_quat()
 
-    def save_offset(self, method, reset=False):
+    def save_offset(self, method, reset=False, quat0=None):
+        '''
+        Save the offsets that zero the orientation of the raw sensor quaternion quat0 (default: that of the current state, quat0_<method>),
+        or clear the offsets if reset. Pass quat0 from a snapshot when not called from the thread updating this state.
+        '''
         incl, azim, roll = 0, 0, 0
         if not reset:
         
             ### First get rotation of drill around z axis so that azimuth is 0 when drill tilts outward towards the x-axis (down-tower direction)
             
-            ei0 = getattr(self, 'ei0_%s'%(method)) # raw sensor frame, no offsets applied
+            if quat0 is None: quat0 = getattr(self, 'quat0_%s'%(method)) # raw sensor quat, no offsets applied
+            (ei0, _,_,_) = self.quat2ori(quat0) # raw sensor frame, no offsets applied
             rx,ry,rz = ei0[2] # raw sensor z-axis (drill axis r)
             azim = np.rad2deg(np.arctan2(ry,rx)) # azimuth of drill axis
             
             # Apply rotation to get the "zero azimuth" frame
-            q0 = Rotation.from_quat(getattr(self, 'quat0_%s'%(method))) # raw sensor quat, no offsets applied
+            q0 = Rotation.from_quat(quat0)
             qz = self._qz(-azim) # inverse rotation
             q = qz*q0
             (ei, _,_,_) = self.quat2ori(q.as_quat()) # new sensor frame, with offset applied
@@ -291,8 +459,8 @@ class DrillState():
             
         # Save
         print('state_drill.py: setting offsets for "%s":'%(method), incl, azim, roll)
-        self.rc.set('offset-%s-roll'%(method), roll)
-        self.rc.set('offset-%s-azim'%(method), -azim)
+        self.rc.set('offset-%s-roll'%(method), float(roll)) # float(): redis-py would store numpy floats by their repr, e.g. "np.float64(...)"
+        self.rc.set('offset-%s-azim'%(method), float(-azim))
         self.rc.set('offset-%s-incl'%(method), 0)
         
     def set_AHRS_estimator(self, name):
@@ -3,27 +3,37 @@
 import redis, json, time
 import numpy as np
 from settings import *
+from snapshot import snapshot_class
+from connection import connect
+from filters import VelocityEstimator, EMA
+
+SURFACE_KEYS = ['depth-encoder', 'depth-tare', 'core-length', 'load-cell', 'load-tare', 'alert-loggers'] # redis keys read by SurfaceState.update()
+
+SurfaceSnapshot = snapshot_class('SurfaceSnapshot', [
+    'depth', 'depthtime', 'depthtare', 'corelength', 'load', 'loadtare', 'loadnet', 'speedinst', 'speed',
+    'islive_depthcounter', 'islive_loadcell', 'alertloggers', 'fetched',
+])
 
 class SurfaceState():
 
     depth     = 0.0 # current
+    depthtime = 0.0 # time.time() at which depth was measured (see DepthPredictor)
     depthtare = 0.0
     
     corelength = 0.0
     
     load     = 0.0
-    loadprev = 0.0 # used for running smoothed load average
     loadtare = 0.0 # reference value to subtract from "load"
     loadnet  = 0.0 # load - cable weight
 
     # For speed calculation    
     speedinst = 0.0 # instantaneous
     speed     = 0.0 # time-average
-    speedprev = 0.0
     
     # Are sensors live?
     islive_depthcounter = False
     islive_loadcell     = False 
+    fetched             = 0.0 # time.time() of last successful read from redis (see acquisition.py)
     
     # Redis connection
     rc = None 
@@ -33,17 +43,11 @@ class SurfaceState():
     def __init__(self, tavg, dt_intended, redis_host=LOCAL_HOST):
     
         # redis connection (rc) object
-        try:    
-            self.rc = redis.StrictRedis(host=redis_host) 
-            self.rc.ping() 
-        except:
-            print('SurfaceState(): redis connection to %s failed. Using %s instead.'%(redis_host,LOCAL_HOST))
-            self.rc = redis.StrictRedis(host=LOCAL_HOST) 
+        self.rc = connect(redis_host, 'SurfaceState()')
 
         self.dt_intended = dt_intended
-        self.Navg = int(np.round(tavg/dt_intended))
-        self.depth_list = np.zeros((self.Navg))
-        self.time_list = np.zeros((self.Navg))
+        self.velocity   = VelocityEstimator(tavg, dt_intended) # least-squares velocity over last tavg seconds
+        self.loadfilter = EMA(alpha=0.5) # running smoothed load average
 
         np.seterr(divide='ignore', invalid='ignore')
         self.update()
@@ -54,39 +58,43 @@ class SurfaceState():
             
     def update(self, smoothload=True):
 
+        ### Fetch all surface keys and the redis server time (for age of timestamped readings) in one round trip
+        try:    
+            pipe = self.rc.pipeline(transaction=False)
+            pipe.mget(SURFACE_KEYS)
+            pipe.time()
+            values, (sec, usec) = pipe.execute()
+            now_us = 1000000*sec + usec
+            self.fetched = time.time()
+        except: 
+            values, now_us = [None]*len(SURFACE_KEYS), None # probably because not connected?
+        value = dict(zip(SURFACE_KEYS, values))
+
         ### Depth and speed
         try: 
             now = time.time()
-            encoder = json.loads(self.rc.get('depth-encoder'))
+            encoder = json.loads(value['depth-encoder'])
             depth = encoder["depth"]
+            sign  = -1 if depth < 0 else +1 # counting direction of encoder
             depth = abs(depth) # Encoders sometime count depth as negative number due to counting direction. To be insensitive to this, take abs().
-            self.islive_depthcounter = not (int(depth) == 9999 or int(depth) == -9999) 
+            self.islive_depthcounter = not (int(depth) == 9999 or int(depth) == -9999) and self.isrecent(encoder, now_us)
+            if "timestamp" in encoder: now = encoder["timestamp"] # time of sample, for velocity
             
             if self.islive_depthcounter:
 
                 self.depth = depth
+                try:    self.depthtime = self.fetched - (1e-6*now_us - encoder["timestamp"]) # local time of sample, from its age on the redis server clock
+                except: self.depthtime = time.time()
                 self.speedinst = 100*encoder["velocity"] # cm/s
                 if np.abs(self.speedinst) > 200: self.speedinst = 0 # if depth display falls out, a large negative value may be reported and the speed is unphysical.
 
-                if 0: # Running mean?
-                    self.depth_list = np.roll(self.depth_list, -1); 
-                    self.depth_list[-1] = self.depth
+                speednew = 100*self.velocity.update(now, self.depth) # m/s -> cm/s
+                self.speed = speednew if np.isfinite(speednew) else sign*self.speedinst # instantaneous speed until window has samples (as speed, of abs(depth))
 
-                    self.time_list = np.roll(self.time_list, -1); 
-                    self.time_list[-1] = now # new time stamp (seconds)
-                    
-                    self.speedprev = self.speed
-                    speednew = np.nanmean(np.divide( np.diff(self.depth_list), np.diff(self.time_list) ))
-                    speednew *= 100 # m/s -> cm/s 
-                    alpha = 0.125
-                    self.speed = alpha*speednew + (1-alpha)*self.speedprev
-                else:
-                    self.speed = self.speedinst
-
-            try:    self.depthtare = float(self.rc.get('depth-tare'))
+            try:    self.depthtare = float(value['depth-tare'])
             except: self.depthtare = self.depth
             
-            try:    self.corelength = float(self.rc.get('core-length'))
+            try:    self.corelength = float(value['core-length'])
             except: self.corelength = 0
             
         except:
@@ -96,28 +104,37 @@ class SurfaceState():
             self.islive_depthcounter = False
 
         ### Load
-        self.loadprev = self.load
         try:
-            loadcell = json.loads(self.rc.get('load-cell'))
-#            loadnew = float(loadcell["load"])
-            loadnew = float(loadcell) # new version (2023)
-            self.islive_loadcell = (int(loadnew) != -9999)
+            loadcell = json.loads(value['load-cell'])
+            if isinstance(loadcell, dict): loadnew = float(loadcell["load"]) # timestamped version (2025), and pre-2023 version
+            else:                          loadnew = float(loadcell) # 2023 version
+            self.islive_loadcell = (int(loadnew) != -9999) and self.isrecent(loadcell, now_us)
             if self.islive_loadcell:
-                self.load = loadnew if not smoothload else (self.loadprev+loadnew)/2
+                loadsmooth = self.loadfilter.update(loadnew)
+                self.load = loadnew if not smoothload else loadsmooth
                 self.loadnet  = self.load - CABLE_DENSITY*self.depth
         except:
             # probably because not connected?
             self.load, self.loadnet = 0.0, 0.0
             self.islive_loadcell = False
+            self.loadfilter.reset()
 #            self.load = np.random.rand()  + 10 # debug
 
-        try:    self.loadtare = float(self.rc.get('load-tare'))
+        try:    self.loadtare = float(value['load-tare'])
         except: self.loadtare = 0.0
                     
         ### AUX
-        try:    self.alertloggers = int(self.rc.get('alert-loggers'))
+        try:    self.alertloggers = int(value['alert-loggers'])
         except: self.alertloggers = 0
+
+        ### Snapshot for readers in other threads (see snapshot.py)
+        self.snapshot = SurfaceSnapshot.of(self)
         
+    def isrecent(self, reading, now_us):
+        '''Is the timestamped reading (dict with "timestamp" in seconds) younger than SURFACE_MAXAGE? Readings without a timestamp (older drivers) are assumed recent.'''
+        try:    return (now_us - int(round(1e6*reading["timestamp"]))) < 1e6*SURFACE_MAXAGE
+        except: return True
+
     def set_loadtare(self,tare):
         self.rc.set('load-tare', tare)
         
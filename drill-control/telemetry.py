@@ -0,0 +1,123 @@
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Recorded telemetry for refilling the drill-control plot histories after a restart.
+
+drill-state-derived.py records the plotted quantities (depth, speed, load, motor current, inclination) every
+TELEMETRY_DT seconds to the redis stream TELEMETRY_STREAM. The surface quantities are always recorded; the drill
+quantities (DRILL_FIELDS) only if a new drill state was received since the last entry, so that the last drill state
+is not repeated while the drill is not sending (e.g. powered off); fields left out are read back as NaN.
+On startup, drill-control reads the part of the stream covering the visible time windows with a single XRANGE
+(fetch()), resamples it onto the time grid of its histories (resample()) and bins it into the min/mean/max rollups
+used for the long time windows (rollup()). The rest (up to 12 hours) is then read in the background in chunks
+(Reader), so that a start is not held up by reading the whole recording.
+"""
+
+import numpy as np
+from settings import *
+
+TELEMETRY_FIELDS = ['depth', 'speed', 'load', 'motor_current', 'incl_sfus', 'incl_ahrs']
+DRILL_FIELDS     = ['motor_current', 'incl_sfus', 'incl_ahrs'] # from the drill state
+
+def record(rc, ss, ds, drill=True):
+    '''
+    Add current values of the (already updated) surface state ss and drill state ds to TELEMETRY_STREAM;
+    the drill state fields are left out unless drill (i.e. ds is a drill state not recorded before).
+    '''
+    values = {'depth':ss.depth, 'speed':abs(ss.speed), 'load':ss.load, 'motor_current':ds.motor_current, 'incl_sfus':ds.incl_sfus, 'incl_ahrs':ds.incl_ahrs}
+    entry = {f:'%.4g'%(float(values[f])) for f in TELEMETRY_FIELDS if drill or f not in DRILL_FIELDS}
+    rc.xadd(TELEMETRY_STREAM, entry, maxlen=TELEMETRY_STREAM_MAXLEN, approximate=True)
+
+def fetch(rc, span):
+    '''
+    Samples recorded in the last span seconds as (now, t, {field: array}), with t the sample times (oldest first),
+    or None if fewer than two were recorded.
+    '''
+    try:
+        sec, usec = rc.time() # stream entry IDs are redis server times in ms
+        now = sec + 1e-6*usec
+        entries = rc.xrange(TELEMETRY_STREAM, min='%i'%(1000*(now-span)), max='+')
+    except:
+        return None
+    return samples(now, entries)
+
+def samples(now, entries):
+    '''The stream entries as (now, t, {field: array}), see fetch()'''
+    if len(entries) < 2: return None
+    t = 1e-3*np.array([int(id.split(b'-')[0]) for id, _ in entries], dtype=np.float64)
+    rec = np.array([[fields.get(f.encode(), b'nan') for f in TELEMETRY_FIELDS] for _, fields in entries]).astype(np.float64)
+    return now, t, {f:rec[:,ii] for ii, f in enumerate(TELEMETRY_FIELDS)}
+
+
+class Reader():
+
+    """
+        Reads the samples recorded since span seconds before it was created, in chunks of count entries (XRANGE with
+        COUNT), one chunk per read(), so that a long span is read without blocking the caller for long.
+    """
+
+    def __init__(self, rc, span, count=TELEMETRY_CHUNK):
+        self.rc, self.count = rc, count
+        sec, usec = rc.time()
+        self.tstart = sec + 1e-6*usec # redis server time when created
+        self.next = '%i'%(1000*(self.tstart-span)) # first entry ID of next chunk
+        self.entries = []
+        self.done = False
+
+    def read(self):
+        '''Read the next chunk; returns True once all samples up to now are read'''
+        chunk = self.rc.xrange(TELEMETRY_STREAM, min=self.next, max='+', count=self.count)
+        self.entries += chunk
+        if len(chunk) < self.count: 
+            self.done = True
+        else:
+            ms, seq = chunk[-1][0].split(b'-')
+            self.next = '%i-%i'%(int(ms), int(seq)+1)
+        return self.done
+
+    def fetched(self):
+        '''Samples read, as returned by fetch(); None if fewer than two'''
+        sec, usec = self.rc.time()
+        return samples(sec + 1e-6*usec, self.entries)
+
+def resample(fetched, N, dt, maxgap=TELEMETRY_MAXGAP):
+    '''
+    Fetched samples resampled at the N times now-(N-1)*dt, ..., now-dt, now (oldest first).
+    Returns ({field: array}, {field: valid}) where valid is False for samples farther than maxgap/2 seconds from any
+    recorded value of the field (recorder not running, or no drill state received), or (None, None) if nothing was recorded.
+    '''
+    if fetched is None: return None, None
+    now, t, rec = fetched
+    tg = now - dt*np.arange(N-1, -1, -1) # sample times, oldest first
+    data, valid = {}, {}
+    for f in TELEMETRY_FIELDS:
+        ok = np.isfinite(rec[f])
+        tf, xf = t[ok], rec[f][ok]
+        if len(tf) < 2: 
+            data[f], valid[f] = np.full(N, np.nan), np.full(N, False)
+            continue
+        I = np.clip(np.searchsorted(tf, tg), 1, len(tf)-1) # nearest recorded samples are tf[I-1] and tf[I]
+        valid[f] = np.minimum(np.abs(tg-tf[I-1]), np.abs(tf[I]-tg)) <= maxgap/2
+        data[f] = np.interp(tg, tf, xf)
+    return data, valid
+
+def rollup(fetched, x, M, width):
+    '''
+    (min, mean, max, valid) of the values x of the fetched samples (e.g. a field, or a quantity derived from fields)
+    in M bins of width seconds ending now, oldest first; valid is False for bins without samples.
+    '''
+    now, t, _ = fetched
+    I = np.floor((t - (now - M*width))/width).astype(int)
+    ok = (I >= 0) & (I < M) & np.isfinite(x)
+    I, x = I[ok], x[ok]
+    n = np.bincount(I, minlength=M)
+    valid = n > 0
+    xmin, xmax = np.full(M, np.inf), np.full(M, -np.inf)
+    np.minimum.at(xmin, I, x)
+    np.maximum.at(xmax, I, x)
+    xmean = np.bincount(I, weights=x, minlength=M)/np.maximum(n, 1)
+    return xmin, xmean, xmax, valid
+
+def recent(rc, N, dt, maxgap=TELEMETRY_MAXGAP):
+    '''Telemetry of the last N samples at dt, see resample()'''
+    return resample(fetch(rc, (N-1)*dt+maxgap), N, dt, maxgap)
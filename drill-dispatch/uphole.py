@@ -29,6 +29,7 @@ def uphole_worker(arguments, redis, transport):
             
             try:    packet.load_cell = json.loads(redis.get('load-cell'))
             except: pass
+            if isinstance(getattr(packet, 'load_cell', None), dict): packet.load_cell = packet.load_cell['load'] # drivers add a timestamp; log the bare load as before
 
             # Orientation calibration values
             for method in ['sfus','ahrs']:
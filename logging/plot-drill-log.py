@@ -6,7 +6,8 @@ import code # code.interact(local=locals())
 import sys, os, time, csv, datetime, time, json, scipy
 import matplotlib.pyplot as plt
 import pandas as pd
-from scipy.signal import savgol_filter
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../drill-control'))
+from filters import SavitzkyGolay
 
 if len(sys.argv) != 4: sys.exit('usage: %s /path/to/log/<LOGNAME> HOUR_START HOUR_END'%(sys.argv[0]))
 
@@ -153,7 +154,8 @@ print('... done')
         
 ### Velocity
 vel = 100 * abs(np.nan_to_num( np.divide(np.diff(z),np.diff(t))) )
-vel = savgol_filter(vel, 101, 2) # smoothing
+sgfilter = SavitzkyGolay(101, 2) # smoothing, same streaming filter as can be used live
+vel = np.array([sgfilter.update(v) for v in vel])
 vel = np.concatenate((vel,[vel[-1],]))
 
 #-----------------------
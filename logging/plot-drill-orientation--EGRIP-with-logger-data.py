@@ -10,6 +10,8 @@ from scipy.spatial.transform import Rotation
 import ahrs
 from ahrs.filters import SAAM, Tilt, FLAE, QUEST
 import matplotlib.pyplot as plt
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../drill-control'))
+from ahrs_batch import estimate_batch, BATCH_ESTIMATORS
 import warnings
 warnings.filterwarnings('ignore', message='.*Gimbal', )
 
@@ -145,18 +147,27 @@ quat = np.zeros((N,4))
 def xyzw_to_wxyz(q): return np.roll(q,1)
 def wxyz_to_xyzw(q): return np.roll(q,-1)
 
-for ii in range(N):
-
-    av = np.array([ax[ii], ay[ii], az[ii]])
-    mv = np.array([mx[ii], my[ii], mz[ii]]) * mvmul
+if AHRS_METHOD in BATCH_ESTIMATORS:
+    # Vectorized over all rows; bad rows are returned as NaN
+    av = np.column_stack((ax, ay, az))
+    mv = np.column_stack((mx, my, mz)) * mvmul
     if AHRS_METHOD == 'Tilt': mv = None
-    q = AHRS_estimator.estimate(acc=av, mag=mv) 
+    q = estimate_batch(AHRS_METHOD, av, mv)
+    for ii in np.nonzero(np.isnan(q[:,0]))[0]: print('[!!] Bad entry at ii=%i'%(ii))
+    quat[:,:] = np.roll(q, -1, axis=1) # wxyz_to_xyzw() for each row
+
+else:
+    for ii in range(N):
+
+        av = np.array([ax[ii], ay[ii], az[ii]])
+        mv = np.array([mx[ii], my[ii], mz[ii]]) * mvmul
+        q = AHRS_estimator.estimate(acc=av, mag=mv) 
 
-    if np.size(q) != 4 or np.any(np.isnan(q)) or np.linalg.norm(q) < 0.99: 
-        print('[!!] Bad entry at ii=%i'%(ii))
-        quat[ii,:] = None 
-    else:               
-        quat[ii,:] = wxyz_to_xyzw(q)
+        if np.size(q) != 4 or np.any(np.isnan(q)) or np.linalg.norm(q) < 0.99: 
+            print('[!!] Bad entry at ii=%i'%(ii))
+            quat[ii,:] = None 
+        else:               
+            quat[ii,:] = wxyz_to_xyzw(q)
     
    
 #-----------------------
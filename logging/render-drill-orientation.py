@@ -0,0 +1,206 @@
+#!/usr/bin/python
+# N. M. Rathmann <rathmann@nbi.ku.dk>, 2025
+
+"""
+Offscreen (batch) rendering of the drill orientation over a time range of a drill log, as shown live by
+drill-control/drill-orientation.py, to a frame sequence or video.
+
+The orientation is sampled every FRAME_DT seconds of log time. The frames are split into NWORKERS contiguous chunks
+that are rendered in parallel by a process pool; each worker draws its chunk with its own QuaternionVisualizer3D
+scene on its own offscreen (Agg) canvas, moving the orientation artists between frames (see drill-orientation.py).
+If the output ends with a video extension (e.g. .mp4), the frames are encoded with ffmpeg, which must be installed.
+
+The log may be a raw drill log (drill.log.YYYY-MM-DD) or a processed drill log
+(drill.log.processed.YYYY-MM-DD.csv, see plot-drill-log.py). SFUS is the BNO055 quaternion as logged;
+AHRS is estimated from the logged accelerometer and magnetometer samples with AHRS_METHOD (see ahrs_batch.py).
+Orientation offsets ("Zero ref." in drill-control) are not applied.
+"""
+
+import numpy as np
+import sys, os, json, time, datetime, shutil, subprocess, tempfile, importlib.util
+import multiprocessing
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+DIR_CONTROL = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../drill-control')
+sys.path.insert(0, DIR_CONTROL)
+from ahrs_batch import estimate_batch
+from scipy.spatial.transform import Rotation
+
+if len(sys.argv) not in [4,5]: sys.exit('usage: %s /path/to/log HOUR_START HOUR_END [OUTPUT (directory for frames, or video file e.g. .mp4)]'%(sys.argv[0]))
+
+#-----------------------
+# Options
+#-----------------------
+
+OUTPATH     = 'drill-logs-processed'
+FRAME_DT    = 10  # seconds of log time per frame
+FPS         = 25  # frames per second of video
+MAXGAP      = 60  # seconds; frames farther than this from a logged sample show no orientation
+AHRS_METHOD = 'SAAM'
+SHOW_SFUS, SHOW_AHRS = 1, 1
+FIGSIZE, DPI = (10.5, 9.8), 80
+NWORKERS    = os.cpu_count()
+
+VIDEO_EXTS  = ['.mp4', '.mkv', '.avi', '.mov']
+
+#-----------------------
+# Drill log
+#-----------------------
+
+def load_processed(fname):
+    '''(t, depth, quat_sfus, acc, mag) of a processed drill log, t in seconds since midnight'''
+    import pandas as pd
+    df = pd.read_csv(fname)
+    t = 60**2*df['hoursSince'].to_numpy()
+    q = df[['qx','qy','qz','qw']].to_numpy()
+    acc = df[['accx','accy','accz']].to_numpy()
+    mag = df[['magx','magy','magz']].to_numpy()
+    return t, np.abs(df['depth'].to_numpy()), q, acc, mag
+
+def load_raw(fname):
+    '''(t, depth, quat_sfus, acc, mag) of the uphole messages of a raw drill log, t in seconds since midnight'''
+    t0 = datetime.datetime.strptime(fname[-10:], '%Y-%m-%d')
+    rows = []
+    with open(fname, 'r') as fh:
+        for l in fh:
+            if "depth_encoder" not in l: continue # not uphole message
+            try:
+                t = (datetime.datetime.strptime(l[:23], '%Y-%m-%d %H:%M:%S,%f') - t0).total_seconds()
+                msg = json.loads(l[l.find('{'):])
+            except:
+                continue
+            try:    depth = abs(msg['depth_encoder']['depth'])
+            except: depth = np.nan
+            try:    q = [msg['quaternion_%s'%(x)] for x in ['x','y','z','w']]
+            except: q = [np.nan]*4 # don't assume all drill sections send the BNO quat uphole
+            acc = [msg.get('accelerometer_%s'%(x), np.nan) for x in ['x','y','z']]
+            mag = [msg.get('magnetometer_%s'%(x), np.nan) for x in ['x','y','z']]
+            rows.append([t, depth] + q + acc + mag)
+    rows = np.array(rows, dtype=np.float64).reshape(-1, 12)
+    return rows[:,0], rows[:,1], rows[:,2:6], rows[:,6:9], rows[:,9:12]
+
+def orientation(quat):
+    '''(incl, azim) in deg. of the (N,4) quaternions (x,y,z,w), as DrillState.quat2ori(); NaN rows stay NaN'''
+    incl, azim = np.full(len(quat), np.nan), np.full(len(quat), np.nan)
+    I = np.nonzero(np.all(np.isfinite(quat), axis=1) & (np.linalg.norm(quat, axis=1) > 1e-1))[0]
+    if len(I) == 0: return incl, azim
+    z = Rotation.from_quat(quat[I]).apply([0,0,1]) # drill axis
+    incl[I] = 180 - np.rad2deg(np.arccos(np.clip(z[:,2], -1, 1)))
+    azim[I] = np.rad2deg(np.arctan2(z[:,1], z[:,0]))
+    return incl, azim
+
+#-----------------------
+# Rendering (in worker processes)
+#-----------------------
+
+def load_visualizer():
+    # drill-orientation.py is a script (not an importable module name), so load it from its path; its __main__ block is not run
+    spec = importlib.util.spec_from_file_location('drill_orientation', os.path.join(DIR_CONTROL, 'drill-orientation.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class OffscreenVisualizer():
+
+    """
+        QuaternionVisualizer3D scene (3D axes only, no buttons or profile) on an offscreen canvas, without redis.
+    """
+
+    def __init__(self, module):
+        self.vis = vis = module.QuaternionVisualizer3D.__new__(module.QuaternionVisualizer3D) # don't connect to redis, see __init__()
+        vis.view_followdrill = False
+        vis.show_sfus, vis.show_ahrs = SHOW_SFUS, SHOW_AHRS
+        vis.qc_sfus = vis.qc_ahrs = [0,0,0,1]
+        vis.update_internal_states()
+        self.fig = vis.fig = Figure(figsize=FIGSIZE, facecolor='w')
+        self.canvas = FigureCanvasAgg(self.fig)
+        vis.ax3d = self.fig.add_axes([0, 0, 1, 0.94], projection='3d')
+        vis.ax3d.view_init(azim=module.azim0, elev=module.elev0)
+        vis.setup_ax3d_plot()
+        self.title = self.fig.text(0.5, 0.97, '', ha='center', va='center', fontsize=module.FS)
+
+    def render(self, frame, fname):
+        vis = self.vis
+        ok_sfus, ok_ahrs = [np.all(np.isfinite(frame['quat_%s'%(m)])) for m in ['sfus','ahrs']]
+        vis.show_sfus, vis.show_ahrs = SHOW_SFUS and ok_sfus, SHOW_AHRS and ok_ahrs
+        if ok_sfus: vis.qc_sfus = frame['quat_sfus']
+        if ok_ahrs: vis.qc_ahrs = frame['quat_ahrs']
+        vis.update_internal_states()
+        vis.update_ax3d_plot()
+        self.title.set_text(frame['title'])
+        self.fig.savefig(fname, dpi=DPI)
+
+worker = None # OffscreenVisualizer of this worker process
+
+def init_worker():
+    global worker
+    worker = OffscreenVisualizer(load_visualizer())
+
+def render_chunk(args):
+    frames, fnames = args
+    for frame, fname in zip(frames, fnames): worker.render(frame, fname)
+    return len(frames)
+
+#-----------------------
+# Main
+#-----------------------
+
+if __name__ == '__main__':
+
+    fdrill = str(sys.argv[1])
+    T_MIN, T_MAX = float(sys.argv[2]), float(sys.argv[3])
+    processed = fdrill.endswith('.csv')
+    datetimestr = fdrill[-14:-4] if processed else fdrill[-10:] # log file date string
+    output = sys.argv[4] if len(sys.argv) == 5 else '%s/drill-orientation-%s--%g-%g'%(OUTPATH, datetimestr, T_MIN, T_MAX)
+    video = os.path.splitext(output)[1].lower() in VIDEO_EXTS
+    if video and shutil.which('ffmpeg') is None: sys.exit('ffmpeg not found, needed for video output; give a directory to save frames to instead')
+
+    ### Drill log
+
+    print('*** Loading drill log %s'%(fdrill))
+    t, depth, quat_sfus, acc, mag = load_processed(fdrill) if processed else load_raw(fdrill)
+    I = (t >= 60**2*T_MIN) & (t <= 60**2*T_MAX) & np.isfinite(depth) # slice out requested temporal range (hours since midnight)
+    t, depth, quat_sfus, acc, mag = t[I], depth[I], quat_sfus[I], acc[I], mag[I]
+    if len(t) == 0: sys.exit('No drill states logged between %gh and %gh'%(T_MIN, T_MAX))
+    quat_ahrs = np.roll(estimate_batch(AHRS_METHOD, acc, mag if AHRS_METHOD != 'Tilt' else None), -1, axis=1) # (w,x,y,z) to (x,y,z,w)
+    incl_sfus, azim_sfus = orientation(quat_sfus)
+    incl_ahrs, azim_ahrs = orientation(quat_ahrs)
+    print('... %i drill states'%(len(t)))
+
+    ### Frames: latest logged drill state at each frame time
+
+    tf = np.arange(t[0], t[-1]+1e-9, FRAME_DT)
+    J = np.clip(np.searchsorted(t, tf, side='right') - 1, 0, len(t)-1)
+    gap = tf - t[J] > MAXGAP
+    frames = []
+    for ii, jj in enumerate(J):
+        nan = [np.nan]*4
+        title = '%s %s    z = %.1f m    SFUS: incl %.2f, azim %.0f    %s: incl %.2f, azim %.0f'%(datetimestr, time.strftime('%H:%M:%S', time.gmtime(tf[ii])), \
+                                                    depth[jj], incl_sfus[jj], azim_sfus[jj], AHRS_METHOD, incl_ahrs[jj], azim_ahrs[jj])
+        frames.append({'quat_sfus':nan if gap[ii] else quat_sfus[jj], 'quat_ahrs':nan if gap[ii] else quat_ahrs[jj], \
+                       'title':'%s %s    (no data)'%(datetimestr, time.strftime('%H:%M:%S', time.gmtime(tf[ii]))) if gap[ii] else title})
+
+    ### Render
+
+    framedir = tempfile.mkdtemp(prefix='drill-orientation-') if video else output
+    os.makedirs(framedir, exist_ok=True)
+    fnames = ['%s/frame-%06i.png'%(framedir, ii) for ii in range(len(frames))]
+    nworkers = max(1, min(NWORKERS, len(frames)))
+    bounds = np.linspace(0, len(frames), nworkers+1).astype(int)
+    chunks = [(frames[a:b], fnames[a:b]) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    print('*** Rendering %i frames (%gh to %gh every %is) with %i workers'%(len(frames), T_MIN, T_MAX, FRAME_DT, nworkers))
+    t0 = time.time()
+    with multiprocessing.Pool(nworkers, initializer=init_worker) as pool:
+        nrendered = sum(pool.map(render_chunk, chunks))
+    print('... done in %.1fs'%(time.time()-t0))
+
+    if video:
+        print('*** Encoding %s'%(output))
+        subprocess.run(['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(FPS), '-i', '%s/frame-%%06d.png'%(framedir), \
+                        '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', output], check=True)
+        shutil.rmtree(framedir)
+    else:
+        print('*** Saved %i frames to %s'%(nrendered, framedir))
@@ -31,8 +31,10 @@ import sys
 import math
 import serial
 import gc
+import os
 import redis 
-from codixmem import *
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../drill-control'))
+from filters import VelocityEstimator, SpikeRejector
 
 __author__ = "Aslak Grinsted and Nicholas Rathmann"
 __email__ = "ag@glaciology.net"
@@ -47,6 +49,9 @@ slaveaddress = 1  # this is the address of the unit.
 REDIS_HOST = "localhost"
 idstr = "codix560crlf" # ID string for printing
 searchLoopSleep = 1 # secs between retrying ports
+keyTTL = 5000 # msecs before redis drops the reading if not renewed, e.g. if this process hangs
+velocityTavg = 2 # secs of depth samples to fit velocity over (the encoder has only centimetre resolution)
+depthSpike = 1.0 # metres from the median of the last samples for a depth sample to be left out of the velocity fit
 
 
 def parse_line(line):
@@ -95,7 +100,8 @@ if __name__ == "__main__":
 
     redis_conn  = redis.StrictRedis(host=REDIS_HOST)
     serial_conn = None
-    cmem        = Codix560Mem()
+    velest      = VelocityEstimator(velocityTavg, 0.1)
+    despike     = SpikeRejector(5, depthSpike) # keeps overflow (-9999) and glitched samples out of the velocity
             
     while True:
     
@@ -105,7 +111,10 @@ if __name__ == "__main__":
         try:
             line = serial_conn.readline().decode("ascii")
             curdepth = parse_line(line)
-            velocity = cmem.update(curdepth)
+            now = time.time()
+            despike.update(curdepth)
+            velocity = velest.update(now, curdepth if not despike.rejected else math.nan)
+            if math.isnan(velocity): velocity = 0.0 # not enough samples yet
         except:
             print("%s: Read failed. Restarting serial connection."%(idstr))
             curdepth = -9999
@@ -113,5 +122,5 @@ if __name__ == "__main__":
             serial_conn = None
             continue
 
-        redis_conn.set("depth-encoder", "{\"depth\": %f, \"velocity\": %f}" % (curdepth, velocity))
+        redis_conn.set("depth-encoder", "{\"depth\": %f, \"velocity\": %f, \"timestamp\": %.6f}" % (curdepth, velocity, now), px=keyTTL)
 pass
@@ -45,6 +45,7 @@ slaveaddress = 0xF7  # this is the address of the unit.
 REDIS_HOST = "localhost"
 idstr = "pmdstraincrlf" # ID string for printing
 searchLoopSleep = 1 # secs between retrying ports
+keyTTL = 5000 # msecs before redis drops the reading if not renewed, e.g. if this process hangs
 
 
 def parse_line(line, bad=-9999.0):
@@ -107,6 +108,6 @@ if __name__ == "__main__":
             serial_conn = None
             continue
 
-        redis_conn.set("load-cell", "%f"%(curload))
+        redis_conn.set("load-cell", "{\"load\": %f, \"timestamp\": %.6f}" % (curload, time.time()), px=keyTTL)
 
 pass